@@ -1,47 +1,25 @@
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
-import re
-
-#helper to find floats in file
-def isfloat(value):
-  try:
-    float(value)
-    return True
-  except ValueError:
-    return False
-
-#test for around the corner
-
-#extracting file to string
-s = ""
-f = open("../output/Test1_results.txt", "r")
-s = f.read()
-f.close
-#print(s)
-
-#extracting floats
-list = re.split(' |\n', s)
-
-floatlist=[]
-
-for element in list:
-    if isfloat(element):
-        floatlist.append(float(element))
-floatlist.sort()
-#print(floatlist)
-
 
-#setting values after test values to 0, pretty and constructing dictionary
-my_dict={}
-my_dict[28]=0
-my_dict.update({i:floatlist.count(i) for i in floatlist})
-my_dict[32.3]=0
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, ".."))
+from results import load_results, value_counts, summary
 
+#test for moving straight
 
-print(my_dict)
+#loading the durations of all runs, parsed once and cached next to the results
+times = load_results("test1")["time"]
+print(summary(times))
 
-keys = my_dict. keys()
-values = my_dict. values()
+#counting each duration, with a frequency of 0 before and after the test values, pretty
+durations, frequencies = value_counts(times)
+if len(durations) == 0:
+    sys.exit("There are no finished runs in the results of RiMEA test 1, run the test first.")
+durations = np.concatenate(([durations[0] - 0.3], durations, [durations[-1] + 0.3]))
+frequencies = np.concatenate(([0], frequencies, [0]))
 
 # naming the x axis
 plt.xlabel('duration/s')
@@ -49,15 +27,15 @@ plt.xlabel('duration/s')
 plt.ylabel('frequency')
 
 #seting limits of x and y axis
-plt.axis([25, 35, 0, 8])
+plt.axis([25, 35, 0, max(8, frequencies.max() + 1)])
 
 #ploting the data
-plt.plot(keys, values)
+plt.plot(durations, frequencies)
 
 #boundaries
 plt.axvline(26, 0, 20, color="red")
 plt.axvline(34, 0, 20, color="red")
 plt.title("RiMEA Test1 results")
-plt.savefig('./Test1_result.png')
+plt.savefig(os.path.join(HERE, 'Test1_result.png'))
 
 plt.show()
@@ -1,53 +1,36 @@
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import numpy as np
-import re
-
-def isfloat(value):
-  try:
-    float(value)
-    return True
-  except ValueError:
-    return False
-
-
-s = ""
-f = open("../output/Test6_results.txt", "r")
-s = f.read()
-f.close
-print(s)
-
-list = re.split(' |\n', s)
-
-floatlist=[]
-
-for element in list:
-    if isfloat(element):
-        floatlist.append(float(element))
-floatlist.sort()
-print(floatlist)
 
-#setting values after test values to 0, pretty and constructing dictionary
-my_dict={}
-my_dict[16.09]=0
-my_dict.update({i:floatlist.count(i) for i in floatlist})
-my_dict[18.1]=0
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, ".."))
+from results import load_results, value_counts, summary
 
+#loading the durations of all runs, parsed once and cached next to the results
+times = load_results("test6")["time"]
+print(summary(times))
 
-keys = my_dict. keys()
-values = my_dict. values()
+#counting each duration, with a frequency of 0 before and after the test values, pretty
+durations, frequencies = value_counts(times)
+if len(durations) == 0:
+    sys.exit("There are no finished runs in the results of RiMEA test 6, run the test first.")
+durations = np.concatenate(([durations[0] - 0.01], durations, [durations[-1] + 0.01]))
+frequencies = np.concatenate(([0], frequencies, [0]))
 
 #seting limits of x and y axis
-plt.axis([15,19 , 0, 15 ])
+plt.axis([15, 19, 0, max(15, frequencies.max() + 1)])
 
 # naming the x axis
 plt.xlabel('duration/s')
 # naming the y axis
 plt.ylabel('frequency')
 
-plt.plot(keys, values)
+plt.plot(durations, frequencies)
 #plt.axvline(26, 0, 20, color="red")
 #plt.axvline(34, 0, 20, color="red")
 plt.title("RiMEA Test6 results")
-plt.savefig('./Test6_result.png')
+plt.savefig(os.path.join(HERE, 'Test6_result.png'))
 
 plt.show()
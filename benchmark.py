@@ -0,0 +1,286 @@
+"""Benchmark the preset tasks and RiMEA tests headlessly at several scales, and report the results as JSON lines.
+
+A scenario at scale k is k copies of it stacked along the y axis, so the grid and the number of pedestrians both
+grow k times while every copy behaves like the original. Every case runs in a fresh process, so its peak memory
+is its own.
+
+Example
+-------
+    python benchmark.py --scales 1 4 16 --output output/benchmark.jsonl
+    python benchmark.py test4 --density 4 --event-driven
+    python benchmark.py test4 --scales 20 --max-steps 100 --profile
+    python benchmark.py floor_plan.json
+    python benchmark.py test4 --scales 40 --max-steps 100 --tile-size 64
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import platform
+import sys
+import time
+
+import numpy as np
+
+from cellular_automaton import TICK_SCHEDULING, EVENT_SCHEDULING, OBSTACLE, TARGET, Cellular_Automaton
+from profiling import Profiler
+from replicates import COST_FUNCS, DEFAULT_UNTIL, UNTIL
+import scenarios
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SCALES = [1, 2, 4]
+
+# The parameters of the scenarios that need them
+PARAMS = {
+    "test4": {"density": 2.0}
+}
+
+
+def peak_memory():
+    """
+    Returns
+    -------
+    float
+        the peak resident memory of this process in MB, nan where it is not available
+    """
+    if resource is None:
+        return math.nan
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def build_scaled(scenario, scale, rng, tile_size=None, **params):
+    """Set up a scenario stacked scale times along the y axis.
+
+    Parameters
+    ----------
+    scenario : string
+        one of the keys of scenarios.SIZES, or the path of a scenario file
+    tile_size : integer, optional
+        store the grids of the scaled scenario in tiles of this size, by default None (dense arrays)
+
+    Returns
+    -------
+    Cellular_Automaton
+    """
+    base = Cellular_Automaton(1, 1, tile_size if scale == 1 else None)
+    if scenario.endswith(".json"):
+        scenarios.load(base, scenario, rng)
+    else:
+        scenarios.build(base, scenario, rng, **params)
+    if scale == 1:
+        return base
+
+    width, height = base.width, base.height
+    CA = Cellular_Automaton(width, height * scale, tile_size)
+    CA.test4_density = base.test4_density
+    # Pedestrians are measured when they cross the left and right boundary, which are the same in all copies
+    CA.MA_L_Boundary, CA.MA_R_Boundary = base.MA_L_Boundary, base.MA_R_Boundary
+    CA.isMA[:] = np.tile(base.isMA, (1, scale))
+
+    obstacle_xs, obstacle_ys = np.nonzero(base.crt_state == OBSTACLE)
+    target_xs, target_ys = np.nonzero(base.crt_state == TARGET)
+    # The target groups get the same indices as in the base, so that the pedestrians keep their groups
+    for name in base.target_groups:
+        CA.add_target_group(name)
+    P = base.population
+    live = ~P.removed
+    for copy in range(scale):
+        dy = copy * height
+        CA.add_obstacles(obstacle_xs, obstacle_ys + dy)
+        CA.add_targets(target_xs, target_ys + dy)
+        for name, group in base.target_groups.items():
+            group_xs, group_ys = np.array(base.group_targets[group], dtype=np.int64).reshape(-1, 2).T
+            CA.add_targets(group_xs, group_ys + dy, group=name)
+        CA.add_pedestrians(P.x[live], P.y[live] + dy, P.speed[live], P.age[live], P.group[live])
+    return CA
+
+
+def run_case(case):
+    """Build, compute the floor field of and run one case. This is the function executed by the benchmark
+    processes.
+
+    Parameters
+    ----------
+    case : dict
+        scenario, scale, params, seed, cost_func, scheduling, until, max_steps, profile and tile_size
+
+    Returns
+    -------
+    dict
+        the case and its measurements. Times are wall times in s.
+    """
+    rng = np.random.default_rng(case["seed"])
+    start = time.perf_counter()
+    CA = build_scaled(case["scenario"], case["scale"], rng, case["tile_size"], **case["params"])
+    CA.cost_func = COST_FUNCS[case["cost_func"]]
+    CA.set_scheduling(EVENT_SCHEDULING if case["scheduling"] == "event" else TICK_SCHEDULING)
+    build_time = time.perf_counter() - start
+
+    # Always compute the floor field from scratch
+    CA.floor_field_cache = None
+    start = time.perf_counter()
+    CA.compute_dist_cost()
+    floor_field_time = time.perf_counter() - start
+
+    profiler = CA.enable_profiling(Profiler(interval=math.inf)) if case["profile"] else None
+
+    # The loop of Cellular_Automaton.run(), timing every step
+    agents = len(CA.population)
+    step_times = []
+    # An agent step is a pedestrian that was due to move in a step, not every pedestrian of every step
+    first_agent_steps = CA.agent_steps
+    CA.paused = False
+    start = time.perf_counter()
+    while not CA.paused and (case["max_steps"] is None or len(step_times) < case["max_steps"]):
+        if CA.next_time() > case["until"] + 0.0001:
+            break
+        step_start = time.perf_counter()
+        CA.step()
+        step_times.append(time.perf_counter() - step_start)
+    run_time = time.perf_counter() - start
+    agent_steps = CA.agent_steps - first_agent_steps
+
+    step_times = np.array(step_times)
+    steps = len(step_times)
+    measurements = {
+        "width": CA.width,
+        "height": CA.height,
+        "agents": agents,
+        "arrived": agents - len(CA.population),
+        "build_time": build_time,
+        "floor_field_time": floor_field_time,
+        "run_time": run_time,
+        "total_time": build_time + floor_field_time + run_time,
+        "steps": steps,
+        "simulated_time": CA.now,
+        "steps_per_second": steps / run_time if run_time > 0 else math.nan,
+        "agent_steps_per_second": agent_steps / run_time if run_time > 0 else math.nan,
+        "step_time_mean": float(step_times.mean()) if steps else math.nan,
+        "step_time_p50": float(np.percentile(step_times, 50)) if steps else math.nan,
+        "step_time_p95": float(np.percentile(step_times, 95)) if steps else math.nan,
+        "step_time_max": float(step_times.max()) if steps else math.nan,
+        "grid_memory_mb": CA.grid_nbytes() / 2**20,
+        "peak_memory_mb": peak_memory()
+    }
+    if profiler is not None:
+        # The time of every phase and the counters of all steps, see profiling.py
+        measurements["profile"] = profiler.totals()
+    return dict(case, **measurements)
+
+
+def run_benchmarks(scenario_names, scales=DEFAULT_SCALES, repeats=1, seed=0, cost_func="dijkstra",
+                   scheduling="tick", until=None, max_steps=None, params=None, profile=False, tile_size=None):
+    """Run every scenario at every scale, each case in a fresh process, one after the other.
+
+    Parameters
+    ----------
+    scenario_names : list
+        keys of scenarios.SIZES or paths of scenario files
+    scales : list, optional
+        how many copies of each scenario to stack, by default DEFAULT_SCALES
+    repeats : int, optional
+        number of runs of each case, by default 1
+    seed : int, optional
+        the seed of the pedestrians, the same for all cases, by default 0
+    cost_func : string, optional
+        one of the keys of COST_FUNCS, by default "dijkstra"
+    scheduling : string, optional
+        "tick" or "event", by default "tick"
+    until : float, optional
+        the simulated time at which a run is stopped, by default UNTIL of the scenario
+    max_steps : int, optional
+        the number of steps after which a run is stopped, by default None (no limit)
+    params : dict, optional
+        maps scenarios to their parameters, by default PARAMS
+    profile : bool, optional
+        whether to time the phases of the steps, see profiling.py, by default False
+    tile_size : integer, optional
+        store the grids in tiles of this size, see Cellular_Automaton.set_tile_size(), by default None
+
+    Yields
+    ------
+    dict
+        the result of each case and repeat as soon as it is finished
+    """
+    params = PARAMS if params is None else params
+    cases = []
+    for scenario in scenario_names:
+        for scale in scales:
+            for repeat in range(repeats):
+                cases.append({
+                    "scenario": scenario,
+                    "scale": scale,
+                    "params": params.get(scenario, {}),
+                    "repeat": repeat,
+                    "seed": seed,
+                    "cost_func": cost_func,
+                    "scheduling": scheduling,
+                    "until": UNTIL.get(scenario, DEFAULT_UNTIL) if until is None else until,
+                    "max_steps": max_steps,
+                    "profile": profile,
+                    "tile_size": tile_size
+                })
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_case, cases):
+            yield result
+
+
+def environment():
+    """The machine and versions a benchmark ran on."""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": multiprocessing.cpu_count()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the preset tasks and RiMEA tests without GUI.")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help="any of {} or a scenario file, by default all of them".format(
+                            ", ".join(sorted(scenarios.SIZES))))
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cost-func", choices=sorted(COST_FUNCS), default="dijkstra")
+    parser.add_argument("--event-driven", action="store_true", help="use event scheduling")
+    parser.add_argument("--until", type=float, default=None)
+    parser.add_argument("--max-steps", type=int, default=None)
+    parser.add_argument("--density", type=float, default=PARAMS["test4"]["density"],
+                        help="pedestrians per m^2 for test4")
+    parser.add_argument("--profile", action="store_true", help="time the phases of the steps")
+    parser.add_argument("--tile-size", type=int, default=None, help="store the grids in tiles of this size")
+    parser.add_argument("--output", default=None, help="append the JSON lines to this file instead of stdout")
+    args = parser.parse_args()
+    for scenario in args.scenarios:
+        if scenario not in scenarios.SIZES and not scenario.endswith(".json"):
+            parser.error("unknown scenario {!r}".format(scenario))
+
+    output = sys.stdout if args.output is None else open(args.output, "a")
+    try:
+        output.write(json.dumps({"environment": environment()}) + "\n")
+        for result in run_benchmarks(args.scenarios or sorted(scenarios.SIZES), args.scales, args.repeats, args.seed, args.cost_func,
+                                     "event" if args.event_driven else "tick", args.until, args.max_steps,
+                                     {"test4": {"density": args.density}}, args.profile, args.tile_size):
+            # nan is not valid JSON
+            output.write(json.dumps({key: None if isinstance(value, float) and math.isnan(value) else value
+                                     for key, value in result.items()}) + "\n")
+            output.flush()
+            print("{scenario} x{scale}: {agents} agents on {width}*{height}, floor field {floor_field_time:.3f}s, "
+                  "{steps} steps in {run_time:.3f}s ({steps_per_second:.1f} steps/s, "
+                  "{agent_steps_per_second:.0f} agent steps/s), grids {grid_memory_mb:.1f}MB, "
+                  "peak {peak_memory_mb:.1f}MB".format(**result),
+                  file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,1269 @@
+import time
+import math
+import heapq
+import functools
+import threading
+
+import numpy as np
+
+import floor_field
+import results
+from profiling import Profiler
+from population import Pedestrian, Population
+from tiled_grid import DEFAULT_TILE_SIZE, Tiled_Grid
+
+
+# Status code
+EMPTY = 0
+PEDESTRIAN = 1
+TARGET = 2
+OBSTACLE = 3
+
+# Scheduling code
+TICK_SCHEDULING = 1  # every pedestrian is checked at every time step
+EVENT_SCHEDULING = 2  # time jumps to the next time step in which a pedestrian is due to move
+
+# Cost function code
+EUCLIDEAN = 1
+DIJKSTRA = 2
+FAST_MARCHING = 3
+
+# The target group of all targets. Its pedestrians head to the nearest target, whichever group it belongs to.
+ANY_TARGET = 0
+
+DIRECTIONS = [(0, -1), (-1, 0), (1, 0), (0, 1), (0, 0)]
+DIRECTIONS_DX = np.array([dx for (dx, dy) in DIRECTIONS])
+DIRECTIONS_DY = np.array([dy for (dx, dy) in DIRECTIONS])
+
+
+# Data types of the grid arrays
+STATE_DTYPE = np.uint8
+OCCUPANT_DTYPE = np.int32
+COST_DTYPE = np.float64
+# The distance cost of large grids is stored in single precision
+LARGE_GRID_DIST_DTYPE = np.float32
+
+# Grids with at least this many cells are meant to be stored in tiles, see set_tile_size()
+LARGE_GRID_CELLS = 1000*1000
+# Tiled grids release the tiles that pedestrians left every this many steps
+COMPACT_INTERVAL = 100
+
+# Each Cell: 1/3m x 1/3m
+NUM_OF_UNIT_LEN_PER_METER = 3
+
+# The length of the corridor of RiMEA test 1 in m
+RIMEA_TEST1_DISTANCE = 40
+# The number of runs of a series of the RiMEA tests 1, 6 and 7
+RIMEA_TEST1_RUNS = 50
+RIMEA_TEST6_RUNS = 50
+RIMEA_TEST7_RUNS = 10
+
+
+class Observer:
+    """
+    This is the base class of everything that follows the state of a cellular automaton, e.g. the GUI.
+    Register an observer by Cellular_Automaton.add_observer(). All callbacks do nothing by default,
+    so an observer only overrides what it is interested in.
+    """
+
+    def cell_changed(self, x, y, status):
+        """Called after the status of the cell (x, y) has been changed.
+
+        Parameters
+        ----------
+        x : integer
+        y : integer
+        status : integer
+            the new status code of the cell
+        """
+        pass
+
+    def time_changed(self, now):
+        """Called at the beginning of each time step with the new simulated time in seconds."""
+        pass
+
+    def step_finished(self, now):
+        """Called at the end of each time step, after all cells of the step have been changed."""
+        pass
+
+    def replicate_requested(self, test_mode):
+        """Called when a running RiMEA test needs its scenario to be set up and run once more.
+
+        Parameters
+        ----------
+        test_mode : integer
+            the number of the RiMEA test, i.e. 1, 6 or 7
+        """
+        pass
+
+
+class Cellular_Automaton:
+    """
+    This class contains all the logical design of the cellular automaton, including update schema,
+    cost function definition, timing, and handling RiMEA tests. It does not depend on any GUI:
+    observers (e.g. Cellular_Automaton_GUI) are notified about all state changes, and the simulation
+    can be driven headlessly by step() and run().
+    """
+
+    def __init__(self, width, height, tile_size=None):
+        """Provide the size of the cellular automaton to create a cellular automaton object.
+
+        Parameters
+        ----------
+        width : integer
+        height : integer
+        tile_size : integer, optional
+            store the grids in tiles of this size for large grids, by default None (dense arrays),
+            see set_tile_size()
+        """
+
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+
+        self.running = True  # flag of whether the window is running
+        self.paused = True  # flag of whether the simulation is paused
+        # Held by the clock() thread during each step, so that other threads can change the CA between steps
+        self.step_lock = threading.Lock()
+        self.delay = .1  # control crowd.isMoving speed
+        self.now = 0
+        # The number of time steps of one delay so far, including those that event scheduling skips
+        self.tick = 0
+        # How many times faster than the wall time the clock() thread runs the simulation.
+        # None means as fast as possible, without sleeping.
+        self.real_time_factor = 1
+
+        # Achieved simulation speed, measured over the last second
+        self.step_count = 0
+        self.steps_per_second = 0.
+        # The number of pedestrians that were due to move, summed over all steps
+        self.agent_steps = 0
+        self.rate_reference = (time.perf_counter(), 0)
+        self.scheduling = TICK_SCHEDULING
+
+        self.observers = []
+        # Times the phases of each step while profiling is enabled, see enable_profiling()
+        self.profiler = None
+
+        self.initState()
+        self.initCost()
+        self.initMeasuringArea()
+
+        self.RiMEA_test_mode = 0
+
+        self.RiMEA_test1_counter = RIMEA_TEST1_RUNS
+        self.RiMEA_test1_results = []
+        self.test4_density = float()
+        self.RiMEA_test6_counter = RIMEA_TEST6_RUNS
+        self.RiMEA_test6_results = []
+        self.RiMEA_test7_pd = []
+        self.RiMEA_test7_counter = RIMEA_TEST7_RUNS
+        # The results of the RiMEA tests are streamed into output/ by this writer, see results.py
+        self.results_format = results.CSV
+        self.results_directory = results.OUTPUT_DIRECTORY
+        self.results_writer = None
+
+        self.cost_func = DIJKSTRA
+        self.floor_field_stats = None  # How the last distance cost was computed
+        # None to always compute the distance cost from scratch. Tiled grids keep their floor fields on disk only.
+        self.floor_field_cache = floor_field.CACHE if tile_size is None else floor_field.DISK_CACHE
+        self.max_repair_cells = 64  # Repair the last floor field instead of recomputing if fewer cells changed
+
+    def new_grid(self, fill, dtype):
+        """
+        Returns
+        -------
+        2D Array/Tiled_Grid
+            a grid of the size of the CA, tiled if a tile size is set
+        """
+        if self.tile_size is None:
+            return np.full((self.width, self.height), fill, dtype=dtype)
+        return Tiled_Grid((self.width, self.height), fill, dtype, self.tile_size)
+
+    def initState(self):
+        self.population = Population()
+        # The calendar queue of event scheduling: the ids of the pedestrians due in each time step with their clocks
+        # in that step, and a heap of these time steps. None until the first step with event scheduling.
+        self.schedule = None
+        self.schedule_ticks = []
+        self.coord_target = []
+        # The targets of each target group. The first is ANY_TARGET, i.e. all targets, see add_target_group().
+        self.group_targets = [self.coord_target]
+        self.target_groups = {}  # The index of each named target group
+        self.crt_state = self.new_grid(EMPTY, STATE_DTYPE)
+        # The id of the pedestrian in each cell, -1 for cells without pedestrian
+        self.occupant = self.new_grid(-1, OCCUPANT_DTYPE)
+
+    def new_dist_cost(self):
+        return self.new_grid(self.width*self.height, COST_DTYPE if self.tile_size is None else LARGE_GRID_DIST_DTYPE)
+
+    def initCost(self):
+        # The distance cost of ANY_TARGET, and of each target group
+        self.dist_cost = self.new_dist_cost()
+        self.dist_costs = [self.dist_cost]
+        self.avd_cost = self.new_grid(0, COST_DTYPE)
+        if self.tile_size is not None:
+            # The number of pedestrians whose avoidance kernel overlaps each tile. Tiles without any are released.
+            self.avoid_tile_counts = np.zeros(self.avd_cost.index.shape, dtype=np.int32)
+        # What the last floor field of each target group was computed from, so that it can be repaired after small
+        # edits
+        self.floor_field_input = {}
+
+        self.rmax = 1  # 1m
+        self.dmax = self.rmax * NUM_OF_UNIT_LEN_PER_METER
+        self.avoid_cost_by_diff = np.zeros((self.dmax, self.dmax), dtype=COST_DTYPE)
+        for i in range(self.dmax):
+            for j in range(self.dmax+1-abs(i)):
+                if j != self.dmax:
+                    dx = i/3
+                    dy = j/3
+                    self.avoid_cost_by_diff[i, j] = math.exp(
+                        1/((dx**2+dy**2)-self.rmax**2))
+
+        # Assign large cost to r=0 cases where pedestrians collide
+        self.avoid_cost_by_diff[0, 0] = self.width+self.height
+
+        # The full avoidance kernel centered at a pedestrian. The entry [r+dx, r+dy] is the cost
+        # added to the cell with offset (dx, dy), and it is 0 outside of the diamond |dx|+|dy|<=dmax.
+        r = self.dmax - 1
+        offset = np.abs(np.arange(-r, r+1))
+        dx, dy = np.meshgrid(offset, offset, indexing='ij')
+        self.avoid_kernel = np.where(dx+dy <= self.dmax, self.avoid_cost_by_diff[dx, dy], 0)
+        self.avoid_kernel_dx, self.avoid_kernel_dy = np.nonzero(self.avoid_kernel)
+        self.avoid_kernel_values = self.avoid_kernel[self.avoid_kernel_dx, self.avoid_kernel_dy]
+        self.avoid_kernel_dx -= r
+        self.avoid_kernel_dy -= r
+        # The avoidance cost a pedestrian contributes to its neighbors in DIRECTIONS
+        self.avoid_cost_to_neighbors = self.avoid_kernel[r+DIRECTIONS_DX, r+DIRECTIONS_DY]
+
+    def initMeasuringArea(self):
+        # Whether a given cell is in a speed measuring area
+        self.isMA = self.new_grid(False, bool)
+        # Measuring Area Configuration. Will be set up in RiMEA test 4
+        self.MA_L_Boundary = int()
+        self.MA_R_Boundary = int()
+        self.MA_U_Boundary = int()
+        self.MA_D_Boundary = int()
+        self.speed_measured_pd_list = []
+
+    def reset(self, width, height):
+        """Clear the cellular automaton and resize it to the given size.
+
+        Parameters
+        ----------
+        width : integer
+        height : integer
+        """
+        self.width = width
+        self.height = height
+        self.initState()
+        self.initCost()
+        self.initMeasuringArea()
+        self.now = 0
+
+    def set_tile_size(self, tile_size):
+        """Store the grids in tiles from the next reset() on, which is meant for large venues: tiles that are all
+        obstacle, empty or unreachable take no memory, and the avoidance cost only takes memory in the tiles around
+        pedestrians. The distance cost is stored in single precision, and floor fields are not repaired after edits.
+        Euclidean and Dijkstra floor fields are computed tile by tile; the fast marching method still runs on dense
+        arrays, so its peak memory grows with the size of the whole grid.
+        The avoidance cost of released tiles is exactly 0 instead of the rounding residue of a dense array, so
+        pedestrians can break ties between equal neighbours differently than with dense arrays.
+
+        Parameters
+        ----------
+        tile_size : integer
+            None for dense arrays, e.g. DEFAULT_TILE_SIZE for tiles
+        """
+        if tile_size is not None and tile_size < 2*self.dmax - 1:
+            raise ValueError("tiles must be at least as large as the avoidance kernel")
+        self.tile_size = tile_size
+        if self.floor_field_cache in (floor_field.CACHE, floor_field.DISK_CACHE):
+            self.floor_field_cache = floor_field.CACHE if tile_size is None else floor_field.DISK_CACHE
+
+    def compact_grids(self):
+        """Release the tiles of the state that became uniform, e.g. that all pedestrians left."""
+        if self.tile_size is None:
+            return
+        self.crt_state.compact()
+        self.occupant.compact()
+        self.isMA.compact()
+
+    def grid_nbytes(self):
+        """
+        Returns
+        -------
+        integer
+            the memory used by the grids of the CA in bytes
+        """
+        return sum(grid.nbytes for grid in [self.crt_state, self.occupant, self.avd_cost, self.isMA] + self.dist_costs)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def enable_profiling(self, profiler=None):
+        """Start timing the phases of the steps and counting what happens in them, from the next step on.
+        It can be enabled and disabled at any time, also from another thread than the one running the steps.
+
+        Parameters
+        ----------
+        profiler : Profiler, optional
+            by default a new Profiler taking a snapshot every second
+
+        Returns
+        -------
+        Profiler
+        """
+        self.disable_profiling()
+        profiler = Profiler() if profiler is None else profiler
+        # The cell_changed callbacks happen in the middle of the moves, so they are timed one by one.
+        # This only shadows the method while profiling.
+        self.notify_cell_changed = profiler.timed(functools.partial(type(self).notify_cell_changed, self))
+        self.profiler = profiler
+        return profiler
+
+    def disable_profiling(self):
+        """Stop profiling after the current phase.
+
+        Returns
+        -------
+        Profiler
+            the profiler that was enabled, None if there was none
+        """
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.active = False
+        self.__dict__.pop("notify_cell_changed", None)
+        return profiler
+
+    def notify_cell_changed(self, x, y):
+        for observer in self.observers:
+            observer.cell_changed(x, y, int(self.crt_state[x, y]))
+
+    def notify_cells_changed(self, xs, ys):
+        if not self.observers:
+            return
+        for x, y in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist()):
+            self.notify_cell_changed(x, y)
+
+    def request_replicate(self, test_mode):
+        for observer in self.observers:
+            observer.replicate_requested(test_mode)
+
+    def compute_dist_cost(self):
+        """Compute the distance cost of all cells to the targets of each target group with the selected cost
+        function. This has to be done once the obstacles and targets are set up, before the simulation starts.
+        """
+        self.compact_grids()
+        for group, dist in enumerate(self.dist_costs):
+            if self.cost_func == EUCLIDEAN:
+                self.get_euclidean_distance(dist, group)
+            elif self.cost_func == DIJKSTRA:
+                self.get_dijkstra_distance(dist, group)
+            elif self.cost_func == FAST_MARCHING:
+                self.get_fast_marching_distance(dist, group)
+
+    def set_scheduling(self, scheduling):
+        """Choose how the time advances. Event scheduling keeps the pedestrians in a calendar queue by the time step
+        in which they are due, and skips the time steps in which no pedestrian is due. The pedestrians move in the
+        same steps as with tick scheduling, so the trajectories are the same. It is only faster when many time steps
+        have no due pedestrian, since moving the pedestrians costs more than finding them.
+
+        Parameters
+        ----------
+        scheduling : integer
+            TICK_SCHEDULING or EVENT_SCHEDULING
+        """
+        if scheduling == self.scheduling:
+            return
+        if self.schedule is not None:
+            self.synchronize_clocks()
+        self.scheduling = scheduling
+        self.schedule = None
+
+    def ticks_until_due(self, clock, lag):
+        """Count the time steps until pedestrians are due to move, the same way as tick scheduling counts them.
+
+        Parameters
+        ----------
+        clock : Array
+            the clocks of the pedestrians in the current time step
+        lag : Array
+            the finite lags of the pedestrians
+
+        Returns
+        -------
+        tuple
+            the number of time steps, and the clocks in the step in which the pedestrians are due
+        """
+        threshold = lag - 0.0001
+        # The clocks of the next time steps, added up one delay at a time like tick scheduling does, so that they
+        # are rounded the same way. They are due at the latest two steps after the estimate.
+        n = int(max(np.max((threshold - clock) / self.delay, initial=0), 0)) + 2
+        clocks = np.full((len(clock), n + 1), self.delay)
+        clocks[:, 0] = clock
+        np.add.accumulate(clocks, axis=1, out=clocks)
+        ticks = np.argmax(clocks[:, 1:] >= threshold[:, None], axis=1) + 1
+        return ticks, clocks[np.arange(len(clock)), ticks]
+
+    def schedule_pedestrians(self, rows):
+        """Put pedestrians into the calendar queue of event scheduling, in the time step in which they are due.
+        Pedestrians without speed are never due.
+        """
+        P = self.population
+        rows = rows[np.isfinite(P.lag[rows])]
+        ticks, clocks = self.ticks_until_due(P.clock[rows], P.lag[rows])
+        ticks += self.tick
+        P.next_move[rows] = ticks
+        for tick in np.unique(ticks).tolist():
+            bucket = self.schedule.get(tick)
+            if bucket is None:
+                bucket = self.schedule[tick] = []
+                heapq.heappush(self.schedule_ticks, tick)
+            in_tick = ticks == tick
+            bucket.append((P.ids[rows[in_tick]], clocks[in_tick]))
+
+    def synchronize_clocks(self):
+        """Bring the clocks of the pedestrians in the calendar queue up to the current time step, as tick scheduling
+        keeps them.
+        """
+        P = self.population
+        rows = np.nonzero(~P.removed & ~np.isnan(P.next_move))[0]
+        # The clocks were last updated ticks_until_due() time steps before the step in which the pedestrians are due
+        ticks, _ = self.ticks_until_due(P.clock[rows], P.lag[rows])
+        elapsed = self.tick - (P.next_move[rows].astype(np.int64) - ticks)
+        for i in range(int(elapsed.max(initial=0))):
+            P.clock[rows[elapsed > i]] += self.delay
+        P.next_move[:] = np.nan
+
+    def next_tick(self):
+        """The time step of the next step. It is the following one with tick scheduling, and the first one in which
+        a pedestrian is due to move with event scheduling.
+        """
+        if self.scheduling == TICK_SCHEDULING:
+            return self.tick + 1
+        if self.schedule is None:
+            self.schedule = {}
+            self.schedule_ticks = []
+            self.schedule_pedestrians(np.nonzero(~self.population.removed)[0])
+        while self.schedule_ticks and self.schedule_ticks[0] <= self.tick:
+            heapq.heappop(self.schedule_ticks)
+        if not self.schedule_ticks:
+            return self.tick + 1
+        return self.schedule_ticks[0]
+
+    def next_time(self):
+        """The simulated time of the next step."""
+        now = self.now
+        for _ in range(self.next_tick() - self.tick):
+            now += self.delay
+        return now
+
+    def step(self):
+        """Advance the simulation by one time step, i.e. self.delay seconds of simulated time
+        with tick scheduling, or to the next time a pedestrian is due to move with event scheduling.
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+        # The time is added up step by step, so that it is the same with both schedulings
+        for _ in range(self.next_tick() - self.tick):
+            self.now += self.delay
+            self.tick += 1
+        if profiler is not None:
+            profiler.lap("schedule")
+        for observer in self.observers:
+            observer.time_changed(self.now)
+        if profiler is not None:
+            profiler.lap("observers")
+        self.updateState()
+        for observer in self.observers:
+            observer.step_finished(self.now)
+        if profiler is not None:
+            profiler.lap("observers")
+            profiler.end_step(self.now)
+
+        self.step_count += 1
+        if self.tile_size is not None and self.step_count % COMPACT_INTERVAL == 0:
+            self.compact_grids()
+        wall, steps = self.rate_reference
+        elapsed = time.perf_counter() - wall
+        if elapsed >= 1:
+            self.steps_per_second = (self.step_count - steps) / elapsed
+            self.rate_reference = (wall + elapsed, self.step_count)
+
+    def run(self, until=None, real_time_factor=None):
+        """Run the simulation headlessly. It computes the distance cost and then steps until the simulation
+        pauses itself (e.g. all pedestrians reached the targets) or the simulated time reaches the given limit.
+
+        Parameters
+        ----------
+        until : float, optional
+            the simulated time in seconds at which the simulation stops, by default None (no limit)
+        real_time_factor : float, optional
+            run the simulation this many times faster than the wall time, by default None (as fast as possible)
+
+        Returns
+        -------
+        float
+            the simulated time when the simulation stopped
+        """
+        self.compute_dist_cost()
+        self.paused = False
+        start = time.perf_counter()
+        first_step = self.step_count
+        pace_reference = None
+        while not self.paused:
+            if until is not None and self.next_time() > until + 0.0001:
+                self.paused = True
+                break
+            self.step()
+            pace_reference = self.pace(pace_reference, real_time_factor)
+
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.steps_per_second = (self.step_count - first_step) / elapsed
+        return self.now
+
+    def pace(self, reference, real_time_factor):
+        """Sleep until the wall time that passed since the reference point is the simulated time that passed,
+        divided by the real time factor.
+
+        Parameters
+        ----------
+        reference : tuple
+            the wall time, simulated time and real time factor of the reference point, None to start a new one
+        real_time_factor : float
+            None (or 0) for not sleeping at all
+
+        Returns
+        -------
+        tuple
+            the reference point for the next call
+        """
+        if not real_time_factor:
+            return None
+        wall = time.perf_counter()
+        # Start again if the simulated time was reset (e.g. by RiMEA tests) or the real time factor was changed
+        if reference is None or self.now < reference[1] or real_time_factor != reference[2]:
+            return (wall, self.now, real_time_factor)
+
+        ahead = reference[0] + (self.now - reference[1]) / real_time_factor - wall
+        if ahead > 0:
+            time.sleep(ahead)
+        elif ahead < -1:
+            # Do not try to catch up if the simulation is too slow for the real time factor
+            return (wall, self.now, real_time_factor)
+        return reference
+
+    def clock(self):
+        """The global clocking of the cellular automaton. While the simulation is not paused, this method
+        will update the cellular automaton by calling the method step(), and sleep in between so that the
+        simulation runs real_time_factor times as fast as the wall time.
+        """
+        pace_reference = None
+        while self.running:
+            if self.paused:
+                pace_reference = None
+                time.sleep(self.delay)
+                continue
+
+            with self.step_lock:
+                if self.paused:
+                    continue
+                self.step()
+            pace_reference = self.pace(pace_reference, self.real_time_factor)
+
+    def updateState(self):
+        """The method that update the cellular automaton. It will let all the pedestrians that are
+        about to move to choose the next position according to utility matrix of the last state.
+        Then this method will update these pedestrians in sequence. Those whose expected next position
+        is occupied by others will stay stil and wait for next movement.
+        """
+        P = self.population
+        profiler = self.profiler
+        due = self.find_due_pedestrians()
+        self.agent_steps += len(due)
+        if profiler is not None:
+            profiler.lap("due")
+
+        # Find the neighbor with lowest cost for all pds that are due at once
+        xs, ys = P.x[due], P.y[due]
+        new_xs, new_ys = self.find_best_neighbors(xs, ys, P.group[due])
+        moving = (new_xs != xs) | (new_ys != ys)
+        if profiler is not None:
+            profiler.lap("neighbors")
+
+        # The avoidance cost is not read while moving, so it is updated for all moved pds at once
+        moved_from = []
+        moved_to = []
+        moved = []
+        reached = []
+        for row, x, y, new_x, new_y in zip(due[moving].tolist(), xs[moving].tolist(), ys[moving].tolist(),
+                                           new_xs[moving].tolist(), new_ys[moving].tolist()):
+            new_state = self.crt_state[new_x, new_y]
+            if new_state == PEDESTRIAN:
+                # This means a collision will occur. So the crt pd has to stop.
+                continue
+
+            # After 5s, start speed measuring for RiMEA test 4
+            if self.now - 5 >= 0.00001:
+                in_MA, new_in_MA = self.isMA[x, y], self.isMA[new_x, new_y]
+
+                # Enter the measuring area from left boundary
+                if not in_MA and new_in_MA:
+                    if new_x == self.MA_L_Boundary and x == new_x-1:
+                        P.isInMA[row] = True
+                        P.enterMA_x[row], P.enterMA_y[row] = new_x, new_y
+                        P.time_enterMA[row] = self.now
+                # Leave the MA from right boundary
+                if in_MA and not new_in_MA and P.isInMA[row]:
+                    P.isInMA[row] = False
+                    if x == self.MA_R_Boundary and x == new_x-1:
+                        P.leaveMA_x[row], P.leaveMA_y[row] = new_x, new_y
+                        P.time_leaveMA[row] = self.now
+                        self.speed_measured_pd_list.append(P.view_of_row(row))
+                    # Leave the MA from other boundaries
+                    else:
+                        P.enterMA_x[row], P.enterMA_y[row] = -1, -1
+                        P.time_enterMA[row] = float()
+
+            # Update observers and avoidance cost
+            moved_from.append((x, y))
+            self.crt_state[x, y] = EMPTY
+            id = self.occupant[x, y]
+            self.occupant[x, y] = -1
+            self.notify_cell_changed(x, y)
+
+            if new_state == EMPTY:
+                self.crt_state[new_x, new_y] = PEDESTRIAN
+                self.occupant[new_x, new_y] = id
+                self.notify_cell_changed(new_x, new_y)
+                moved_to.append((new_x, new_y))
+                moved.append(row)
+            elif new_state == TARGET:
+                reached.append(row)  # This pd reaches the target and will disappear
+
+        if moved:
+            P.x[moved], P.y[moved] = np.array(moved_to).T
+        if profiler is not None:
+            profiler.lap("moves")
+        self.remove_avoidance_costs(moved_from)
+        self.add_avoidance_costs(moved_to)
+        if profiler is not None:
+            profiler.lap("avoidance")
+
+        # Remove those pedestrians that reached the target
+        rows = P.n
+        if reached:
+            P.time_reach_target[reached] = self.now
+            P.remove(reached)
+        # Stop if all pedestrians reach the target.
+        if len(self.population) == 0:
+            self.paused = True
+        if profiler is not None:
+            profiler.lap("removal")
+            profiler.count(due=len(due), moves=len(moved_from), collisions=int(moving.sum()) - len(moved_from),
+                           stamps=len(moved_from) + len(moved_to), reached=len(reached),
+                           compactions=int(P.n < rows))
+
+        if self.RiMEA_test_mode == 1 and self.RiMEA_test1_counter > 0 and len(self.population) == 0:
+            self.paused = True
+
+            self.RiMEA_test1_results.append(self.now)
+            self.output_test1_results(RIMEA_TEST1_RUNS - self.RiMEA_test1_counter)
+            self.now = 0
+            self.RiMEA_test1_counter -= 1
+
+            # The series is only torn down after its last run, so that no replicate is queued after it
+            if self.RiMEA_test1_counter == 0:
+                self.close_results()
+                self.RiMEA_test_mode = 0
+                self.RiMEA_test1_counter = RIMEA_TEST1_RUNS
+            else:
+                self.request_replicate(1)
+
+        if self.RiMEA_test_mode == 4 and (self.now > 35 or len(self.population) == 0):
+            self.paused = True
+            self.output_test4_results()
+            self.RiMEA_test_mode = 0
+
+        if self.RiMEA_test_mode == 6 and self.RiMEA_test6_counter > 0 and len(self.population) == 0:
+            self.paused = True
+            self.RiMEA_test6_counter -= 1
+
+            self.RiMEA_test6_results.append(self.now)
+            self.output_test6_results(RIMEA_TEST6_RUNS - 1 - self.RiMEA_test6_counter)
+            self.now = 0
+            if self.RiMEA_test6_counter == 0:
+                self.close_results()
+                self.RiMEA_test_mode = 0
+                self.RiMEA_test6_counter = RIMEA_TEST6_RUNS
+            else:
+                self.request_replicate(6)
+
+        if self.RiMEA_test_mode == 7 and len(self.population) == 0:
+            self.output_test7_results(RIMEA_TEST7_RUNS - self.RiMEA_test7_counter)
+            self.RiMEA_test7_counter -= 1
+            if self.RiMEA_test7_counter == 0:
+                self.close_results()
+                self.RiMEA_test_mode = 0
+                self.RiMEA_test7_counter = RIMEA_TEST7_RUNS
+            else:
+                self.request_replicate(7)
+
+        if profiler is not None:
+            profiler.lap("tests")
+
+    def compute_floor_field(self, method, *args, group=ANY_TARGET):
+        """Compute a floor field of the current obstacles and the targets of a target group by one of the methods
+        in floor_field. The targets of other groups are obstacles in the floor field of a named group.
+        The floor field is taken from the floor field cache if possible. Otherwise, if only a few cells changed
+        since the last floor field of the group was computed by the same method, that floor field is repaired.
+
+        Returns
+        -------
+        tuple
+            the distance matrix and its Floor_Field_Stats, a Tiled_Grid with tiled grids
+        """
+        targets = list(self.group_targets[group])
+        if self.tile_size is None:
+            state = np.asarray(self.crt_state)
+            passable = state != OBSTACLE
+            if group != ANY_TARGET:
+                other_targets = state == TARGET
+                if targets:
+                    other_targets[tuple(np.array(targets).T)] = False
+                passable &= ~other_targets
+        else:
+            # The passable cells and the floor field are computed tile by tile, without dense arrays of the grid
+            passable = self.crt_state.map(lambda state: state != OBSTACLE, bool)
+            if group != ANY_TARGET:
+                other_targets = np.array(sorted(set(self.coord_target) - set(targets)), dtype=np.int64).reshape(-1, 2)
+                other_targets = other_targets[self.crt_state[other_targets[:, 0], other_targets[:, 1]] == TARGET]
+                passable[other_targets[:, 0], other_targets[:, 1]] = False
+            passable.compact()
+            method = floor_field.TILED_METHODS[method]
+        cache = self.floor_field_cache
+
+        dist = None
+        if cache is not None:
+            key = cache.key(method, passable, targets, *args)
+            start = time.perf_counter()
+            dist = cache.get(key)
+            if dist is not None:
+                stats = floor_field.Floor_Field_Stats(method.__name__, 0, time.perf_counter() - start, cached=True)
+
+        if dist is None:
+            repair = floor_field.REPAIR_METHODS.get(method)
+            last = self.floor_field_input.get(group)
+            if repair is not None and last is not None and last[:2] == (method, args) and self.tile_size is None:
+                changed = floor_field.changed_cells(last[2], last[3], passable, targets)
+                if len(changed) <= self.max_repair_cells:
+                    dist = last[4].copy()
+                    stats = repair(dist, passable, targets, changed, *args)
+            if dist is None:
+                dist, stats = method(passable, targets, *args)
+            if cache is not None:
+                cache.put(key, dist)
+
+        # Tiled grids do not keep a dense copy of the floor field for repairs
+        if self.tile_size is None:
+            self.floor_field_input[group] = (method, args, passable, targets, dist)
+        return dist, stats
+
+    def get_euclidean_distance(self, dist, group=ANY_TARGET):
+        """Calculate the distance cost in each cell of the CA by Euclidean distance.
+
+        Parameters
+        ----------
+        dist : 2D Array
+            The computed distance matrix will be passed to this variable.
+        group : integer, optional
+            the target group, by default ANY_TARGET
+        """
+        dist[:, :], self.floor_field_stats = self.compute_floor_field(
+            floor_field.euclidean_distance, self.width + self.height, group=group)
+
+    def get_dijkstra_distance(self, dist, group=ANY_TARGET):
+        """Calculate the distance cost in each cell of the CA by running Dijkstra algorithm.
+        The distance matrix will contain the shortest-path distance to the targets.
+
+        Parameters
+        ----------
+        dist : 2D Array
+            The computed distance matrix will be passed to this variable.
+        group : integer, optional
+            the target group, by default ANY_TARGET
+        """
+        dist[:, :], self.floor_field_stats = self.compute_floor_field(
+            floor_field.dijkstra_distance, 1/NUM_OF_UNIT_LEN_PER_METER, self.width + self.height, group=group)
+
+    def get_fast_marching_distance(self, dist, group=ANY_TARGET):
+        """Calculate the distance cost in each cell of the CA by the fast marching method, which gives
+        isotropic distances to the targets.
+
+        Parameters
+        ----------
+        dist : 2D Array
+            The computed distance matrix will be passed to this variable.
+        group : integer, optional
+            the target group, by default ANY_TARGET
+        """
+        dist[:, :], self.floor_field_stats = self.compute_floor_field(
+            floor_field.fast_marching_distance, 1/NUM_OF_UNIT_LEN_PER_METER, self.width + self.height,
+            group=group)
+
+    def find_due_pedestrians(self):
+        """Find the pedestrians that are due to move at the current time, according to their speed.
+
+        Returns
+        -------
+        Array
+            the rows of the due pedestrians in the population, in the order of the population
+        """
+        P = self.population
+        if self.scheduling == TICK_SCHEDULING:
+            # Speed control
+            clock = P.clock
+            clock += self.delay
+            due = ~(clock < P.lag - 0.0001) & ~P.removed
+            clock[due] -= P.lag[due]  # reset clocking of due pedestrians
+            return np.nonzero(due)[0]
+
+        bucket = self.schedule.pop(self.tick, [])
+        if not bucket:
+            return np.zeros(0, dtype=np.int64)
+        due = P.rows(np.concatenate([ids for ids, clocks in bucket]))
+        clocks = np.concatenate([clocks for ids, clocks in bucket])
+        # Removed pedestrians are dropped from the queue here
+        order = np.argsort(due)
+        order = order[due[order] >= 0]
+        due = due[order]
+        P.clock[due] = clocks[order] - P.lag[due]  # reset clocking of due pedestrians
+        self.schedule_pedestrians(due)
+        return due
+
+    def find_best_neighbors(self, xs, ys, groups=None):
+        """Find the neighbor with lowest cost for many pedestrians at once. The cost of a neighbor is its
+        distance cost to the targets of the pedestrian's group plus its avoidance cost without the avoidance
+        cost that the pedestrian contributes to itself, and it is 0 for targets of the group. The targets of
+        other groups cannot be entered. Ties are broken by the order of DIRECTIONS.
+
+        Parameters
+        ----------
+        xs : Array
+            x coordinates of the pedestrians
+        ys : Array
+            y coordinates of the pedestrians
+        groups : Array, optional
+            the target groups of the pedestrians, by default all ANY_TARGET
+
+        Returns
+        -------
+        tuple
+            the arrays of the x and y coordinates of the chosen neighbors
+        """
+        nxs = xs[:, None] + DIRECTIONS_DX
+        nys = ys[:, None] + DIRECTIONS_DY
+        inside = (nxs >= 0) & (nxs < self.width) & (nys >= 0) & (nys < self.height)
+        cxs = np.minimum(np.maximum(nxs, 0), self.width-1)
+        cys = np.minimum(np.maximum(nys, 0), self.height-1)
+
+        if groups is None or len(self.dist_costs) == 1:
+            dist = self.dist_cost[cxs, cys]
+            other_targets = False
+        else:
+            # Pedestrians of the same group share the floor field of the group
+            dist = np.empty(cxs.shape, dtype=COST_DTYPE)
+            for group in np.unique(groups).tolist():
+                in_group = groups == group
+                dist[in_group] = self.dist_costs[group][cxs[in_group], cys[in_group]]
+            # The targets of the group are the targets with the distance 0
+            other_targets = (groups[:, None] != ANY_TARGET) & (dist != 0)
+
+        total_cost = dist + (self.avd_cost[cxs, cys] - self.avoid_cost_to_neighbors)
+        is_target = self.crt_state[cxs, cys] == TARGET
+        total_cost[is_target] = 0
+        total_cost[is_target & other_targets] = np.inf
+        total_cost[~inside] = np.inf
+
+        # argmin takes the first of equal costs, i.e. the first such direction
+        best = np.argmin(total_cost, axis=1)
+        rows = np.arange(len(xs))
+        return nxs[rows, best], nys[rows, best]
+
+    def get_neighbors(self, x, y):
+        """Get the neighbors of a given position (x,y)
+        Parameters
+        ----------
+        x : integer
+        y : integer
+
+        Returns
+        -------
+        List
+            the tuple list of neighbors' coordinates of (x, y)
+        """
+        neighbors = []
+        for (dx, dy) in DIRECTIONS:
+            if x+dx >= 0 and x+dx < self.width and y+dy >= 0 and y+dy < self.height:
+                neighbors.append((x+dx, y+dy))
+        return neighbors
+
+    def RiMEA_results(self, test, run=0, pedestrians=None):
+        """The results of the current run of a RiMEA test.
+
+        Parameters
+        ----------
+        test : string
+            one of the keys of results.SCHEMAS
+        run : int, optional
+            the number of the run, by default 0
+        pedestrians : list, optional
+            the Pedestrians of test 7, by default RiMEA_test7_pd
+
+        Returns
+        -------
+        numpy structured array
+            the records of results.SCHEMAS[test]
+        """
+        if test in ("test1", "test6"):
+            records = np.zeros(1, dtype=results.SCHEMAS[test])
+            records["time"] = self.now if len(self.population) == 0 else math.nan
+            if test == "test1":
+                records["speed"] = RIMEA_TEST1_DISTANCE / records["time"]
+        elif test == "test4":
+            pds = self.speed_measured_pd_list
+            records = np.zeros(len(pds), dtype=results.SCHEMAS[test])
+            records["density"] = self.test4_density
+            records["pedestrian"] = np.arange(len(pds))
+            records["speed"] = self.measured_speeds()
+            for i, pd in enumerate(pds):
+                records[i]["enter_x"], records[i]["enter_y"] = pd.coord_enterMA
+                records[i]["leave_x"], records[i]["leave_y"] = pd.coord_leaveMA
+                records[i]["duration"] = pd.time_leaveMA - pd.time_enterMA
+        else:
+            pds = self.RiMEA_test7_pd if pedestrians is None else pedestrians
+            records = np.zeros(len(pds), dtype=results.SCHEMAS[test])
+            records["pedestrian"] = np.arange(len(pds))
+            for i, pd in enumerate(pds):
+                records[i]["age"] = pd.age
+                records[i]["assigned_speed"] = pd.std_speed
+                records[i]["distance"] = pd.distance_to_target
+                records[i]["time"] = pd.time_reach_target if pd.removed else math.nan
+            records["simulated_speed"] = records["distance"] / records["time"]
+        records["run"] = run
+        return records
+
+    def write_results(self, test, records, truncate=False):
+        """Stream records into the results of a RiMEA test. The writer stays open until close_results().
+
+        Parameters
+        ----------
+        test : string
+            one of the keys of results.SCHEMAS
+        records : numpy structured array
+        truncate : bool, optional
+            whether to delete the existing results before writing the records, by default False. Only the first
+            run of a series should truncate, since a writer may also be reopened in the middle of a series.
+        """
+        if truncate or self.results_writer is None or self.results_writer.test != test:
+            self.close_results()
+            self.results_writer = results.Results_Writer(test, self.results_format, self.results_directory,
+                                                         truncate=truncate)
+        self.results_writer.extend(records)
+
+    def close_results(self):
+        """Write the records that are still buffered and close the writer."""
+        if self.results_writer is not None:
+            self.results_writer.close()
+            self.results_writer = None
+
+    def output_test1_results(self, run):
+        # A series of runs replaces the results of the last series when its first run is written
+        self.write_results("test1", self.RiMEA_results("test1", run), truncate=run == 0)
+
+    def output_test4_results(self):
+        # The results of all densities are kept, so that they can be compared
+        self.write_results("test4", self.RiMEA_results("test4"))
+        self.close_results()
+
+    def measured_speeds(self):
+        """
+        Returns
+        -------
+        list
+            the speed in m/s of each pedestrian that has passed through the measuring area
+        """
+        speedList = []
+        for pd in self.speed_measured_pd_list:
+            speedList.append(self.manhattanDist(
+                pd.coord_enterMA, pd.coord_leaveMA)/((pd.time_leaveMA-pd.time_enterMA)*3))
+        return speedList
+
+    def output_test6_results(self, run):
+        self.write_results("test6", self.RiMEA_results("test6", run), truncate=run == 0)
+
+    def output_test7_results(self, run):
+        self.write_results("test7", self.RiMEA_results("test7", run), truncate=run == 0)
+        self.RiMEA_test7_pd = []
+
+    def manhattanDist(self, p, q):
+        """Calculate the Manhattan distance between two points
+
+        Parameters
+        ----------
+        p : tuple
+            consists of the x,y coordinates of a point
+        q : tuple
+            consists of the x,y coordinates of a point
+
+        Returns
+        -------
+        int
+            the Manhattan distance between p and q
+        """
+        return abs(p[0]-q[0]) + abs(p[1]-q[1])
+
+    def avoidance_kernel_slices(self, x, y):
+        """Clip the avoidance kernel centered at (x, y) to the borders of the CA.
+
+        Returns
+        -------
+        tuple
+            the slices of the CA and the slices of the kernel that overlap
+        """
+        r = self.dmax - 1
+        x0, x1 = max(x-r, 0), min(x+r+1, self.width)
+        y0, y1 = max(y-r, 0), min(y+r+1, self.height)
+        return ((slice(x0, x1), slice(y0, y1)),
+                (slice(x0-x+r, x1-x+r), slice(y0-y+r, y1-y+r)))
+
+    def add_avoidance_cost(self, x, y):
+        if self.tile_size is not None:
+            self.stamp_tiled_avoidance_costs([(x, y)], 1)
+            return
+        grid, kernel = self.avoidance_kernel_slices(x, y)
+        self.avd_cost[grid] += self.avoid_kernel[kernel]
+
+    def remove_avoidance_cost(self, x, y):
+        if self.tile_size is not None:
+            self.stamp_tiled_avoidance_costs([(x, y)], -1)
+            return
+        grid, kernel = self.avoidance_kernel_slices(x, y)
+        self.avd_cost[grid] -= self.avoid_kernel[kernel]
+
+    def stamp_avoidance_costs(self, coords, sign):
+        """Add (sign=1) or remove (sign=-1) the avoidance costs of many pedestrians in one call.
+        The costs are accumulated pedestrian by pedestrian, so the result is the same as calling
+        add_avoidance_cost()/remove_avoidance_cost() for each of them in order.
+
+        Parameters
+        ----------
+        coords : List/Array
+            the (x, y) coordinates of the pedestrians
+        sign : integer
+        """
+        if self.tile_size is not None:
+            self.stamp_tiled_avoidance_costs(coords, sign)
+            return
+        if len(coords) < 8:
+            # Slicing is faster for a few pedestrians
+            for (x, y) in coords:
+                grid, kernel = self.avoidance_kernel_slices(x, y)
+                self.avd_cost[grid] += sign*self.avoid_kernel[kernel]
+            return
+        coords = np.asarray(coords)
+        xs = (coords[:, 0, None] + self.avoid_kernel_dx).ravel()
+        ys = (coords[:, 1, None] + self.avoid_kernel_dy).ravel()
+        values = np.broadcast_to(sign*self.avoid_kernel_values, (len(coords), len(self.avoid_kernel_values))).ravel()
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        np.add.at(self.avd_cost, (xs[inside], ys[inside]), values[inside])
+
+    def stamp_tiled_avoidance_costs(self, coords, sign):
+        """stamp_avoidance_costs() for tiled grids. The tiles that no avoidance kernel overlaps any more are
+        released, so that they take no memory and their cost is exactly 0 again.
+        """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+        if len(coords) == 0:
+            return
+        xs = (coords[:, 0, None] + self.avoid_kernel_dx).ravel()
+        ys = (coords[:, 1, None] + self.avoid_kernel_dy).ravel()
+        values = np.broadcast_to(sign*self.avoid_kernel_values, (len(coords), len(self.avoid_kernel_values))).ravel()
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+
+        # The kernel is smaller than a tile, so it overlaps the tiles of the corners of its bounding box
+        r = self.dmax - 1
+        tx0 = np.maximum(coords[:, 0] - r, 0) // self.tile_size
+        tx1 = np.minimum(coords[:, 0] + r, self.width - 1) // self.tile_size
+        ty0 = np.maximum(coords[:, 1] - r, 0) // self.tile_size
+        ty1 = np.minimum(coords[:, 1] + r, self.height - 1) // self.tile_size
+        txs = np.concatenate((tx0, tx1[tx1 != tx0], tx0[ty1 != ty0], tx1[(tx1 != tx0) & (ty1 != ty0)]))
+        tys = np.concatenate((ty0, ty0[tx1 != tx0], ty1[ty1 != ty0], ty1[(tx1 != tx0) & (ty1 != ty0)]))
+        np.add.at(self.avoid_tile_counts, (txs, tys), sign)
+
+        self.avd_cost.add_at(xs[inside], ys[inside], values[inside])
+        if sign < 0:
+            unused = self.avoid_tile_counts[txs, tys] == 0
+            self.avd_cost.release(txs[unused], tys[unused])
+
+    def add_avoidance_costs(self, coords):
+        self.stamp_avoidance_costs(coords, 1)
+
+    def remove_avoidance_costs(self, coords):
+        self.stamp_avoidance_costs(coords, -1)
+
+    def add_pedestrian(self, pd):
+        row = self.population.add(pd)
+        if self.schedule is not None:
+            self.schedule_pedestrians(np.array([row]))
+        self.crt_state[pd.x, pd.y] = PEDESTRIAN
+        self.occupant[pd.x, pd.y] = pd.id
+        self.notify_cell_changed(pd.x, pd.y)
+        self.add_avoidance_cost(pd.x, pd.y)
+
+    def add_pedestrians(self, xs, ys, speeds=1.33, ages=30, groups=ANY_TARGET):
+        """Add many pedestrians at once, without creating a Pedestrian object for each of them.
+
+        Parameters
+        ----------
+        xs : Array
+        ys : Array
+        speeds : Array/float, optional
+            by default the speed of a Pedestrian
+        ages : Array/int, optional
+            by default the age of a Pedestrian
+        groups : Array/int, optional
+            the target groups, see add_target_group(), by default ANY_TARGET
+
+        Returns
+        -------
+        Array
+            the rows of the new pedestrians in the population
+        """
+        rows = self.population.add_many(xs, ys, speeds, ages, groups)
+        if self.schedule is not None:
+            self.schedule_pedestrians(rows)
+        self.occupant[xs, ys] = self.population.ids[rows]
+        self.crt_state[xs, ys] = PEDESTRIAN
+        self.notify_cells_changed(xs, ys)
+        self.add_avoidance_costs(list(zip(np.asarray(xs).tolist(), np.asarray(ys).tolist())))
+        return rows
+
+    def add_obstacle(self, x, y):
+        self.crt_state[x, y] = OBSTACLE
+        self.notify_cell_changed(x, y)
+
+    def add_obstacles(self, xs, ys):
+        """Add many obstacles at once.
+
+        Parameters
+        ----------
+        xs : Array
+        ys : Array
+        """
+        self.crt_state[xs, ys] = OBSTACLE
+        self.notify_cells_changed(xs, ys)
+
+    def remove_obstacle(self, x, y):
+        self.crt_state[x, y] = EMPTY
+        self.notify_cell_changed(x, y)
+
+    def add_target_group(self, name):
+        """Add a named group of targets, e.g. an exit or a platform, unless there is one of this name already.
+        The pedestrians of a group head to the nearest target of the group, by the floor field of the group.
+
+        Parameters
+        ----------
+        name : string
+
+        Returns
+        -------
+        integer
+            the index of the group, i.e. the group of its pedestrians
+        """
+        if name not in self.target_groups:
+            self.target_groups[name] = len(self.group_targets)
+            self.group_targets.append([])
+            self.dist_costs.append(self.new_dist_cost())
+        return self.target_groups[name]
+
+    def add_target(self, x, y, group=None):
+        """
+        Parameters
+        ----------
+        x : integer
+        y : integer
+        group : string, optional
+            the name of the target group of the target, by default None (no named group)
+        """
+        if self.crt_state[x, y] != TARGET:
+            self.coord_target.append((x, y))
+        if group is not None:
+            self.group_targets[self.add_target_group(group)].append((x, y))
+        self.crt_state[x, y] = TARGET
+        self.notify_cell_changed(x, y)
+
+    def add_targets(self, xs, ys, group=None):
+        """Add many targets at once. Cells that are targets already are left as they are, except that they are
+        added to the group.
+
+        Parameters
+        ----------
+        xs : Array
+        ys : Array
+        group : string, optional
+            the name of the target group of the targets, by default None (no named group)
+        """
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        if group is not None:
+            targets = self.group_targets[self.add_target_group(group)]
+            known = set(targets)
+            targets.extend(cell for cell in zip(xs.tolist(), ys.tolist()) if cell not in known)
+        new = self.crt_state[xs, ys] != TARGET
+        xs, ys = xs[new], ys[new]
+        self.coord_target.extend(zip(xs.tolist(), ys.tolist()))
+        self.crt_state[xs, ys] = TARGET
+        self.notify_cells_changed(xs, ys)
+
+    def remove_target(self, x, y):
+        for targets in self.group_targets:
+            if (x, y) in targets:
+                targets.remove((x, y))
+        self.crt_state[x, y] = EMPTY
+        self.notify_cell_changed(x, y)
+
+    def add_measuring_area(self, l, r, u, d):
+        self.MA_L_Boundary = l
+        self.MA_R_Boundary = r
+        self.MA_U_Boundary = u
+        self.MA_D_Boundary = d
+        self.isMA[l:r+1, u:d+1] = True
+        for x in range(l, r+1, 1):
+            for y in range(u, d+1, 1):
+                self.notify_cell_changed(x, y)
+
+    def pedestrian_at(self, x, y):
+        """
+        Returns
+        -------
+        Pedestrian
+            the pedestrian in the cell (x, y), None if there is none
+        """
+        id = self.occupant[x, y]
+        if id < 0:
+            return None
+        return self.population.view(int(id))
+
+    def remove_pedestrian(self, x, y):
+        self.crt_state[x, y] = EMPTY
+        self.notify_cell_changed(x, y)
+        id = self.occupant[x, y]
+        if id >= 0:
+            self.occupant[x, y] = -1
+            self.population.remove([self.population.row_of_id[id]])
+            self.remove_avoidance_cost(x, y)
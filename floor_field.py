@@ -0,0 +1,739 @@
+import os
+import time
+import math
+import heapq
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from tiled_grid import Tiled_Grid
+
+# Floor fields are kept here between processes, in the cache directory of the user unless the environment variable
+# FLOOR_FIELD_CACHE_DIRECTORY names another one
+DEFAULT_CACHE_DIRECTORY = os.environ.get("FLOOR_FIELD_CACHE_DIRECTORY") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "mlcms_cellular_automaton",
+    "floor_field")
+# The floor fields on disk take at most this many bytes. The least recently used ones are deleted first.
+DEFAULT_MAX_DISK_BYTES = 256 * 2**20
+# The data type of the floor fields on tiled grids
+TILED_DIST_DTYPE = np.float32
+# The version of the floor field methods and of their files. It is part of the keys of Floor_Field_Cache, so raise it
+# whenever a method changes its results, and floor fields cached by the older version are not used any more.
+FLOOR_FIELD_VERSION = 2
+
+
+class Floor_Field_Stats:
+    """
+    This class records how a floor field was computed, so that the cost of the computation can be reported.
+    """
+
+    def __init__(self, method, nodes_expanded=0, seconds=0., cached=False):
+        self.method = method
+        self.nodes_expanded = nodes_expanded  # number of cells whose distance has been finalized
+        self.seconds = seconds  # wall time of the computation
+        self.cached = cached  # whether the floor field was taken from a Floor_Field_Cache
+
+    def __repr__(self):
+        if self.cached:
+            return "{}: loaded from cache in {:.4f}s".format(self.method, self.seconds)
+        return "{}: {} nodes expanded in {:.4f}s".format(self.method, self.nodes_expanded, self.seconds)
+
+
+class Floor_Field_Cache:
+    """
+    This class caches computed floor fields, keyed by a hash of everything they depend on: the obstacle mask,
+    the set of targets, the cost function and its parameters. The most recently used fields are kept in memory,
+    and every field is also written to a directory as .npy file, so that other processes (and later runs) can
+    memory-map it instead of computing it again. Floor fields on tiled grids are written as .npz files of their
+    tiles. The directory is kept below max_disk_bytes by deleting the
+    files that were least recently used, by their modification time.
+    """
+
+    def __init__(self, capacity=16, directory=DEFAULT_CACHE_DIRECTORY, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        """
+        Parameters
+        ----------
+        capacity : integer, optional
+            the maximal number of floor fields in memory, by default 16
+        directory : string, optional
+            where the floor fields are stored on disk, None to keep them in memory only, by default
+            DEFAULT_CACHE_DIRECTORY
+        max_disk_bytes : integer, optional
+            the maximal size of the floor fields on disk, by default DEFAULT_MAX_DISK_BYTES
+        """
+        self.capacity = capacity
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, method, passable, targets, *args):
+        """Hash the inputs of a floor field computation and FLOOR_FIELD_VERSION. The order of the targets does not
+        matter.
+        """
+        targets = np.asarray(targets, dtype=np.int64).reshape(-1, 2)
+        target_set = np.unique(targets[:, 0]*passable.shape[1] + targets[:, 1])
+        h = hashlib.sha1()
+        h.update(repr((FLOOR_FIELD_VERSION, method.__name__, passable.shape, args)).encode())
+        if isinstance(passable, Tiled_Grid):
+            passable.hash_into(h)
+        else:
+            h.update(np.packbits(passable).tobytes())
+        h.update(target_set.tobytes())
+        return h.hexdigest()
+
+    def path(self, key, extension=".npy"):
+        return os.path.join(self.directory, key + extension)
+
+    def get(self, key):
+        """Look up a floor field in memory and then on disk.
+
+        Returns
+        -------
+        2D Array
+            the (read-only) floor field, or None if it is not cached
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.directory is None:
+            return None
+        for extension in (".npy", ".npz"):
+            path = self.path(key, extension)
+            if not os.path.exists(path):
+                continue
+            try:
+                dist = np.load(path, mmap_mode='r') if extension == ".npy" else Tiled_Grid.load(path)
+                # Mark the file as recently used, so that it is trimmed last
+                os.utime(path)
+            except (OSError, ValueError, KeyError):
+                # Deleted by another process in the meantime
+                return None
+            self.remember(key, dist)
+            return dist
+        return None
+
+    def put(self, key, dist):
+        tiled = isinstance(dist, Tiled_Grid)
+        if not tiled:
+            dist.flags.writeable = False
+        self.remember(key, dist)
+        if self.directory is not None:
+            # Write to a temporary file first, so that concurrent readers never see a partial file
+            extension = ".npz" if tiled else ".npy"
+            tmp_path = "{}.{}.tmp{}".format(self.path(key, ""), os.getpid(), extension)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                if tiled:
+                    with open(tmp_path, "wb") as file:
+                        dist.save(file)
+                else:
+                    np.save(tmp_path, dist)
+                os.replace(tmp_path, self.path(key, extension))
+                self.trim()
+            except OSError:
+                # The disk store is only an optimization
+                pass
+
+    def trim(self):
+        """Delete the least recently used floor fields on disk until they take at most max_disk_bytes."""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith((".npy", ".npz")) and not name.endswith((".tmp.npy", ".tmp.npz")):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # E.g. memory-mapped by another process on Windows
+                continue
+            total -= size
+
+    def remember(self, key, dist):
+        self.entries[key] = dist
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def compute(self, method, passable, targets, *args):
+        """Return the floor field method(passable, targets, *args) from the cache, or compute and cache it.
+
+        Returns
+        -------
+        tuple
+            the distance matrix and its Floor_Field_Stats
+        """
+        start = time.perf_counter()
+        key = self.key(method, passable, targets, *args)
+        dist = self.get(key)
+        if dist is not None:
+            self.hits += 1
+            return dist, Floor_Field_Stats(method.__name__, 0, time.perf_counter() - start, cached=True)
+
+        self.misses += 1
+        dist, stats = method(passable, targets, *args)
+        self.put(key, dist)
+        return dist, stats
+
+    def clear(self, disk=False):
+        """Forget all floor fields in memory, and on disk if disk=True."""
+        self.entries.clear()
+        if disk and self.directory is not None and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith((".npy", ".npz")):
+                    os.remove(os.path.join(self.directory, name))
+
+
+# The cache shared by all cellular automata of this process
+CACHE = Floor_Field_Cache()
+# The cache of the cellular automata with tiled grids, which keeps no dense floor fields in memory
+DISK_CACHE = Floor_Field_Cache(capacity=0)
+
+
+def target_indices(passable, targets):
+    """Convert target coordinates into flat indices of the grid, dropping duplicates and targets
+    that are not passable.
+
+    Parameters
+    ----------
+    passable : 2D Array
+        boolean mask of the cells that can be walked on
+    targets : List/Array
+        the (x, y) coordinates of the targets
+
+    Returns
+    -------
+    Array
+        the flat indices of the targets
+    """
+    targets = np.asarray(targets, dtype=np.intp).reshape(-1, 2)
+    indices = np.unique(np.ravel_multi_index((targets[:, 0], targets[:, 1]), passable.shape))
+    return indices[passable.ravel()[indices]]
+
+
+def lower_envelope(positions, values, length):
+    """Calculate min over c of (q - positions[c])**2 + values[:, c] for every q in range(length), i.e. the lower
+    envelope of one parabola per position, for many rows at once. This is the exact one-dimensional distance
+    transform of Felzenszwalb and Huttenlocher: the parabolas are added from left to right to a stack, dropping
+    the ones that are hidden by the new one, so the work grows linearly with the number of positions and length.
+    The intersections are compared as fractions of integers, so the result is exact.
+
+    Parameters
+    ----------
+    positions : Array
+        the distinct positions of the parabolas in increasing order
+    values : 2D Array
+        the integer value of each parabola at its position, one row per envelope
+    length : integer
+
+    Returns
+    -------
+    2D Array
+        the envelope of each row at 0, ..., length-1
+    """
+    rows, count = values.shape
+    heights = values + positions**2
+    # The stack of the envelope of each row: the parabolas and where they start to be the lowest, as fractions
+    stack = np.zeros((rows, count), dtype=np.intp)
+    start_num = np.zeros((rows, count), dtype=np.int64)
+    start_den = np.ones((rows, count), dtype=np.int64)
+    flat_stack, flat_num, flat_den = stack.reshape(-1), start_num.reshape(-1), start_den.reshape(-1)
+    flat_heights = heights.reshape(-1)
+    base = np.arange(rows) * count
+    top = np.zeros(rows, dtype=np.intp)  # the index of the top of the stack
+
+    # The top of the stack of each row, so that the rows whose top stays do not have to look it up
+    parabola = np.zeros(rows, dtype=np.intp)
+    height = heights[:, 0].copy()
+    num = np.zeros(rows, dtype=np.int64)
+    den = np.ones(rows, dtype=np.int64)
+    for c in range(1, count):
+        position = positions[c]
+        new_height = heights[:, c]
+        # The new parabola is lower than the top one from (new_num/new_den) on
+        new_num = new_height - height
+        new_den = 2 * (position - positions[parabola])
+        popped = np.flatnonzero((top > 0) & (new_num*den <= num*new_den))
+        while len(popped) > 0:
+            top[popped] -= 1
+            index = base[popped] + top[popped]
+            parabola[popped] = flat_stack[index]
+            height[popped] = flat_heights[base[popped] + parabola[popped]]
+            num[popped], den[popped] = flat_num[index], flat_den[index]
+            new_num[popped] = new_height[popped] - height[popped]
+            new_den[popped] = 2 * (position - positions[parabola[popped]])
+            popped = popped[(top[popped] > 0) & (new_num[popped]*den[popped] <= num[popped]*new_den[popped])]
+        top += 1
+        index = base + top
+        flat_stack[index], flat_num[index], flat_den[index] = c, new_num, new_den
+        parabola[:] = c
+        height[:] = new_height
+        num, den = new_num, new_den
+
+    # The parabola of the stack at q is the number of parabolas above the bottom that start before q
+    above = np.arange(count) >= 1
+    on_stack = above & (np.arange(count) <= top[:, None])
+    starts = np.clip(start_num[on_stack] // start_den[on_stack] + 1, 0, length)
+    counts = np.bincount(np.nonzero(on_stack)[0]*(length+1) + starts, minlength=rows*(length+1))
+    lowest = np.cumsum(counts.reshape(rows, length+1)[:, :length], axis=1)
+    row_index = np.arange(rows)[:, None]
+    parabolas = stack[row_index, lowest]
+    return (np.arange(length) - positions[parabolas])**2 + values[row_index, parabolas]
+
+
+def squared_distance_blocks(shape, targets, max_elements, align=1):
+    """Calculate the squared Euclidean distance from every cell to the nearest target exactly in integers,
+    in blocks of rows or columns, see squared_distance_to_targets().
+
+    Parameters
+    ----------
+    shape : tuple
+        width and height of the grid
+    targets : Array
+        the (x, y) coordinates of the targets, at least one
+    max_elements : integer
+        the maximal size of the temporary arrays of a block
+    align : integer, optional
+        the number of rows (or columns) of a block is a multiple of this, by default 1
+
+    Yields
+    ------
+    tuple
+        the slices x and y of a block and its squared distances
+    """
+    width, height = shape
+    columns, inverse = np.unique(targets[:, 0], return_inverse=True)
+    if len(np.unique(targets[:, 1])) < len(columns):
+        for y, x, sq in squared_distance_blocks((height, width), targets[:, ::-1], max_elements, align):
+            yield x, y, sq.T
+        return
+
+    # Distance to the nearest target in the same column, from below and from above
+    is_target = np.zeros((len(columns), height), dtype=bool)
+    is_target[inverse, targets[:, 1]] = True
+    y = np.arange(height)
+    below = np.maximum.accumulate(np.where(is_target, y, -2*height), axis=1)
+    above = np.minimum.accumulate(np.where(is_target, y, 3*height)[:, ::-1], axis=1)[:, ::-1]
+    column_sq = np.ascontiguousarray((np.minimum(y - below, above - y).astype(np.int64)**2).T)
+
+    # Combine the columns
+    columns = columns.astype(np.int64)
+    block = max(align, max_elements // max(width, len(columns)) // align * align)
+    for i in range(0, height, block):
+        yield slice(None), slice(i, i+block), lower_envelope(columns, column_sq[i:i+block], width).T
+
+
+def squared_distance_to_targets(shape, targets, max_elements=1 << 22):
+    """Calculate the squared Euclidean distance from every cell to the nearest target exactly in integers.
+    The distance is separable: first the distance to the nearest target within each column that contains targets
+    is found by a sweep in each direction, then the columns are combined along each row by lower_envelope().
+    Both passes take linear time in the size of the grid, and the axis with fewer distinct target coordinates is
+    used for the columns.
+
+    Parameters
+    ----------
+    shape : tuple
+        width and height of the grid
+    targets : Array
+        the (x, y) coordinates of the targets, at least one
+    max_elements : integer, optional
+        the maximal size of the temporary arrays of the rows, by default 1 << 22
+
+    Returns
+    -------
+    2D Array
+        the squared distances
+    """
+    sq = np.empty(shape, dtype=np.int64)
+    for x, y, block in squared_distance_blocks(shape, targets, max_elements):
+        sq[x, y] = block
+    return sq
+
+
+def euclidean_distance(passable, targets, unreachable):
+    """Calculate the Euclidean distance (in cells) from every cell to the nearest target, ignoring obstacles
+    in between. Obstacles get the distance unreachable, and distances are capped at this value.
+
+    Parameters
+    ----------
+    passable : 2D Array
+        boolean mask of the cells that can be walked on
+    targets : List/Array
+        the (x, y) coordinates of the targets
+    unreachable : float
+
+    Returns
+    -------
+    tuple
+        the distance matrix and its Floor_Field_Stats
+    """
+    start = time.perf_counter()
+    targets = np.asarray(targets, dtype=np.int64).reshape(-1, 2)
+    dist = np.full(passable.shape, unreachable, dtype=np.float64)
+    if len(targets) > 0:
+        np.minimum(np.sqrt(squared_distance_to_targets(passable.shape, targets)), unreachable, out=dist)
+        dist[~passable] = unreachable
+    return dist, Floor_Field_Stats("euclidean_distance", dist.size, time.perf_counter() - start)
+
+
+def dijkstra_distance(passable, targets, step, unreachable):
+    """Calculate the shortest-path distance from every cell to the nearest target, moving between
+    von Neumann neighbors. All edges have the same length, so the priority queue of Dijkstra's algorithm
+    is a bucket queue whose buckets are the wavefronts around the targets, and a whole wavefront is
+    expanded at once.
+
+    Parameters
+    ----------
+    passable : 2D Array
+        boolean mask of the cells that can be walked on
+    targets : List/Array
+        the (x, y) coordinates of the targets
+    step : float
+        the distance between two neighboring cells
+    unreachable : float
+        the distance assigned to obstacles and unreachable cells. Distances are capped at this value.
+
+    Returns
+    -------
+    tuple
+        the distance matrix and its Floor_Field_Stats
+    """
+    start = time.perf_counter()
+    width, height = passable.shape
+    dist = np.full(passable.shape, unreachable, dtype=np.float64)
+    flat_dist = dist.reshape(-1)
+    # Obstacles are treated as visited, so that they are never expanded
+    visited = ~passable.reshape(-1)
+
+    frontier = target_indices(passable, targets)
+    visited[frontier] = True
+    nodes_expanded = 0
+    distance = 0
+    while frontier.size > 0 and distance < unreachable:
+        flat_dist[frontier] = distance
+        nodes_expanded += frontier.size
+
+        x = frontier // height
+        y = frontier % height
+        neighbors = np.concatenate((frontier[x > 0] - height, frontier[x < width-1] + height,
+                                    frontier[y > 0] - 1, frontier[y < height-1] + 1))
+        frontier = np.unique(neighbors[~visited[neighbors]])
+        visited[frontier] = True
+        # Accumulate the distance step by step, the same way as walking along the path
+        distance += step
+
+    return dist, Floor_Field_Stats("dijkstra_distance", nodes_expanded, time.perf_counter() - start)
+
+
+def fast_marching_distance(passable, targets, step, unreachable):
+    """Calculate the distance from every cell to the nearest target by the fast marching method.
+    It solves the eikonal equation |grad T| = 1 with first-order upwind differences, so the distance
+    is (nearly) isotropic instead of the Manhattan-like distance of Dijkstra's algorithm on the grid.
+
+    Parameters
+    ----------
+    passable : 2D Array
+        boolean mask of the cells that can be walked on
+    targets : List/Array
+        the (x, y) coordinates of the targets
+    step : float
+        the distance between two neighboring cells
+    unreachable : float
+        the distance assigned to obstacles and unreachable cells. Distances are capped at this value.
+
+    Returns
+    -------
+    tuple
+        the distance matrix and its Floor_Field_Stats
+    """
+    start = time.perf_counter()
+    width, height = passable.shape
+    dist = np.full(width*height, math.inf)
+    known = ~passable.reshape(-1)
+    flat_passable = passable.reshape(-1).tolist()
+
+    heap = []
+    for index in target_indices(passable, targets).tolist():
+        dist[index] = 0
+        heap.append((0., index))
+
+    # Work on plain lists in the main loop, which is much faster than indexing the arrays element-wise
+    dist = dist.tolist()
+    known = known.tolist()
+    nodes_expanded = 0
+    while heap:
+        distance, index = heapq.heappop(heap)
+        if known[index]:
+            continue
+        if distance >= unreachable:
+            break
+        known[index] = True
+        nodes_expanded += 1
+
+        x, y = divmod(index, height)
+        for nx, ny in ((x-1, y), (x+1, y), (x, y-1), (x, y+1)):
+            if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                continue
+            neighbor = nx*height + ny
+            if known[neighbor] or not flat_passable[neighbor]:
+                continue
+
+            # Smallest known values in x- and y-direction (upwind)
+            a = min(dist[neighbor-height] if nx > 0 and known[neighbor-height] else math.inf,
+                    dist[neighbor+height] if nx < width-1 and known[neighbor+height] else math.inf)
+            b = min(dist[neighbor-1] if ny > 0 and known[neighbor-1] else math.inf,
+                    dist[neighbor+1] if ny < height-1 and known[neighbor+1] else math.inf)
+            if abs(a-b) >= step:
+                tentative = min(a, b) + step
+            else:
+                tentative = (a + b + math.sqrt(2*step*step - (a-b)*(a-b))) / 2
+
+            if tentative < dist[neighbor]:
+                dist[neighbor] = tentative
+                heapq.heappush(heap, (tentative, neighbor))
+
+    dist = np.array(dist).reshape(width, height)
+    dist[~np.array(known).reshape(width, height) | ~passable] = unreachable
+    return dist, Floor_Field_Stats("fast_marching_distance", nodes_expanded, time.perf_counter() - start)
+
+
+def tiled_euclidean_distance(passable, targets, unreachable):
+    """Calculate the Euclidean distance like euclidean_distance() on a Tiled_Grid. The distances are computed in
+    bands of tiles, so only the tiles with more than one distance take memory.
+
+    Parameters
+    ----------
+    passable : Tiled_Grid
+        boolean mask of the cells that can be walked on
+    targets : List/Array
+        the (x, y) coordinates of the targets
+    unreachable : float
+
+    Returns
+    -------
+    tuple
+        the distance Tiled_Grid and its Floor_Field_Stats
+    """
+    start = time.perf_counter()
+    targets = np.asarray(targets, dtype=np.int64).reshape(-1, 2)
+    T = passable.tile_size
+    dist = Tiled_Grid(passable.shape, unreachable, TILED_DIST_DTYPE, T)
+    if len(targets) > 0:
+        for x, y, sq in squared_distance_blocks(passable.shape, targets, T * max(passable.shape), T):
+            values = np.minimum(np.sqrt(sq), unreachable)
+            values[~passable.region(x, y)] = unreachable
+            dist.set_region(x, y, values)
+    nodes_expanded = passable.shape[0] * passable.shape[1]
+    return dist, Floor_Field_Stats("tiled_euclidean_distance", nodes_expanded, time.perf_counter() - start)
+
+
+def tiled_dijkstra_distance(passable, targets, step, unreachable):
+    """Calculate the shortest-path distance like dijkstra_distance() on a Tiled_Grid. The wavefronts are kept as
+    flat indices and the cells are looked up in the tiles, so only the tiles with more than one distance take
+    memory.
+
+    Parameters
+    ----------
+    passable : Tiled_Grid
+        boolean mask of the cells that can be walked on
+    targets : List/Array
+        the (x, y) coordinates of the targets
+    step : float
+        the distance between two neighboring cells
+    unreachable : float
+        the distance assigned to obstacles and unreachable cells. Distances are capped at this value.
+
+    Returns
+    -------
+    tuple
+        the distance Tiled_Grid and its Floor_Field_Stats
+    """
+    start = time.perf_counter()
+    width, height = passable.shape
+    dist = Tiled_Grid(passable.shape, unreachable, TILED_DIST_DTYPE, passable.tile_size)
+    # Obstacles are treated as visited, so that they are never expanded
+    visited = passable.map(np.logical_not, bool)
+
+    targets = np.asarray(targets, dtype=np.int64).reshape(-1, 2)
+    frontier = np.unique(targets[:, 0]*height + targets[:, 1])
+    frontier = frontier[~visited[frontier // height, frontier % height]]
+    visited[frontier // height, frontier % height] = True
+    nodes_expanded = 0
+    distance = 0
+    while frontier.size > 0 and distance < unreachable:
+        x = frontier // height
+        y = frontier % height
+        dist[x, y] = distance
+        nodes_expanded += frontier.size
+
+        neighbors = np.unique(np.concatenate((frontier[x > 0] - height, frontier[x < width-1] + height,
+                                              frontier[y > 0] - 1, frontier[y < height-1] + 1)))
+        x = neighbors // height
+        y = neighbors % height
+        new = ~visited[x, y]
+        frontier = neighbors[new]
+        visited[x[new], y[new]] = True
+        # Accumulate the distance step by step, the same way as walking along the path
+        distance += step
+
+    return dist, Floor_Field_Stats("tiled_dijkstra_distance", nodes_expanded, time.perf_counter() - start)
+
+
+def tiled_fast_marching_distance(passable, targets, step, unreachable):
+    """Calculate the distance like fast_marching_distance() for a Tiled_Grid. The fast marching method runs on
+    dense arrays, so its peak memory grows with the size of the whole grid; only the result is stored in tiles.
+
+    Returns
+    -------
+    tuple
+        the distance Tiled_Grid and its Floor_Field_Stats
+    """
+    dense, stats = fast_marching_distance(np.asarray(passable), targets, step, unreachable)
+    dist = Tiled_Grid(passable.shape, unreachable, TILED_DIST_DTYPE, passable.tile_size)
+    dist[:, :] = dense
+    stats.method = "tiled_fast_marching_distance"
+    return dist, stats
+
+
+def changed_cells(old_passable, old_targets, passable, targets):
+    """Find the cells where the geometry of two floor fields differs.
+
+    Parameters
+    ----------
+    old_passable : 2D Array
+    old_targets : List/Array
+    passable : 2D Array
+    targets : List/Array
+
+    Returns
+    -------
+    Array
+        the flat indices of the cells that changed passability or were added/removed as targets
+    """
+    changed = np.flatnonzero(old_passable != passable)
+    old_targets = target_indices(np.ones_like(passable), old_targets)
+    targets = target_indices(np.ones_like(passable), targets)
+    return np.union1d(changed, np.setxor1d(old_targets, targets))
+
+
+def repair_dijkstra_distance(dist, passable, targets, changed, step, unreachable):
+    """Repair a distance matrix of dijkstra_distance() in place after a few cells have changed, e.g. an
+    obstacle or target was added or removed. The result is identical to computing the new distance matrix
+    from scratch, but only the cells whose distance actually changes are visited.
+
+    Distances can only grow when obstacles are added or targets removed. So first all cells that lose
+    their shortest path are invalidated: starting from the changed cells, a cell is invalid if none of
+    its neighbors on a shortest path (at exactly one step less) is still valid. Then Dijkstra's algorithm
+    is run again from the border of the invalidated cells and from the new targets, which also takes care
+    of distances that shrink.
+
+    Parameters
+    ----------
+    dist : 2D Array
+        the old distance matrix, will be updated
+    passable : 2D Array
+        the new mask of the cells that can be walked on
+    targets : List/Array
+        the new (x, y) coordinates of the targets
+    changed : List/Array
+        flat indices of all cells whose passability or target status changed
+    step : float
+    unreachable : float
+
+    Returns
+    -------
+    Floor_Field_Stats
+    """
+    start = time.perf_counter()
+    width, height = passable.shape
+    flat_dist = dist.reshape(-1)
+    flat_passable = passable.reshape(-1)
+    is_target = np.zeros(width*height, dtype=bool)
+    is_target[target_indices(passable, targets)] = True
+    invalid = np.zeros(width*height, dtype=bool)
+
+    def neighbors(index):
+        x, y = divmod(index, height)
+        if x > 0:
+            yield index - height
+        if x < width-1:
+            yield index + height
+        if y > 0:
+            yield index - 1
+        if y < height-1:
+            yield index + 1
+
+    # Invalidate in order of the old distance, so that the parents of a cell are decided before the cell
+    changed = set(np.asarray(changed, dtype=np.intp).tolist())
+    heap = [(flat_dist[index], index) for index in changed]
+    heapq.heapify(heap)
+    nodes_expanded = 0
+    while heap:
+        distance, index = heapq.heappop(heap)
+        if invalid[index]:
+            continue
+        if index not in changed:
+            if is_target[index]:
+                continue
+            if any(flat_passable[u] and not invalid[u] and flat_dist[u] + step == distance
+                   for u in neighbors(index)):
+                continue
+        invalid[index] = True
+        nodes_expanded += 1
+        if distance < unreachable:
+            for w in neighbors(index):
+                if flat_passable[w] and not invalid[w] and flat_dist[w] == distance + step:
+                    heapq.heappush(heap, (flat_dist[w], w))
+
+    # Reset the invalid cells and seed them from their valid neighbors
+    invalid_indices = np.flatnonzero(invalid)
+    flat_dist[invalid_indices] = unreachable
+    heap = []
+    for index in invalid_indices.tolist():
+        if not flat_passable[index]:
+            continue
+        if is_target[index]:
+            best = 0
+        else:
+            best = min((flat_dist[u] for u in neighbors(index) if not invalid[u]), default=unreachable) + step
+        if best < unreachable:
+            flat_dist[index] = best
+            heap.append((best, index))
+    heapq.heapify(heap)
+
+    # Dijkstra's algorithm from the seeds
+    while heap:
+        distance, index = heapq.heappop(heap)
+        if distance > flat_dist[index]:
+            continue
+        nodes_expanded += 1
+        for w in neighbors(index):
+            tentative = distance + step
+            if flat_passable[w] and tentative < flat_dist[w] and tentative < unreachable:
+                flat_dist[w] = tentative
+                heapq.heappush(heap, (tentative, w))
+
+    return Floor_Field_Stats("repair_dijkstra_distance", nodes_expanded, time.perf_counter() - start)
+
+
+# The repair function of each floor field method that supports incremental updates
+REPAIR_METHODS = {
+    dijkstra_distance: repair_dijkstra_distance
+}
+
+# The variant of each floor field method that computes it on a Tiled_Grid
+TILED_METHODS = {
+    euclidean_distance: tiled_euclidean_distance,
+    dijkstra_distance: tiled_dijkstra_distance,
+    fast_marching_distance: tiled_fast_marching_distance
+}
@@ -0,0 +1,155 @@
+"""Sweep the density of RiMEA test 4 and compute the fundamental diagram, with all runs in parallel processes.
+
+Example
+-------
+    python fundamental_diagram.py -n 10 --seed 1
+    python fundamental_diagram.py --range 0.5 8 0.5 -n 5
+"""
+import argparse
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+from cellular_automaton import DIJKSTRA, TICK_SCHEDULING
+from replicates import UNTIL, map_replicates
+
+# The densities offered by the GUI
+DEFAULT_DENSITIES = [0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 5.5, 6.0, 6.5, 7.0, 8.0]
+
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "Test4_fundamental_diagram.csv")
+
+# One row per run
+RUN_DTYPE = np.dtype([
+    ("density", np.float64),  # P/m^2
+    ("run", np.int64),
+    ("measured", np.int64),  # number of pedestrians that passed through the measuring area
+    ("mean_speed", np.float64),  # m/s, 0 if nobody passed through the measuring area
+    ("flow", np.float64)  # P/(m*s)
+])
+
+# One row per density
+DIAGRAM_DTYPE = np.dtype([
+    ("density", np.float64),
+    ("replicates", np.int64),
+    ("measured", np.float64),  # mean over the replicates
+    ("mean_speed", np.float64),
+    ("mean_speed_ci_low", np.float64),
+    ("mean_speed_ci_high", np.float64),
+    ("flow", np.float64),
+    ("flow_ci_low", np.float64),
+    ("flow_ci_high", np.float64)
+])
+
+
+class Fundamental_Diagram:
+    """The results of a density sweep.
+
+    Attributes
+    ----------
+    runs : numpy structured array
+        one row of RUN_DTYPE per run
+    diagram : numpy structured array
+        one row of DIAGRAM_DTYPE per density, sorted by density. The confidence intervals are the normal
+        approximation over the replicates of each density.
+    """
+
+    def __init__(self, runs, confidence=0.95):
+        self.runs = runs
+        self.confidence = confidence
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        densities = np.unique(runs["density"])
+        self.diagram = np.zeros(len(densities), dtype=DIAGRAM_DTYPE)
+        for i, density in enumerate(densities):
+            replicates = runs[runs["density"] == density]
+            n = len(replicates)
+            row = self.diagram[i]
+            row["density"] = density
+            row["replicates"] = n
+            row["measured"] = replicates["measured"].mean()
+            for field in ("mean_speed", "flow"):
+                mean = replicates[field].mean()
+                half_width = z * replicates[field].std(ddof=1) / np.sqrt(n) if n > 1 else 0.0
+                row[field] = mean
+                row[field + "_ci_low"] = mean - half_width
+                row[field + "_ci_high"] = mean + half_width
+
+    def save(self, path=OUTPUT_PATH):
+        """Write the diagram as a CSV file with a header line."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savetxt(path, self.diagram, delimiter=",", header=",".join(DIAGRAM_DTYPE.names), comments="",
+                   fmt=["%.2f", "%d"] + ["%.6f"] * (len(DIAGRAM_DTYPE.names) - 2))
+
+
+def run_density_sweep(densities=DEFAULT_DENSITIES, n=10, seed=None, processes=None, cost_func=DIJKSTRA,
+                      scheduling=TICK_SCHEDULING, until=UNTIL["test4"], confidence=0.95):
+    """Run n replicates of RiMEA test 4 for each density. All runs of all densities share one pool of
+    processes, so the slow high densities do not hold up the others.
+
+    Parameters
+    ----------
+    densities : list
+        pedestrians per m^2
+    n : int
+        number of replicates per density
+    seed : int, optional
+        the root seed, by default None (fresh entropy). Every density spawns its own streams from it,
+        so adding a density does not change the runs of the others.
+    processes : int, optional
+        number of worker processes, by default None (one per CPU)
+    cost_func : int, optional
+        by default DIJKSTRA
+    scheduling : int, optional
+        by default TICK_SCHEDULING
+    until : float, optional
+        the simulated time at which a run is stopped, by default 35s as in the GUI
+    confidence : float, optional
+        the level of the confidence intervals, by default 0.95
+
+    Returns
+    -------
+    Fundamental_Diagram
+    """
+    root = np.random.SeedSequence(seed)
+    tasks = []
+    for density in densities:
+        # Key the stream by the density itself rather than its position in the list
+        seeds = np.random.SeedSequence(root.entropy, spawn_key=(int(round(density * 1000)),)).spawn(n)
+        for run in range(n):
+            tasks.append((run, seeds[run], "test4", {"density": density}, cost_func, scheduling, until))
+
+    results = map_replicates(tasks, processes)
+
+    runs = np.zeros(len(tasks), dtype=RUN_DTYPE)
+    for i, (task, result) in enumerate(zip(tasks, results)):
+        density = task[3]["density"]
+        measured = len(result.measured_speeds)
+        mean_speed = result.measured_speeds.mean() if measured > 0 else 0.0
+        runs[i] = (density, result.run, measured, mean_speed, density * mean_speed)
+    return Fundamental_Diagram(runs, confidence)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the fundamental diagram of RiMEA test 4.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--densities", type=float, nargs="+", default=DEFAULT_DENSITIES)
+    group.add_argument("--range", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                       help="densities from START to STOP (inclusive) in steps of STEP")
+    parser.add_argument("-n", "--replicates", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    densities = args.densities
+    if args.range is not None:
+        start, stop, step = args.range
+        densities = np.round(np.arange(start, stop + step / 2, step), 6).tolist()
+
+    fundamental_diagram = run_density_sweep(densities, args.replicates, seed=args.seed, processes=args.processes)
+    fundamental_diagram.save(args.output)
+    for row in fundamental_diagram.diagram:
+        print("density %.2f P/m^2: speed %.2f m/s [%.2f, %.2f], flow %.2f P/(m*s) [%.2f, %.2f]" % (
+            row["density"], row["mean_speed"], row["mean_speed_ci_low"], row["mean_speed_ci_high"],
+            row["flow"], row["flow_ci_low"], row["flow_ci_high"]))
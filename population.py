@@ -0,0 +1,263 @@
+import math
+import weakref
+
+import numpy as np
+
+
+# The columns of a population: name -> (data type, value of a new pedestrian).
+# -1 marks coordinates that are not set, i.e. tuple() in Pedestrian.coord_enterMA/coord_leaveMA.
+COLUMNS = {
+    "x": (np.int32, 0),
+    "y": (np.int32, 0),
+    "age": (np.int32, 30),
+    "speed": (np.float64, 1.33),  # m/s
+    "lag": (np.float64, 1/(1.33*3)),  # s/0.33m
+    "clock": (np.float64, 0.),
+    "next_move": (np.float64, np.nan),  # The time step in which the pd moves next. Only used by event scheduling
+    "isInMA": (np.bool_, False),  # Flag that whether the pd is in a speed measuring area
+    "enterMA_x": (np.int32, -1),  # Coordinates where the pd enters the MA
+    "enterMA_y": (np.int32, -1),
+    "leaveMA_x": (np.int32, -1),  # Coordinates where the pd leaves the MA
+    "leaveMA_y": (np.int32, -1),
+    "time_enterMA": (np.float64, 0.),
+    "time_leaveMA": (np.float64, 0.),
+    "time_reach_target": (np.float64, 0.),
+    "distance_to_target": (np.float64, 0.),
+    "std_speed": (np.float64, 0.),
+    "group": (np.int32, 0),  # The target group the pd heads to, see Cellular_Automaton.add_target_group()
+    "removed": (np.bool_, False)  # Flag that whether the pd reaches the target and thus is removed
+}
+
+
+class Pedestrian:
+    """
+    This is the pedestrian class. Provide a coordinate to generate a pedestrian.
+
+    A new pedestrian keeps its attributes by itself. Once it is added to a Population, it is only a view
+    of its row in the columns of the population, and it keeps its last values again after it is removed.
+    """
+
+    __slots__ = ("population", "id", "values", "__weakref__")
+
+    def __init__(self, x, y, speed=1.33, age=30, group=0):
+        self.population = None
+        self.id = -1
+        self.values = {name: default for name, (dtype, default) in COLUMNS.items()}
+        self.values.update(x=x, y=y, speed=speed, lag=1/(speed*3), age=age, next_move=None, group=group)
+
+    @property
+    def coord_enterMA(self):
+        return self.coord("enterMA_x", "enterMA_y")
+
+    @coord_enterMA.setter
+    def coord_enterMA(self, coord):
+        self.set_coord("enterMA_x", "enterMA_y", coord)
+
+    @property
+    def coord_leaveMA(self):
+        return self.coord("leaveMA_x", "leaveMA_y")
+
+    @coord_leaveMA.setter
+    def coord_leaveMA(self, coord):
+        self.set_coord("leaveMA_x", "leaveMA_y", coord)
+
+    def get(self, name):
+        if self.population is None:
+            return self.values[name]
+        return self.population.get(self.id, name)
+
+    def set(self, name, value):
+        if self.population is None:
+            self.values[name] = value
+        else:
+            self.population.set(self.id, name, value)
+
+    def coord(self, name_x, name_y):
+        x = self.get(name_x)
+        return tuple() if x == -1 else (x, self.get(name_y))
+
+    def set_coord(self, name_x, name_y, coord):
+        x, y = coord if coord else (-1, -1)
+        self.set(name_x, x)
+        self.set(name_y, y)
+
+
+def column_property(name):
+    return property(lambda pd: pd.get(name), lambda pd, value: pd.set(name, value))
+
+
+for name in COLUMNS:
+    if not name.startswith(("enterMA_", "leaveMA_")):
+        setattr(Pedestrian, name, column_property(name))
+
+
+class Population:
+    """
+    This class stores all pedestrians of a cellular automaton as parallel typed arrays (struct of arrays),
+    one column per attribute in COLUMNS and one row per pedestrian, in the order in which they were added.
+    The columns are available as attributes, e.g. population.x, so the update of the cellular automaton
+    can work on whole columns. Iterating gives Pedestrian views.
+
+    Removing a pedestrian only marks its row as removed, which takes constant time. The rows of removed
+    pedestrians stay in the columns as holes until they make up half of the rows; then compact() drops them,
+    keeping the order of the others. Each pedestrian also gets an id which does not change when its row does.
+    """
+
+    def __init__(self, capacity=16):
+        self.n = 0  # number of rows in use, including holes
+        self.size = 0  # number of pedestrians
+        self.columns = {name: np.full(capacity, default, dtype=dtype) for name, (dtype, default) in COLUMNS.items()}
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.next_id = 0
+        self.row_of_id = np.full(capacity, -1, dtype=np.int64)  # -1 for removed pedestrians
+        # The Pedestrian views that are still referenced somewhere, by id
+        self.views = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        # The columns of the rows in use, e.g. self.x
+        columns = self.__dict__.get("columns")
+        if columns is None or name not in columns:
+            raise AttributeError(name)
+        return columns[name][:self.n]
+
+    def __iter__(self):
+        for row in np.nonzero(~self.removed)[0].tolist():
+            yield self.view(int(self.ids[row]))
+
+    def view_of_row(self, row):
+        return self.view(int(self.ids[row]))
+
+    def view(self, id):
+        pd = self.views.get(id)
+        if pd is None:
+            pd = Pedestrian.__new__(Pedestrian)
+            pd.population, pd.id, pd.values = self, id, None
+            self.views[id] = pd
+        return pd
+
+    def get(self, id, name):
+        value = self.columns[name][self.row_of_id[id]].item()
+        if name == "next_move" and math.isnan(value):
+            return None
+        return value
+
+    def set(self, id, name, value):
+        if name == "next_move" and value is None:
+            value = np.nan
+        self.columns[name][self.row_of_id[id]] = value
+
+    def reserve(self, n):
+        """Make room for n more pedestrians."""
+        capacity = len(self.ids)
+        if self.n + n > capacity:
+            capacity = max(2*capacity, self.n + n)
+            for name, column in self.columns.items():
+                grown = np.full(capacity, COLUMNS[name][1], dtype=column.dtype)
+                grown[:self.n] = column[:self.n]
+                self.columns[name] = grown
+            self.ids = np.resize(self.ids, capacity)
+        if self.next_id + n > len(self.row_of_id):
+            grown = np.full(max(2*len(self.row_of_id), self.next_id + n), -1, dtype=np.int64)
+            grown[:self.next_id] = self.row_of_id[:self.next_id]
+            self.row_of_id = grown
+
+    def add(self, pd):
+        """Add a new pedestrian at the end. From now on, pd is a view of its row.
+
+        Returns
+        -------
+        int
+            the row of the pedestrian
+        """
+        self.reserve(1)
+        row, id = self.n, self.next_id
+        for name, value in pd.values.items():
+            self.columns[name][row] = np.nan if value is None else value
+        self.ids[row] = id
+        self.row_of_id[id] = row
+        self.n += 1
+        self.size += 1
+        self.next_id += 1
+
+        pd.population, pd.id, pd.values = self, id, None
+        self.views[id] = pd
+        return row
+
+    def add_many(self, xs, ys, speeds=COLUMNS["speed"][1], ages=COLUMNS["age"][1], groups=COLUMNS["group"][1]):
+        """Add many new pedestrians at the end without creating Pedestrian objects.
+
+        Parameters
+        ----------
+        xs : Array
+        ys : Array
+        speeds : Array/float, optional
+        ages : Array/int, optional
+        groups : Array/int, optional
+
+        Returns
+        -------
+        Array
+            the rows of the new pedestrians
+        """
+        xs = np.asarray(xs)
+        n = len(xs)
+        self.reserve(n)
+        rows = np.arange(self.n, self.n + n)
+        for name, (dtype, default) in COLUMNS.items():
+            self.columns[name][rows] = default
+        self.columns["x"][rows] = xs
+        self.columns["y"][rows] = ys
+        self.columns["speed"][rows] = speeds
+        self.columns["lag"][rows] = 1/(np.asarray(speeds, dtype=np.float64)*3)
+        self.columns["age"][rows] = ages
+        self.columns["group"][rows] = groups
+        ids = np.arange(self.next_id, self.next_id + n)
+        self.ids[rows] = ids
+        self.row_of_id[ids] = rows
+        self.n += n
+        self.size += n
+        self.next_id += n
+        return rows
+
+    def remove(self, rows):
+        """Remove the pedestrians in the given rows by marking them as removed. Views of the removed
+        pedestrians keep their last values.
+
+        Parameters
+        ----------
+        rows : Array
+            rows of pedestrians that have not been removed yet
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+        self.columns["removed"][rows] = True
+        ids = self.ids[rows]
+        for id in ids.tolist():
+            pd = self.views.get(id)
+            if pd is not None:
+                pd.values = {name: pd.get(name) for name in COLUMNS}
+                pd.population = None
+                del self.views[id]
+        self.row_of_id[ids] = -1
+        self.size -= len(rows)
+
+        if self.n - self.size > max(self.size, 16):
+            self.compact()
+
+    def compact(self):
+        """Drop the rows of removed pedestrians, keeping the order of the others."""
+        keep = ~self.removed
+        n = self.size
+        for column in self.columns.values():
+            column[:n] = column[:self.n][keep]
+        self.ids[:n] = self.ids[:self.n][keep]
+        self.n = n
+        self.row_of_id[self.ids[:n]] = np.arange(n)
+
+    def rows(self, ids):
+        """The current rows of the pedestrians with the given ids, -1 for removed ones."""
+        return self.row_of_id[ids]
@@ -0,0 +1,195 @@
+"""Measure where the time of the simulation goes, phase by phase, while it runs.
+
+Enable a Profiler by Cellular_Automaton.enable_profiling(). The CA then times the phases of every step and counts
+what happened in them. Every interval seconds of wall time, the profiler takes a snapshot of the last interval,
+keeps it and passes it to its callback. When no profiler is enabled, a step only checks that once per phase.
+
+Example
+-------
+    profiler = CA.enable_profiling(Profiler(interval=5, callback=lambda snapshot: print(format_snapshot(snapshot))))
+    CA.run(until=60)
+    print(profiler.totals())
+"""
+import json
+import time
+from collections import deque
+
+# The phases of a step, in order. Time spent in the cell_changed callbacks of the observers during the moves is
+# taken out of "moves" and counted as "observers" as well.
+PHASES = (
+    "schedule",  # finding the time of the step, i.e. the calendar queue with event scheduling
+    "observers",  # the time_changed, step_finished and cell_changed callbacks
+    "due",  # speed gating, i.e. finding the pedestrians that are due to move
+    "neighbors",  # choosing the best neighbour of every due pedestrian
+    "moves",  # collision checks, measuring area bookkeeping and updating the grid
+    "avoidance",  # removing and adding the avoidance costs of the moved pedestrians
+    "removal",  # removing the pedestrians that reached a target, including compacting the population
+    "tests"  # the control of the RiMEA tests
+)
+
+COUNTERS = (
+    "steps",
+    "due",  # pedestrians that were due to move
+    "moves",  # pedestrians that left their cell
+    "collisions",  # pedestrians that did not move because their best neighbour was taken
+    "stamps",  # avoidance kernels removed or added
+    "reached",  # pedestrians that reached a target
+    "compactions",  # compactions of the population
+    "notifications"  # cell_changed callbacks
+)
+
+
+class Profiler:
+    """
+    This class collects the time spent in each of PHASES and the COUNTERS of the steps of a cellular automaton.
+    The cellular automaton calls start() at the beginning of each step, lap() at the end of each phase and
+    end_step() at the end of the step.
+    """
+
+    def __init__(self, interval=1.0, callback=None, keep=100):
+        """
+        Parameters
+        ----------
+        interval : float, optional
+            the wall time in seconds between two snapshots, by default 1
+        callback : callable, optional
+            called with each snapshot, by default None
+        keep : int, optional
+            number of the last snapshots that are kept in snapshots, by default 100
+        """
+        self.interval = interval
+        self.callback = callback
+        self.snapshots = deque(maxlen=keep)
+
+        self.times = dict.fromkeys(PHASES, 0.)  # since the last snapshot
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.total_times = dict.fromkeys(PHASES, 0.)  # since the profiler was created, up to the last snapshot
+        self.total_counters = dict.fromkeys(COUNTERS, 0)
+
+        self.active = False  # whether a step is being measured
+        self.last = 0.  # the wall time at the end of the last phase
+        self.nested = 0.  # time of nested callbacks since the last phase, which is not counted for the phase
+        self.snapshot_wall = time.perf_counter()
+
+    def start(self):
+        self.active = True
+        self.nested = 0.
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        """Count the time since the end of the last phase for the given phase."""
+        if not self.active:
+            return
+        now = time.perf_counter()
+        self.times[phase] += now - self.last - self.nested
+        self.nested = 0.
+        self.last = now
+
+    def count(self, **counts):
+        for name, count in counts.items():
+            self.counters[name] += count
+
+    def timed(self, callback, phase="observers"):
+        """Wrap a callback that is called within a phase, so that its time is counted for the given phase
+        instead.
+
+        Returns
+        -------
+        callable
+        """
+        def timed_callback(*args):
+            if not self.active:
+                return callback(*args)
+            start = time.perf_counter()
+            callback(*args)
+            elapsed = time.perf_counter() - start
+            self.times[phase] += elapsed
+            self.nested += elapsed
+            self.counters["notifications"] += 1
+        return timed_callback
+
+    def end_step(self, now):
+        """Count the step, and take a snapshot if the interval passed.
+
+        Parameters
+        ----------
+        now : float
+            the simulated time
+        """
+        if not self.active:
+            return
+        self.active = False
+        self.counters["steps"] += 1
+        if self.last - self.snapshot_wall >= self.interval:
+            self.snapshot(now)
+
+    def snapshot(self, now=None):
+        """Take a snapshot of the time and counters since the last snapshot, and start a new interval.
+
+        Returns
+        -------
+        dict
+            the wall time (time.perf_counter) of the end of the interval, its length, the simulated time,
+            and the times in seconds and counters of the interval
+        """
+        wall = time.perf_counter()
+        snapshot = {
+            "wall": wall,
+            "interval": wall - self.snapshot_wall,
+            "now": now,
+            "times": self.times,
+            "counters": self.counters
+        }
+        for phase, elapsed in self.times.items():
+            self.total_times[phase] += elapsed
+        for name, count in self.counters.items():
+            self.total_counters[name] += count
+        self.times = dict.fromkeys(PHASES, 0.)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.snapshot_wall = wall
+
+        self.snapshots.append(snapshot)
+        if self.callback is not None:
+            self.callback(snapshot)
+        return snapshot
+
+    def totals(self):
+        """
+        Returns
+        -------
+        dict
+            the times in seconds and counters since the profiler was created
+        """
+        return {
+            "times": {phase: self.total_times[phase] + self.times[phase] for phase in PHASES},
+            "counters": {name: self.total_counters[name] + self.counters[name] for name in COUNTERS}
+        }
+
+
+def json_lines(file):
+    """
+    Returns
+    -------
+    callable
+        a callback for Profiler that writes each snapshot as a JSON line to the open file
+    """
+    def write(snapshot):
+        file.write(json.dumps(snapshot) + "\n")
+        file.flush()
+    return write
+
+
+def format_snapshot(snapshot):
+    """
+    Returns
+    -------
+    string
+        the share of each phase and the counters per step of a snapshot, in one line
+    """
+    times, counters = snapshot["times"], snapshot["counters"]
+    total = sum(times.values()) or 1
+    steps = counters["steps"] or 1
+    return "{} steps, {:.2f}ms/step: {} | per step: {}".format(
+        counters["steps"], 1000 * total / steps,
+        ", ".join("{} {:.0%}".format(phase, elapsed / total) for phase, elapsed in times.items()),
+        ", ".join("{} {:.1f}".format(name, count / steps) for name, count in counters.items() if name != "steps"))
@@ -0,0 +1,158 @@
+import threading
+import tkinter as tk
+from collections import deque
+
+import numpy as np
+
+from cellular_automaton import EMPTY, PEDESTRIAN, TARGET, OBSTACLE, Observer
+
+PEDESTRIAN_COLOUR = "#BA0A1B"
+TARGET_COLOUR = "#9ADB54"
+OBSTACLE_COLOUR = "#FEEEEE"
+BACKGROUND_COLOUR = "#000000"
+HIGHLIGHT_COLOUR = "#FF00FF"
+MEASURING_AREA_COLOUR = "#FFFF00"
+
+STATUS_COLOUR = {
+    EMPTY: BACKGROUND_COLOUR,
+    PEDESTRIAN: PEDESTRIAN_COLOUR,
+    TARGET: TARGET_COLOUR,
+    OBSTACLE: OBSTACLE_COLOUR
+}
+
+
+def rgb(colour):
+    return [int(colour[i:i+2], 16) for i in (1, 3, 5)]
+
+
+# The colour of each status code as RGB, and the colour of empty cells in a measuring area
+STATUS_RGB = np.zeros((max(STATUS_COLOUR)+1, 3), dtype=np.uint8)
+for status, colour in STATUS_COLOUR.items():
+    STATUS_RGB[status] = rgb(colour)
+MEASURING_AREA_RGB = np.array(rgb(MEASURING_AREA_COLOUR), dtype=np.uint8)
+
+
+class Raster_Renderer:
+    """
+    This class draws the cells of a cellular automaton on a canvas as one image, instead of one canvas item
+    per cell. draw() renders the state of the cellular automaton in the bounding box of the changed cells
+    into a colour array and puts it into the image at once. It must only be called from the Tk main thread.
+
+    Only width, height, crt_state and isMA of the CA are used, so the CA can also be a Trajectory_Player.
+    """
+
+    def __init__(self, canvas, CA, scale):
+        self.canvas = canvas
+        self.CA = CA
+
+        self.image = tk.PhotoImage(master=canvas)
+        self.image_item = canvas.create_image(0, 0, anchor="nw", image=self.image)
+        # The cell under the mouse is highlighted by a rectangle on top of the image
+        self.highlight = canvas.create_rectangle(0, 0, 0, 0, fill=HIGHLIGHT_COLOUR, width=0, state="hidden")
+        canvas.bind("<Motion>", self.move_highlight, add="+")
+        canvas.bind("<Leave>", lambda event: canvas.itemconfig(self.highlight, state="hidden"), add="+")
+
+        self.resize(scale)
+
+    def resize(self, scale):
+        """Resize the image to the current size of the cellular automaton with the given scale."""
+        self.scale = scale
+        self.image.configure(width=self.CA.width*scale, height=self.CA.height*scale)
+        self.canvas.itemconfig(self.highlight, state="hidden")
+        self.draw()
+
+    def colours(self, x0, x1, y0, y1):
+        """
+        Returns
+        -------
+        Array
+            the RGB colour of each pixel of the cells [x0:x1, y0:y1], indexed by [y, x]
+        """
+        state = self.CA.crt_state[x0:x1, y0:y1]
+        colours = STATUS_RGB[state]
+        colours[(state == EMPTY) & self.CA.isMA[x0:x1, y0:y1]] = MEASURING_AREA_RGB
+        colours = colours.transpose(1, 0, 2)
+        if self.scale > 1:
+            colours = colours.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        return colours
+
+    def draw(self, cells=None):
+        """Put the current state of the given cells into the image.
+
+        Parameters
+        ----------
+        cells : set, optional
+            the (x, y) coordinates of the cells that changed, by default None (all cells)
+        """
+        x0, x1, y0, y1 = 0, self.CA.width, 0, self.CA.height
+        if cells is not None:
+            if not cells:
+                return
+            xs, ys = np.array(list(cells)).T
+            x0, x1 = max(int(xs.min()), 0), min(int(xs.max())+1, x1)
+            y0, y1 = max(int(ys.min()), 0), min(int(ys.max())+1, y1)
+            if x0 >= x1 or y0 >= y1:
+                return
+        colours = self.colours(x0, x1, y0, y1)
+        height, width = colours.shape[:2]
+        ppm = b"P6 %d %d 255\n" % (width, height) + np.ascontiguousarray(colours).tobytes()
+        self.image.put(ppm, to=(x0*self.scale, y0*self.scale))
+
+    def move_highlight(self, event):
+        x = event.x//self.scale
+        y = event.y//self.scale
+        if 0 <= x < self.CA.width and 0 <= y < self.CA.height:
+            self.canvas.coords(self.highlight, x*self.scale, y*self.scale,
+                               (x+1)*self.scale, (y+1)*self.scale)
+            self.canvas.itemconfig(self.highlight, state="normal")
+        else:
+            self.canvas.itemconfig(self.highlight, state="hidden")
+
+
+class Frame_Queue(Observer):
+    """
+    This observer collects the cells that change in each time step of a cellular automaton and publishes
+    them as one frame at the end of the step. It can be fed from the simulation thread and drained from the
+    Tk main thread. If the frames are not drained as fast as the simulation steps, the newest frames are
+    merged, so the queue never holds more than max_frames frames.
+    """
+
+    def __init__(self, max_frames=4):
+        self.max_frames = max_frames
+        self.lock = threading.Lock()
+        self.frames = deque()  # (simulated time, set of changed cells, number of steps)
+        self.pending = set()  # cells changed since the last frame
+
+    def cell_changed(self, x, y, status):
+        with self.lock:
+            self.pending.add((x, y))
+
+    def step_finished(self, now):
+        with self.lock:
+            cells, self.pending = self.pending, set()
+            if len(self.frames) >= self.max_frames:
+                last_now, last_cells, last_steps = self.frames.pop()
+                cells |= last_cells
+                self.frames.append((now, cells, last_steps + 1))
+            else:
+                self.frames.append((now, cells, 1))
+
+    def take(self):
+        """Take all frames published so far, plus the cells changed since then, as one frame.
+
+        Returns
+        -------
+        tuple
+            the simulated time of the last frame (None if no step was finished), the set of changed cells
+            and the number of steps
+        """
+        with self.lock:
+            frames, self.frames = self.frames, deque()
+            cells, self.pending = self.pending, set()
+        now = None
+        steps = 0
+        for frame_now, frame_cells, frame_steps in frames:
+            now = frame_now
+            cells |= frame_cells
+            steps += frame_steps
+        return now, cells, steps
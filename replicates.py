@@ -0,0 +1,264 @@
+"""Run many replicates of a preset task or RiMEA test without GUI, in parallel processes.
+
+Example
+-------
+    python replicates.py test6 -n 50 --seed 1
+"""
+import argparse
+import math
+import multiprocessing
+
+import numpy as np
+
+from cellular_automaton import (EUCLIDEAN, DIJKSTRA, FAST_MARCHING, TICK_SCHEDULING, EVENT_SCHEDULING,
+                                NUM_OF_UNIT_LEN_PER_METER, Cellular_Automaton)
+from results import CSV, FORMATS, OUTPUT_DIRECTORY, SCHEMAS, Results_Writer, summary
+import scenarios
+
+COST_FUNCS = {
+    "euclidean": EUCLIDEAN,
+    "dijkstra": DIJKSTRA,
+    "fast_marching": FAST_MARCHING
+}
+
+# Simulated time in seconds after which a replicate is stopped
+DEFAULT_UNTIL = 1000
+UNTIL = {
+    "test4": 35
+}
+
+# Columns of the per pedestrian results
+PEDESTRIAN_FIELDS = ("run", "age", "speed", "std_speed", "distance", "time", "simulated_speed")
+
+
+class Replicate_Result:
+    """The result of one replicate.
+
+    Attributes
+    ----------
+    run : int
+        index of the replicate
+    evacuation_time : float
+        the simulated time at which the last pedestrian reached a target, nan if not all of them did
+    pedestrians : dict
+        maps each of PEDESTRIAN_FIELDS to a numpy array with one entry per pedestrian.
+        Distances are in m, times in s, speeds in m/s. Time and simulated speed are nan for
+        pedestrians that have not reached a target.
+    measured_speeds : numpy array
+        speed in m/s of the pedestrians that passed through the measuring area
+    steps : int
+        number of steps simulated
+    records : numpy structured array
+        the records of results.SCHEMAS of the RiMEA test, None for other scenarios
+    """
+
+    def __init__(self, run, evacuation_time, pedestrians, measured_speeds, steps, records=None):
+        self.run = run
+        self.evacuation_time = evacuation_time
+        self.pedestrians = pedestrians
+        self.measured_speeds = measured_speeds
+        self.steps = steps
+        self.records = records
+
+
+class Replicate_Results:
+    """The results of all replicates of a scenario, concatenated into arrays.
+
+    Attributes
+    ----------
+    evacuation_times : numpy array
+        evacuation time of each replicate, in the order of the runs
+    pedestrians : dict
+        maps each of PEDESTRIAN_FIELDS to a numpy array with one entry per pedestrian of all replicates
+    measured_speeds : numpy array
+        measured speeds of all replicates
+    measured_speeds_run : numpy array
+        index of the replicate of each measured speed
+    records : numpy structured array
+        the records of all replicates of a RiMEA test, None for other scenarios
+    """
+
+    def __init__(self, scenario, params, results):
+        self.scenario = scenario
+        self.params = params
+        self.results = sorted(results, key=lambda result: result.run)
+        self.evacuation_times = np.array([result.evacuation_time for result in self.results], dtype=float)
+        self.pedestrians = {}
+        for field in PEDESTRIAN_FIELDS:
+            self.pedestrians[field] = np.concatenate([result.pedestrians[field] for result in self.results])
+        self.measured_speeds = np.concatenate([result.measured_speeds for result in self.results])
+        self.measured_speeds_run = np.concatenate(
+            [np.full(len(result.measured_speeds), result.run) for result in self.results])
+        self.records = None
+        if scenario in SCHEMAS:
+            self.records = np.concatenate([result.records for result in self.results])
+
+    def __len__(self):
+        return len(self.results)
+
+    def save(self, format=CSV, directory=OUTPUT_DIRECTORY):
+        """Append the records of all replicates to the results of the RiMEA test, see results.py."""
+        if self.records is None:
+            raise ValueError("only the results of the RiMEA tests {} can be saved".format(sorted(SCHEMAS)))
+        with Results_Writer(self.scenario, format, directory) as writer:
+            writer.extend(self.records)
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dict
+            minimum, mean, maximum and standard deviation of the evacuation times, the simulated speeds
+            and the measured speeds, ignoring replicates or pedestrians that did not finish. They are nan if
+            none finished.
+        """
+        statistics = {"scenario": self.scenario, "replicates": len(self)}
+        statistics.update(self.params)
+        for name, values in (("evacuation_time", self.evacuation_times),
+                             ("simulated_speed", self.pedestrians["simulated_speed"]),
+                             ("measured_speed", self.measured_speeds)):
+            values_summary = {"count": 0, "min": math.nan, "mean": math.nan, "max": math.nan, "std": math.nan}
+            values_summary.update(summary(values))
+            for statistic, value in values_summary.items():
+                statistics[name + "_" + statistic] = value
+        return statistics
+
+
+def run_replicate(task):
+    """Build and run one replicate. This is the function executed by the worker processes.
+
+    Parameters
+    ----------
+    task : tuple
+        (run, seed, scenario, params, cost_func, scheduling, until), where seed is the numpy SeedSequence
+        of this replicate
+
+    Returns
+    -------
+    Replicate_Result
+    """
+    run, seed, scenario, params, cost_func, scheduling, until = task
+    rng = np.random.default_rng(seed)
+
+    width, height = scenarios.SIZES[scenario]
+    CA = Cellular_Automaton(width, height)
+    CA.cost_func = cost_func
+    CA.set_scheduling(scheduling)
+    scenarios.build(CA, scenario, rng, **params)
+    population = list(CA.population)
+    CA.compute_dist_cost()
+
+    n = len(population)
+    pedestrians = {field: np.full(n, np.nan) for field in PEDESTRIAN_FIELDS}
+    pedestrians["run"] = np.full(n, run)
+    for i, pd in enumerate(population):
+        pedestrians["age"][i] = pd.age
+        pedestrians["speed"][i] = pd.speed
+        pedestrians["std_speed"][i] = pd.std_speed
+        # Only the RiMEA tests with a guideline distance set it, otherwise take the floor field at the start
+        if pd.distance_to_target:
+            pedestrians["distance"][i] = pd.distance_to_target
+        else:
+            pedestrians["distance"][i] = CA.dist_cost[pd.x, pd.y] / NUM_OF_UNIT_LEN_PER_METER
+
+    CA.run(until=until)
+
+    for i, pd in enumerate(population):
+        if pd.removed:
+            pedestrians["time"][i] = pd.time_reach_target
+    pedestrians["simulated_speed"] = pedestrians["distance"] / pedestrians["time"]
+
+    evacuation_time = CA.now if len(CA.population) == 0 else math.nan
+    records = CA.RiMEA_results(scenario, run, population) if scenario in SCHEMAS else None
+    return Replicate_Result(run, evacuation_time, pedestrians,
+                            np.array(CA.measured_speeds(), dtype=float), CA.step_count, records)
+
+
+def run_replicates(scenario, n, seed=None, processes=None, cost_func=DIJKSTRA, scheduling=TICK_SCHEDULING,
+                   until=None, **params):
+    """Run n independent replicates of a scenario in a pool of processes.
+
+    Every replicate draws its pedestrians from its own random stream spawned from the seed, so the results
+    do not depend on the number of processes or the order in which the replicates finish.
+
+    Parameters
+    ----------
+    scenario : string
+        one of the keys of scenarios.SIZES
+    n : int
+        number of replicates, at least 1
+    seed : int, optional
+        the root seed, by default None (fresh entropy)
+    processes : int, optional
+        number of worker processes, by default None (one per CPU). With 1 the replicates run in this process.
+    cost_func : int, optional
+        by default DIJKSTRA
+    scheduling : int, optional
+        by default TICK_SCHEDULING
+    until : float, optional
+        the simulated time at which a replicate is stopped, by default UNTIL of the scenario
+    params :
+        scenario specific parameters, i.e. density for test4
+
+    Returns
+    -------
+    Replicate_Results
+    """
+    if n < 1:
+        raise ValueError("at least one replicate is needed, not {}".format(n))
+    if until is None:
+        until = UNTIL.get(scenario, DEFAULT_UNTIL)
+    seeds = np.random.SeedSequence(seed).spawn(n)
+    tasks = [(run, seeds[run], scenario, params, cost_func, scheduling, until) for run in range(n)]
+
+    return Replicate_Results(scenario, params, map_replicates(tasks, processes))
+
+
+def map_replicates(tasks, processes=None):
+    """Run the tasks of run_replicate() in a pool of processes.
+
+    Parameters
+    ----------
+    tasks : list
+        tuples as taken by run_replicate()
+    processes : int, optional
+        number of worker processes, by default None (one per CPU). With 1 the tasks run in this process.
+
+    Returns
+    -------
+    list
+        the Replicate_Result of each task, in the order of the tasks
+    """
+    if processes == 1 or len(tasks) <= 1:
+        return [run_replicate(task) for task in tasks]
+    with multiprocessing.Pool(processes) as pool:
+        # Give every worker a few neighbouring tasks at once, so it reuses its cached floor field
+        chunksize = max(1, len(tasks) // (4 * (processes or multiprocessing.cpu_count())))
+        return pool.map(run_replicate, tasks, chunksize)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run replicates of a preset task or RiMEA test without GUI.")
+    parser.add_argument("scenario", choices=sorted(scenarios.SIZES))
+    parser.add_argument("-n", "--replicates", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--cost-func", choices=sorted(COST_FUNCS), default="dijkstra")
+    parser.add_argument("--event-driven", action="store_true", help="use event scheduling")
+    parser.add_argument("--until", type=float, default=None)
+    parser.add_argument("--density", type=float, default=1, help="pedestrians per m^2 for test4")
+    parser.add_argument("--save", choices=FORMATS, default=None,
+                        help="append the results of a RiMEA test to output/ in this format")
+    args = parser.parse_args()
+    if args.replicates < 1:
+        parser.error("at least one replicate is needed")
+
+    params = {"density": args.density} if args.scenario == "test4" else {}
+    replicates = run_replicates(args.scenario, args.replicates, seed=args.seed, processes=args.processes,
+                                cost_func=COST_FUNCS[args.cost_func],
+                                scheduling=EVENT_SCHEDULING if args.event_driven else TICK_SCHEDULING,
+                                until=args.until, **params)
+    if args.save is not None:
+        replicates.save(args.save)
+    for key, value in replicates.summary().items():
+        print("{}: {}".format(key, value))
@@ -0,0 +1,463 @@
+"""Write the results of the RiMEA tests as records of one fixed schema per test, and read them back as one array.
+
+The results of a test are appended to output/Test<n>_results.csv, or, in the binary format, to the directory
+output/Test<n>_results_npz, which holds one .npz file of columns per flushed batch. Several writers, e.g. from
+parallel runs, can append to the same results at the same time.
+
+load_results() also reads the text files of earlier versions, and keeps the parsed records of every file in a
+cache next to it, so that plotting many runs does not parse them again.
+
+Example
+-------
+    with Results_Writer("test6") as writer:
+        writer.append(run=0, time=16.6)
+    times = load_results("test6")["time"]
+    print(summary(times))
+"""
+import glob
+import io
+import os
+import re
+import uuid
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+OUTPUT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+
+CSV = "csv"
+NPZ = "npz"
+FORMATS = (CSV, NPZ)
+
+# The text files of each test written by earlier versions, in the output directory
+LEGACY_PATTERNS = {
+    "test1": "Test1_results.txt",
+    "test4": "Test4_results*.txt",
+    "test6": "Test6_results.txt",
+    "test7": "Test7_results_*_.txt"
+}
+
+# The columns of the records of each test. Distances are in m, times in s, speeds in m/s.
+SCHEMAS = {
+    # One record per run
+    "test1": np.dtype([
+        ("run", np.int64),
+        ("time", np.float64),  # nan if the pedestrian did not arrive
+        ("speed", np.float64)
+    ]),
+    # One record per pedestrian that passed through the measuring area
+    "test4": np.dtype([
+        ("density", np.float64),  # P/m^2
+        ("run", np.int64),
+        ("pedestrian", np.int64),  # in the order of leaving the measuring area
+        ("speed", np.float64),
+        ("enter_x", np.int32),  # the cells where the pedestrian entered and left the measuring area
+        ("enter_y", np.int32),
+        ("leave_x", np.int32),
+        ("leave_y", np.int32),
+        ("duration", np.float64)  # time spent in the measuring area
+    ]),
+    # One record per run
+    "test6": np.dtype([
+        ("run", np.int64),
+        ("time", np.float64)  # nan if not all pedestrians arrived
+    ]),
+    # One record per pedestrian
+    "test7": np.dtype([
+        ("run", np.int64),
+        ("pedestrian", np.int64),
+        ("age", np.int64),
+        ("assigned_speed", np.float64),  # the mean speed of the age in the guideline
+        ("simulated_speed", np.float64),
+        ("distance", np.float64),
+        ("time", np.float64)  # nan if the pedestrian did not arrive
+    ])
+}
+
+
+def results_path(test, format=CSV, directory=OUTPUT_DIRECTORY):
+    """
+    Parameters
+    ----------
+    test : string
+        one of the keys of SCHEMAS
+    format : string, optional
+        one of FORMATS, by default CSV
+
+    Returns
+    -------
+    string
+        the file (CSV) or directory (NPZ) that holds the results of the test
+    """
+    name = test.capitalize() + "_results"
+    if format == CSV:
+        return os.path.join(directory, name + ".csv")
+    if format == NPZ:
+        return os.path.join(directory, name + "_npz")
+    raise ValueError("unknown results format {!r}, expected one of {}".format(format, FORMATS))
+
+
+def csv_header(schema):
+    return ",".join(schema.names) + "\n"
+
+
+def lock(file):
+    """Block until this process holds the exclusive lock of an open file."""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        return
+    file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:  # LK_LOCK gives up after 10 seconds
+            pass
+
+
+def unlock(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class Results_Writer:
+    """
+    This class streams records of the schema of one RiMEA test into its results. The records are kept in memory
+    and written in batches of batch_size records, and when the writer is flushed or closed.
+
+    CSV results are appended while holding a lock of the file, so several processes can write to the same file.
+    NPZ results do not need a lock, since every batch goes into a new file of the results directory.
+    """
+
+    def __init__(self, test, format=CSV, directory=OUTPUT_DIRECTORY, batch_size=1024, truncate=False):
+        """
+        Parameters
+        ----------
+        test : string
+            one of the keys of SCHEMAS
+        format : string, optional
+            one of FORMATS, by default CSV
+        directory : string, optional
+            by default the output directory next to this module
+        batch_size : int, optional
+            number of records after which they are written, by default 1024
+        truncate : bool, optional
+            whether to delete the existing results of the test first, by default False
+        """
+        self.test = test
+        self.schema = SCHEMAS[test]
+        self.format = format
+        self.path = results_path(test, format, directory)
+        self.batch_size = batch_size
+        self.batches = []  # structured arrays of records not written yet
+        self.pending = 0  # number of records in batches
+        self.chunks = 0  # number of NPZ files written
+        self.token = uuid.uuid4().hex[:8]  # makes the names of the NPZ files of this writer unique
+
+        if format == CSV:
+            os.makedirs(directory, exist_ok=True)
+            if truncate and os.path.exists(self.path):
+                os.remove(self.path)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            if truncate:
+                for name in os.listdir(self.path):
+                    if name.endswith(".npz"):
+                        os.remove(os.path.join(self.path, name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, **fields):
+        """Add one record. Fields that are not given are 0."""
+        record = np.zeros(1, dtype=self.schema)
+        for name, value in fields.items():
+            record[name] = value
+        self.extend(record)
+
+    def extend(self, records):
+        """Add many records.
+
+        Parameters
+        ----------
+        records : numpy structured array/dict
+            with the fields of the schema, or a dict that maps them to columns of equal length
+        """
+        if isinstance(records, dict):
+            columns = records
+            records = np.zeros(len(next(iter(columns.values()))), dtype=self.schema)
+            for name, column in columns.items():
+                records[name] = column
+        elif records.dtype != self.schema:
+            records = records.astype(self.schema)
+        if len(records) == 0:
+            return
+        self.batches.append(records)
+        self.pending += len(records)
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all records added so far."""
+        if not self.batches:
+            return
+        records = np.concatenate(self.batches)
+        self.batches = []
+        self.pending = 0
+        if self.format == CSV:
+            self.write_csv(records)
+        else:
+            self.write_npz(records)
+
+    def close(self):
+        self.flush()
+
+    def write_csv(self, records):
+        text = io.StringIO()
+        formats = ["%d" if records.dtype[name].kind in "iub" else "%.10g" for name in self.schema.names]
+        np.savetxt(text, records, fmt=formats, delimiter=",")
+        header = csv_header(self.schema)
+
+        with open(self.path, "ab+") as file:
+            lock(file)
+            try:
+                file.seek(0, os.SEEK_END)
+                if file.tell() == 0:
+                    file.write(header.encode())
+                else:
+                    file.seek(0)
+                    existing = file.readline().decode()
+                    if existing != header:
+                        raise ValueError("{} has the columns {}, not those of {}: {}".format(
+                            self.path, existing.strip(), self.test, header.strip()))
+                file.write(text.getvalue().encode())
+                file.flush()
+            finally:
+                unlock(file)
+
+    def write_npz(self, records):
+        name = "%d-%s-%06d.npz" % (os.getpid(), self.token, self.chunks)
+        self.chunks += 1
+        # Write under a temporary name first, so readers never see a partly written file
+        temporary = os.path.join(self.path, "." + name)
+        with open(temporary, "wb") as file:
+            np.savez(file, **{field: records[field] for field in self.schema.names})
+        os.replace(temporary, os.path.join(self.path, name))
+
+
+def read_results(test, format=CSV, directory=OUTPUT_DIRECTORY):
+    """Read all results of a test that have been written so far.
+
+    Parameters
+    ----------
+    test : string
+        one of the keys of SCHEMAS
+    format : string, optional
+        one of FORMATS, by default CSV
+    directory : string, optional
+        by default the output directory next to this module
+
+    Returns
+    -------
+    numpy structured array
+        one record of SCHEMAS[test] per row, empty if there are no results
+    """
+    schema = SCHEMAS[test]
+    path = results_path(test, format, directory)
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=schema)
+    if format == CSV:
+        return read_csv(test, path)
+
+    chunks = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".npz") and not name.startswith("."):
+            with np.load(os.path.join(path, name)) as columns:
+                chunk = np.zeros(len(columns[schema.names[0]]), dtype=schema)
+                for field in schema.names:
+                    chunk[field] = columns[field]
+            chunks.append(chunk)
+    if not chunks:
+        return np.zeros(0, dtype=schema)
+    return np.concatenate(chunks)
+
+
+def read_csv(test, path):
+    schema = SCHEMAS[test]
+    with open(path, "r") as file:
+        header = file.readline()
+        if header and header != csv_header(schema):
+            raise ValueError("{} has the columns {}, not those of {}".format(path, header.strip(), test))
+        return np.loadtxt(file, dtype=schema, delimiter=",", ndmin=1)
+
+
+def read_legacy(test, path):
+    """Parse a text file of an earlier version into records of SCHEMAS[test]. The whole file is matched by one
+    regular expression, and the matches are converted to numbers at once."""
+    with open(path, "r") as file:
+        text = file.read()
+    name = os.path.basename(path)
+
+    if test == "test1":
+        # Time: 29.6 Speed: 1.35m/s
+        values = np.array(re.findall(r"^Time: (\S+) Speed: (\S+)m/s$", text, re.M), dtype=np.float64)
+        fields = ("time", "speed")
+    elif test == "test4":
+        # Pedestrian 1, 1.28m/s, from (98, 10) to (103, 10), consumed 1.30s
+        values = np.array(re.findall(r"^Pedestrian (\d+), (\S+)m/s, from \((\d+), (\d+)\) to \((\d+), (\d+)\), "
+                                     r"consumed (\S+)s$", text, re.M), dtype=np.float64)
+        fields = ("pedestrian", "speed", "enter_x", "enter_y", "leave_x", "leave_y", "duration")
+    elif test == "test6":
+        # One time per line between the title and the summary
+        values = np.array(re.findall(r"^([-+.\deE]+)$", text, re.M), dtype=np.float64)
+        fields = ("time",)
+    else:
+        # No. Age Assigned_Speed Simulated_Speed Distance Time, separated by tabs
+        values = np.loadtxt(io.StringIO(text), delimiter="\t", skiprows=1, ndmin=2)
+        fields = ("pedestrian", "age", "assigned_speed", "simulated_speed", "distance", "time")
+
+    values = values.reshape(-1, len(fields))
+    records = np.zeros(len(values), dtype=SCHEMAS[test])
+    for i, field in enumerate(fields):
+        records[field] = values[:, i]
+    if test == "test4":
+        records["pedestrian"] -= 1
+        records["density"] = float(re.match(r"Test4_results(.+)\.txt$", name).group(1))
+    elif test == "test7":
+        records["pedestrian"] -= 1
+        records["run"] = int(re.match(r"Test7_results_(\d+)_\.txt$", name).group(1))
+    else:
+        records["run"] = np.arange(len(records))
+    return records
+
+
+def cache_path(path):
+    return path + ".cache.npz"
+
+
+def load_file(test, path, cache=True):
+    """Parse a CSV or earlier text file of results once. The records are kept in a cache file next to it, which
+    is used as long as the file has not been modified.
+
+    Parameters
+    ----------
+    test : string
+        one of the keys of SCHEMAS
+    path : string
+    cache : bool, optional
+        whether to use and update the cache, by default True
+
+    Returns
+    -------
+    numpy structured array
+    """
+    stat = os.stat(path)
+    version = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    if cache:
+        try:
+            with np.load(cache_path(path)) as cached:
+                if np.array_equal(cached["version"], version) and cached["records"].dtype == SCHEMAS[test]:
+                    return cached["records"]
+        except (OSError, KeyError, ValueError):
+            pass
+
+    records = read_csv(test, path) if path.endswith(".csv") else read_legacy(test, path)
+
+    if cache:
+        # Write under a temporary name first, so that a concurrent reader never sees a partly written cache
+        temporary = os.path.join(os.path.dirname(path), ".%s-%s" % (uuid.uuid4().hex[:8], os.path.basename(path)))
+        try:
+            with open(temporary, "wb") as file:
+                np.savez(file, version=version, records=records)
+            os.replace(temporary, cache_path(path))
+        except OSError:  # e.g. a read-only directory, then just parse again next time
+            if os.path.exists(temporary):
+                os.remove(temporary)
+    return records
+
+
+def load_results(test, directory=OUTPUT_DIRECTORY, cache=True):
+    """Load all results of a test: the CSV and NPZ results if there are any, otherwise the text files of
+    earlier versions (see LEGACY_PATTERNS).
+
+    Parameters
+    ----------
+    test : string
+        one of the keys of SCHEMAS
+    directory : string, optional
+        by default the output directory next to this module
+    cache : bool, optional
+        whether to cache the parsed files next to them, by default True
+
+    Returns
+    -------
+    numpy structured array
+        one record of SCHEMAS[test] per row
+    """
+    chunks = []
+    path = results_path(test, CSV, directory)
+    if os.path.exists(path):
+        chunks.append(load_file(test, path, cache))
+    if os.path.exists(results_path(test, NPZ, directory)):
+        chunks.append(read_results(test, NPZ, directory))
+    if not chunks:
+        for path in sorted(glob.glob(os.path.join(directory, LEGACY_PATTERNS[test]))):
+            chunks.append(load_file(test, path, cache))
+    if not chunks:
+        return np.zeros(0, dtype=SCHEMAS[test])
+    return np.concatenate(chunks)
+
+
+def value_counts(values, decimals=6):
+    """Count how often each value occurs, e.g. for a histogram of times that are multiples of the time step.
+
+    Parameters
+    ----------
+    values : Array
+        nan is ignored
+    decimals : int, optional
+        values are rounded to this many decimals first, so that floating point noise does not split equal
+        values, by default 6
+
+    Returns
+    -------
+    tuple
+        the sorted distinct values and the number of times each of them occurs
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    return np.unique(np.round(values, decimals), return_counts=True)
+
+
+def summary(values):
+    """
+    Parameters
+    ----------
+    values : Array
+        nan is ignored
+
+    Returns
+    -------
+    dict
+        count, and if there are any values, minimum, mean, maximum and standard deviation
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    summary = {"count": len(values)}
+    if len(values) > 0:
+        summary["min"] = float(values.min())
+        summary["mean"] = float(values.mean())
+        summary["max"] = float(values.max())
+        summary["std"] = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    return summary
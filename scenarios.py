@@ -0,0 +1,468 @@
+import json
+import os
+
+import numpy as np
+
+from cellular_automaton import ANY_TARGET, EMPTY, NUM_OF_UNIT_LEN_PER_METER, RIMEA_TEST1_DISTANCE, Pedestrian
+
+
+# Size of the cellular automaton of each scenario
+SIZES = {
+    "task2": (50, 50),
+    "task3": (50, 50),
+    "task4": (50, 50),
+    "test1": (140, 20),
+    "test4": (153, 21),  # 150*15 i.e. 50m*5m
+    "test6": (50, 50),
+    "test7": (153, 56)
+}
+
+SPEED_AGE_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "speed_age_config.txt")
+
+# The scenario files of the preset tasks and RiMEA tests, see read_scenario()
+SCENARIO_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenario_files")
+
+SCENARIO_KEYS = {"name", "description", "size", "map", "obstacles", "targets", "measuring_areas", "pedestrians"}
+SHAPE_KEYS = {"x", "y", "cells", "mask", "group"}
+SPAWN_KEYS = SHAPE_KEYS | {"count", "density", "speed", "age", "distance"}
+# The characters of a map
+MAP_OBSTACLE = "#"
+MAP_TARGET = "T"
+MAP_PEDESTRIAN = "P"
+
+# Layouts are added about this many cells at a time, so that the coordinates of large layouts need little memory
+BULK_CELLS = 1 << 18
+
+
+def build(CA, scenario, rng, **params):
+    """Reset the cellular automaton and set up one of the preset tasks or RiMEA tests in it,
+    without any GUI.
+
+    Parameters
+    ----------
+    CA : Cellular_Automaton
+    scenario : string
+        one of the keys of SIZES
+    rng : numpy.random.Generator
+        the random number generator used for placing the pedestrians and drawing their speeds
+    params :
+        scenario specific parameters, i.e. density for test4
+    """
+    CA.reset(*SIZES[scenario])
+    if scenario == "task2":
+        add_task2(CA)
+    elif scenario == "task3":
+        add_task3(CA)
+    elif scenario == "task4":
+        add_task4(CA)
+    elif scenario == "test1":
+        add_test1_geometry(CA)
+        add_test1_pedestrian(CA, rng)
+    elif scenario == "test4":
+        add_test4_geometry(CA)
+        add_test4_pedestrians(CA, params["density"], rng)
+    elif scenario == "test6":
+        add_test6_geometry(CA)
+        add_test6_pedestrians(CA, rng)
+    elif scenario == "test7":
+        add_test7_geometry(CA)
+        add_test7_pedestrians(CA, rng)
+    else:
+        raise ValueError("Unknown scenario: " + scenario)
+
+
+def read_scenario(path):
+    """Read a scenario file. A scenario file is a JSON object with the keys
+
+    - size: [width, height] of the cellular automaton
+    - map (optional): a list of strings, one per row y, with "#" for obstacles, "T" for targets and "P" for
+      pedestrians at the character x
+    - obstacles, targets (optional): lists of shapes
+    - measuring_areas (optional): a list of rectangles
+    - pedestrians (optional): a list of spawn regions
+    - name, description (optional)
+
+    A shape is a rectangle {"x": [x0, x1], "y": [y0, y1]} of the cells x0 <= x < x1 and y0 <= y < y1, a list of
+    cells {"cells": [[x, y], ...]}, or a mask {"mask": "file.npy"} of a boolean array of the size of the
+    cellular automaton. Targets can have a "group": the name of a target group, e.g. an exit, see
+    Cellular_Automaton.add_target_group().
+
+    A spawn region is a shape with optional keys
+    - count: number of pedestrians placed at random empty cells of the shape, or
+    - density: pedestrians per m^2 of the shape. Without both, every cell of the shape gets a pedestrian.
+    - speed: in m/s, by default 1.33. Either a number, {"uniform": [low, high]}, {"normal": [mean, std]},
+      or {"by_age": "speed_age_config.txt"} for the normal distribution of the age in that file. Random numbers
+      can be limited by "clip": [low, high] and multiplied by "scale".
+    - age: like speed, by default 30. Random ages are rounded down. With speeds by age, all ages that can be drawn
+      must be in the file, so a normal distribution of the age needs a clip.
+    - distance: the distance to the target in m for the results of the RiMEA tests, either a number or
+      {"to_x": x} for the distance along x to the column x.
+    - group: the name of the target group the pedestrians head to. Without a group, they head to the nearest
+      target of any group.
+
+    Paths are relative to the scenario file. The masks are loaded by this function.
+
+    Parameters
+    ----------
+    path : string
+
+    Returns
+    -------
+    dict
+        the scenario as taken by load_layout(), spawn_pedestrians() and load()
+    """
+    with open(path, "r") as file:
+        scenario = json.load(file)
+    unknown = set(scenario) - SCENARIO_KEYS
+    if unknown:
+        raise ValueError("{}: unknown keys {}".format(path, sorted(unknown)))
+    if "size" not in scenario:
+        raise ValueError("{}: the size is missing".format(path))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    for shape in scenario.get("obstacles", []) + scenario.get("targets", []) + scenario.get("pedestrians", []):
+        if isinstance(shape.get("mask"), str):
+            shape["mask"] = np.load(os.path.join(directory, shape["mask"]))
+        speed = shape.get("speed")
+        if isinstance(speed, dict) and "by_age" in speed:
+            speed["by_age"] = os.path.join(directory, speed["by_age"])
+            check_ages(shape, read_speed_age_config(speed["by_age"]))
+    return scenario
+
+
+def age_range(spec):
+    """The lowest and highest age that can be drawn as specified in a spawn region, see sample().
+
+    Returns
+    -------
+    tuple
+        the ages, or None if they are not bounded, i.e. a normal distribution without clip
+    """
+    if not isinstance(spec, dict):
+        low = high = spec
+    elif "clip" in spec:
+        low, high = spec["clip"]
+        if "uniform" in spec:
+            low, high = max(low, spec["uniform"][0]), min(high, spec["uniform"][1])
+    elif "uniform" in spec:
+        low, high = spec["uniform"]
+    else:
+        return None
+    if isinstance(spec, dict):
+        low, high = sorted((low * spec.get("scale", 1), high * spec.get("scale", 1)))
+    return int(low), int(high)
+
+
+def check_ages(spawn, speed_info):
+    """Raise a ValueError if a spawn region with speeds by age can draw an age that is not in its table."""
+    ages = age_range(spawn.get("age", Pedestrian(0, 0).age))
+    if ages is None:
+        raise ValueError("the ages of {} need a clip to stay within the speed table {}".format(
+            spawn, spawn["speed"]["by_age"]))
+    missing = [age for age in range(ages[0], ages[1] + 1) if age not in speed_info]
+    if missing:
+        raise ValueError("the ages {} of {} are not in the speed table {}".format(
+            missing, spawn, spawn["speed"]["by_age"]))
+
+
+def preset_scenario(name):
+    """The scenario file of a preset task or RiMEA test, i.e. one of the keys of SIZES."""
+    return read_scenario(os.path.join(SCENARIO_DIRECTORY, name + ".json"))
+
+
+def shape_cells(shape, width, height):
+    """
+    Returns
+    -------
+    tuple
+        the x and y coordinates of the cells of a shape, as arrays. The cells of a list are in its order,
+        all others ordered by x and then y.
+    """
+    unknown = set(shape) - SPAWN_KEYS
+    if unknown:
+        raise ValueError("unknown keys {} in {}".format(sorted(unknown), shape))
+    if "cells" in shape:
+        cells = np.array(shape["cells"], dtype=np.int64).reshape(-1, 2)
+        return cells[:, 0], cells[:, 1]
+    if "mask" in shape:
+        return np.nonzero(shape_mask(shape, width, height))
+    if "x" in shape and "y" in shape:
+        (x0, x1), (y0, y1) = shape["x"], shape["y"]
+        xs, ys = np.meshgrid(np.arange(max(x0, 0), min(x1, width)), np.arange(max(y0, 0), min(y1, height)),
+                             indexing="ij")
+        return xs.ravel(), ys.ravel()
+    raise ValueError("a shape needs x and y, cells or a mask: {}".format(shape))
+
+
+def shape_mask(shape, width, height):
+    mask = np.asarray(shape["mask"], dtype=bool)
+    if mask.shape != (width, height):
+        raise ValueError("the mask has the size {}, not {}".format(mask.shape, (width, height)))
+    return mask
+
+
+def shapes_mask(shapes, width, height):
+    mask = np.zeros((width, height), dtype=bool)
+    for shape in shapes:
+        if "mask" in shape and "cells" not in shape:
+            mask |= shape_mask(shape, width, height)
+        else:
+            mask[shape_cells(shape, width, height)] = True
+    return mask
+
+
+def map_mask(scenario, character):
+    """The cells of the map of a scenario that show the given character."""
+    width, height = scenario["size"]
+    mask = np.zeros((width, height), dtype=bool)
+    for y, row in enumerate(scenario.get("map", [])[:height]):
+        row = np.frombuffer(row[:width].encode("ascii"), dtype=np.uint8)
+        mask[:len(row), y] = row == ord(character)
+    return mask
+
+
+def load_layout(CA, scenario):
+    """Write the obstacles, targets and measuring areas of a scenario into the cellular automaton, each of them at
+    once. Targets replace obstacles in the same cell.
+
+    Parameters
+    ----------
+    CA : Cellular_Automaton
+        of the size of the scenario
+    scenario : dict
+        see read_scenario()
+    """
+    width, height = scenario["size"]
+    if (CA.width, CA.height) != (width, height):
+        raise ValueError("the scenario needs a cellular automaton of {}*{}, not {}*{}".format(
+            width, height, CA.width, CA.height))
+
+    obstacles = shapes_mask(scenario.get("obstacles", []), width, height) | map_mask(scenario, MAP_OBSTACLE)
+    targets = shapes_mask(scenario.get("targets", []), width, height) | map_mask(scenario, MAP_TARGET)
+    band = max(1, BULK_CELLS // height)
+    for x0 in range(0, width, band):
+        xs, ys = np.nonzero(obstacles[x0:x0+band] & ~targets[x0:x0+band])
+        CA.add_obstacles(xs + x0, ys)
+    for x0 in range(0, width, band):
+        xs, ys = np.nonzero(targets[x0:x0+band])
+        CA.add_targets(xs + x0, ys)
+    for shape in scenario.get("targets", []):
+        if "group" in shape:
+            CA.add_targets(*shape_cells(shape, width, height), group=shape["group"])
+    for area in scenario.get("measuring_areas", []):
+        (x0, x1), (y0, y1) = area["x"], area["y"]
+        CA.add_measuring_area(l=x0, r=x1-1, u=y0, d=y1-1)
+
+
+def sample(spec, n, rng, ages=None):
+    """Draw n values of a speed or age as specified in a spawn region, see read_scenario().
+
+    Returns
+    -------
+    tuple
+        the values, and for speeds by age the mean speed of each age (otherwise None)
+    """
+    if not isinstance(spec, dict):
+        return np.full(n, spec, dtype=np.float64), None
+    means = None
+    if "by_age" in spec:
+        speed_info = read_speed_age_config(spec["by_age"])
+        missing = set(ages.tolist()) - set(speed_info)
+        if missing:
+            raise ValueError("the ages {} are not in the speed table {}".format(sorted(missing), spec["by_age"]))
+        means = np.array([speed_info[age][0] for age in ages.tolist()])
+        values = rng.normal(means, [speed_info[age][1] for age in ages.tolist()])
+    elif "uniform" in spec:
+        values = rng.uniform(*spec["uniform"], n)
+    elif "normal" in spec:
+        values = rng.normal(*spec["normal"], n)
+    else:
+        raise ValueError("unknown distribution {}".format(spec))
+    if "clip" in spec:
+        values = np.clip(values, *spec["clip"])
+    return values * spec.get("scale", 1), means
+
+
+def spawn_pedestrians(CA, scenario, rng=None):
+    """Add the pedestrians of the map and the spawn regions of a scenario, each region at once.
+
+    Parameters
+    ----------
+    CA : Cellular_Automaton
+        with the layout of the scenario
+    scenario : dict
+        see read_scenario()
+    rng : numpy.random.Generator, optional
+        only needed for spawn regions with a count, a density or random speeds and ages
+    """
+    width, height = scenario["size"]
+    spawns = scenario.get("pedestrians", [])
+    if map_mask(scenario, MAP_PEDESTRIAN).any():
+        spawns = [{"mask": map_mask(scenario, MAP_PEDESTRIAN)}] + spawns
+
+    for spawn in spawns:
+        xs, ys = shape_cells(spawn, width, height)
+        free = CA.crt_state[xs, ys] == EMPTY
+        xs, ys = xs[free], ys[free]
+        if "count" in spawn or "density" in spawn:
+            n = spawn["count"] if "count" in spawn else int(spawn["density"] * len(xs) / NUM_OF_UNIT_LEN_PER_METER**2)
+            if n > len(xs):
+                raise ValueError("{} pedestrians do not fit into the {} free cells of {}".format(n, len(xs), spawn))
+            chosen = rng.choice(len(xs), n, replace=False)
+            xs, ys = xs[chosen], ys[chosen]
+
+        ages, _ = sample(spawn.get("age", Pedestrian(0, 0).age), len(xs), rng)
+        ages = ages.astype(np.int64)
+        speeds, mean_speeds = sample(spawn.get("speed", Pedestrian(0, 0).speed), len(xs), rng, ages)
+        group = CA.add_target_group(spawn["group"]) if "group" in spawn else ANY_TARGET
+        rows = CA.add_pedestrians(xs, ys, speeds, ages, group)
+
+        P = CA.population
+        if mean_speeds is not None:
+            P.std_speed[rows] = mean_speeds
+        distance = spawn.get("distance")
+        if isinstance(distance, dict):
+            P.distance_to_target[rows] = (distance["to_x"] - xs) / NUM_OF_UNIT_LEN_PER_METER
+        elif distance is not None:
+            P.distance_to_target[rows] = distance
+
+
+def load(CA, scenario, rng=None):
+    """Reset the cellular automaton to the size of a scenario and set it up.
+
+    Parameters
+    ----------
+    CA : Cellular_Automaton
+    scenario : string/dict
+        the path of a scenario file, or a scenario as returned by read_scenario()
+    rng : numpy.random.Generator, optional
+        see spawn_pedestrians()
+
+    Returns
+    -------
+    dict
+        the scenario
+    """
+    if isinstance(scenario, str):
+        scenario = read_scenario(scenario)
+    CA.reset(*scenario["size"])
+    load_layout(CA, scenario)
+    spawn_pedestrians(CA, scenario, rng)
+    return scenario
+
+
+def add_task2(CA):
+    scenario = preset_scenario("task2")
+    load_layout(CA, scenario)
+    spawn_pedestrians(CA, scenario)
+
+
+def add_task3(CA):
+    scenario = preset_scenario("task3")
+    load_layout(CA, scenario)
+    spawn_pedestrians(CA, scenario)
+
+
+def add_task4(CA):
+    scenario = preset_scenario("task4")
+    load_layout(CA, scenario)
+    spawn_pedestrians(CA, scenario)
+
+
+# The RiMEA tests only take the layout from their scenario files. Their pedestrians are drawn as before, so that
+# the replicates of a seed stay the same.
+def add_test1_geometry(CA):
+    load_layout(CA, preset_scenario("test1"))
+
+
+def add_test1_pedestrian(CA, rng):
+    age = 20
+    y = int(rng.integers(7, 12))
+    speed = rng.uniform(4.5/3.6, 5.1/3.6)  # Random Pedestrian Speed
+
+    # this is basically rescaling our unit
+    speed = speed*(33/40)
+    pd = Pedestrian(20, y, speed, age)
+    pd.distance_to_target = RIMEA_TEST1_DISTANCE
+    CA.add_pedestrian(pd)
+
+
+def add_test4_geometry(CA):
+    load_layout(CA, preset_scenario("test4"))
+
+
+def add_test4_pedestrians(CA, density, rng):
+    """
+    Parameters
+    ----------
+    density : float
+        number of pedestrians per m^2
+    """
+    CA.test4_density = density
+    numOfPd = int(density * 50 * 5)
+
+    pd_cell_labels = rng.choice(150*15, numOfPd, replace=False)
+    CA.add_pedestrians(pd_cell_labels % 150, pd_cell_labels // 150 + 3)
+
+
+def add_test6_geometry(CA):
+    load_layout(CA, preset_scenario("test6"))
+
+
+def add_test6_pedestrians(CA, rng):
+    # uniform distribution of pedesterians in starting area
+    pedestrian_coords = []
+    for x in range(7, 24):
+        for y in range(36, 42):
+            pedestrian_coords.append((x, y))
+
+    for i in rng.choice(len(pedestrian_coords), 20, replace=False).tolist():
+        CA.add_pedestrian(Pedestrian(*pedestrian_coords[i]))
+
+
+def add_test7_geometry(CA):
+    load_layout(CA, preset_scenario("test7"))
+
+
+def read_speed_age_config(path=SPEED_AGE_CONFIG):
+    """Read in the mean and standard deviation of the walking speed for each age
+
+    Returns
+    -------
+    dict
+        maps the age to the tuple (mu, sigma)
+    """
+    speed_info = {}
+    with open(path, "r") as speed_config:
+        for line in speed_config.readlines():
+            info = line.split(" ")
+            age = int(info[0])
+            mu = float(info[1])
+            sigma = float(info[2])
+            speed_info[age] = (mu, sigma)
+    return speed_info
+
+
+def add_test7_pedestrians(CA, rng):
+    pos = []
+    for y in range(3, CA.height-3):
+        pos.append((3, y))
+
+    # Generate random age sample with size=50 from N(50, 20^2)
+    age_sample = rng.normal(50, 20, 50)
+
+    speed_info = read_speed_age_config()
+
+    # Generate pedestrians according to RiMEA guideline figure 2
+    for i in range(50):
+        age = int(age_sample[i])
+        if age < 5:
+            age = 5
+        elif age > 80:
+            age = 80
+        speed = rng.normal(speed_info[age][0], speed_info[age][1])
+        pd = Pedestrian(pos[i][0], pos[i][1], speed, age)
+        pd.distance_to_target = (CA.width-3-pos[i][0])/3
+        pd.std_speed = speed_info[age][0]
+        CA.RiMEA_test7_pd.append(pd)
+        CA.add_pedestrian(pd)
@@ -0,0 +1,134 @@
+"""Checks of the cellular automaton. Run them by
+
+    python -m pytest test_cellular_automaton.py
+"""
+import numpy as np
+
+import results
+import scenarios
+from cellular_automaton import (EVENT_SCHEDULING, PEDESTRIAN, RIMEA_TEST1_RUNS, RIMEA_TEST6_RUNS,
+                                TICK_SCHEDULING, Cellular_Automaton, Observer)
+
+
+def build(scenario, scheduling=TICK_SCHEDULING, tile_size=None, **params):
+    CA = Cellular_Automaton(1, 1, tile_size)
+    CA.floor_field_cache = None
+    scenarios.build(CA, scenario, np.random.default_rng(3), **params)
+    CA.set_scheduling(scheduling)
+    CA.compute_dist_cost()
+    CA.paused = False
+    return CA
+
+
+def positions(CA):
+    P = CA.population
+    live = ~P.removed
+    return P.ids[:P.n][live].tolist(), P.x[live].tolist(), P.y[live].tolist()
+
+
+def trajectories(CA, until, switch_every=None):
+    """The positions of the pedestrians after each step, by the simulated time."""
+    trajectory = {}
+    while not CA.paused and CA.next_time() < until:
+        if switch_every is not None and CA.step_count % switch_every == switch_every - 1:
+            CA.set_scheduling(EVENT_SCHEDULING if CA.scheduling == TICK_SCHEDULING else TICK_SCHEDULING)
+        CA.step()
+        trajectory[CA.now] = positions(CA)
+    return trajectory
+
+
+def test_event_scheduling_moves_like_tick_scheduling():
+    for scenario, params in (("task3", {}), ("test1", {}), ("test6", {}), ("test7", {}), ("test4", {"density": 2})):
+        tick = build(scenario, **params)
+        expected = trajectories(tick, 30)
+        event = build(scenario, EVENT_SCHEDULING, **params)
+        trajectory = trajectories(event, 30)
+        # Event scheduling skips the time steps without moves, and moves the same pedestrians in the others
+        assert set(trajectory) <= set(expected)
+        assert all(trajectory[now] == expected[now] for now in trajectory)
+        assert (event.agent_steps, positions(event)) == (tick.agent_steps, positions(tick))
+        assert event.step_count <= tick.step_count
+
+        # Switching back and forth keeps the clocks of the pedestrians
+        switched = build(scenario, **params)
+        trajectory = trajectories(switched, 30, switch_every=7)
+        assert all(trajectory[now] == expected[now] for now in trajectory)
+        assert positions(switched) == positions(tick)
+
+
+class Replicate_Observer(Observer):
+    def __init__(self):
+        self.requested = []
+
+    def replicate_requested(self, test_mode):
+        self.requested.append(test_mode)
+
+
+def run_series(CA, test_mode, rng):
+    """Run a series of RiMEA test 1 or 6 to its end, setting up every replicate like the GUI does."""
+    observer = Replicate_Observer()
+    CA.add_observer(observer)
+    requested = [test_mode]
+    while requested:
+        requested.pop()
+        CA.RiMEA_test_mode = test_mode
+        if test_mode == 1:
+            if CA.RiMEA_test1_counter == RIMEA_TEST1_RUNS:
+                CA.reset(*scenarios.SIZES["test1"])
+                scenarios.add_test1_geometry(CA)
+            else:
+                CA.now = 0
+            scenarios.add_test1_pedestrian(CA, rng)
+        else:
+            if CA.RiMEA_test6_counter == RIMEA_TEST6_RUNS:
+                CA.reset(*scenarios.SIZES["test6"])
+                scenarios.add_test6_geometry(CA)
+            scenarios.add_test6_pedestrians(CA, rng)
+        CA.compute_dist_cost()
+        CA.paused = False
+        while not CA.paused:
+            CA.step()
+        requested = observer.requested
+    CA.observers.remove(observer)
+
+
+def test_series_write_fresh_results(tmp_path):
+    # Each of two series in a row replaces the results of the last one by a full set of runs
+    CA = Cellular_Automaton(1, 1)
+    CA.floor_field_cache = None
+    CA.results_directory = str(tmp_path)
+    rng = np.random.default_rng(4)
+    for test_mode, test, runs in ((1, "test1", RIMEA_TEST1_RUNS), (6, "test6", RIMEA_TEST6_RUNS)):
+        for _ in range(2):
+            run_series(CA, test_mode, rng)
+            assert CA.RiMEA_test_mode == 0
+            records = results.read_results(test, directory=str(tmp_path))
+            assert records["run"].tolist() == list(range(runs))
+
+
+def check_occupant(CA):
+    """Check that occupant holds the id of the pedestrian in each cell and -1 in all other cells."""
+    P = CA.population
+    live = ~P.removed
+    occupant = np.asarray(CA.occupant)
+    expected = np.full(occupant.shape, -1, dtype=occupant.dtype)
+    expected[P.x[live], P.y[live]] = P.ids[:P.n][live]
+    assert np.array_equal(occupant, expected)
+    assert np.array_equal(np.asarray(CA.crt_state) == PEDESTRIAN, expected >= 0)
+    assert np.array_equal(P.row_of_id[P.ids[:P.n][live]], np.nonzero(live)[0])
+
+
+def test_occupant_follows_population():
+    # Crowds that leave by a narrow exit, so that many pedestrians block each other and the population is
+    # compacted several times while they are removed at the target
+    for scheduling, tile_size, density in ((TICK_SCHEDULING, None, 4), (EVENT_SCHEDULING, None, 4),
+                                           (TICK_SCHEDULING, 16, 2)):
+        CA = build("test4", scheduling, tile_size, density=density)
+        check_occupant(CA)
+        compactions = 0
+        while not CA.paused:
+            n = CA.population.n
+            CA.step()
+            compactions += CA.population.n < n
+            check_occupant(CA)
+        assert len(CA.population) == 0 and compactions >= 3
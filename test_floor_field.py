@@ -0,0 +1,121 @@
+"""Checks of the floor fields against slow reference implementations. Run them by
+
+    python -m pytest test_floor_field.py
+"""
+import numpy as np
+
+import floor_field
+from tiled_grid import Tiled_Grid
+
+
+def brute_force_squared_distance(shape, targets):
+    """The squared Euclidean distance from every cell to the nearest target, by comparing all cells with all
+    targets.
+    """
+    x = np.arange(shape[0])[:, None, None]
+    y = np.arange(shape[1])[None, :, None]
+    return ((x - targets[:, 0])**2 + (y - targets[:, 1])**2).min(axis=2)
+
+
+def random_targets(rng, width, height, count):
+    return np.stack([rng.integers(0, width, count), rng.integers(0, height, count)], axis=1)
+
+
+def test_squared_distance_to_targets():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        width, height = rng.integers(1, 40, 2)
+        targets = random_targets(rng, width, height, rng.integers(1, 60))
+        expected = brute_force_squared_distance((width, height), targets)
+        # Small temporary arrays split the rows into many blocks
+        for max_elements in (1, 100, 1 << 22):
+            sq = floor_field.squared_distance_to_targets((width, height), targets, max_elements)
+            assert np.array_equal(sq, expected)
+
+
+def test_squared_distance_to_targets_in_lines():
+    # Targets in one row or column, and equidistant targets with ties between the parabolas
+    rng = np.random.default_rng(1)
+    for targets in ([(5, y) for y in range(0, 30, 3)], [(x, 7) for x in range(2, 40, 5)],
+                    [(0, 0), (39, 29), (0, 29), (39, 0)], [(x, x) for x in range(0, 30, 2)]):
+        targets = np.array(targets)
+        assert np.array_equal(floor_field.squared_distance_to_targets((40, 30), targets),
+                              brute_force_squared_distance((40, 30), targets))
+    targets = random_targets(rng, 120, 80, 1000)
+    assert np.array_equal(floor_field.squared_distance_to_targets((120, 80), targets),
+                          brute_force_squared_distance((120, 80), targets))
+
+
+def test_tiled_methods():
+    # The floor fields computed on tiles are those of dense arrays in single precision
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        width, height = rng.integers(1, 50, 2)
+        passable = rng.random((width, height)) < 0.8
+        passable[:width//2, :height//3] = False
+        tiled = Tiled_Grid((width, height), False, bool, 8)
+        tiled[:, :] = passable
+        targets = random_targets(rng, width, height, rng.integers(0, 5))
+        for method, args in ((floor_field.euclidean_distance, (width + height,)),
+                             (floor_field.dijkstra_distance, (1/3, width + height)),
+                             (floor_field.fast_marching_distance, (1/3, width + height))):
+            dist, _ = method(passable, targets, *args)
+            tiled_dist, _ = floor_field.TILED_METHODS[method](tiled, targets, *args)
+            assert np.array_equal(np.asarray(tiled_dist), dist.astype(floor_field.TILED_DIST_DTYPE))
+
+
+def test_repair_dijkstra_distance():
+    # Repairing after random edits of the obstacles and targets gives the floor field computed from scratch
+    rng = np.random.default_rng(3)
+    for case in range(30):
+        width, height = rng.integers(2, 30, 2)
+        passable = rng.random((width, height)) < 0.75
+        targets = [tuple(target) for target in random_targets(rng, width, height, rng.integers(1, 4)).tolist()]
+        # A small unreachable distance also caps the distances of far cells
+        unreachable = width + height if case % 3 else (width + height) / 4
+        dist, _ = floor_field.dijkstra_distance(passable, targets, 1/3, unreachable)
+        for _ in range(20):
+            old_passable, old_targets = passable.copy(), list(targets)
+            for _ in range(rng.integers(1, 4)):
+                x, y = int(rng.integers(width)), int(rng.integers(height))
+                edit = rng.integers(3)
+                if edit == 0:
+                    passable[x, y] = not passable[x, y]
+                elif edit == 1:
+                    targets.append((x, y))
+                elif len(targets) > 1:
+                    targets.pop(int(rng.integers(len(targets))))
+            changed = floor_field.changed_cells(old_passable, old_targets, passable, targets)
+            floor_field.repair_dijkstra_distance(dist, passable, targets, changed, 1/3, unreachable)
+            expected, _ = floor_field.dijkstra_distance(passable, targets, 1/3, unreachable)
+            assert np.array_equal(dist, expected)
+
+
+def test_floor_field_cache(tmp_path, monkeypatch):
+    passable = np.ones((30, 20), dtype=bool)
+    passable[10, :15] = False
+    targets = [(29, 19)]
+    cache = floor_field.Floor_Field_Cache(capacity=0, directory=str(tmp_path))
+    dist, stats = cache.compute(floor_field.dijkstra_distance, passable, targets, 1/3, 50)
+    assert not stats.cached
+    # Another process finds the floor field on disk
+    cached, stats = floor_field.Floor_Field_Cache(directory=str(tmp_path)).compute(
+        floor_field.dijkstra_distance, passable, targets, 1/3, 50)
+    assert stats.cached and np.array_equal(cached, dist)
+
+    # Tiled floor fields are stored by their tiles
+    tiled = Tiled_Grid(passable.shape, False, bool, 8)
+    tiled[:, :] = passable
+    tiled.compact()
+    tiled_dist, _ = cache.compute(floor_field.tiled_dijkstra_distance, tiled, targets, 1/3, 50)
+    cached, stats = cache.compute(floor_field.tiled_dijkstra_distance, tiled, targets, 1/3, 50)
+    assert stats.cached and np.array_equal(np.asarray(cached), np.asarray(tiled_dist))
+
+    # Floor fields of another version are not used
+    monkeypatch.setattr(floor_field, "FLOOR_FIELD_VERSION", floor_field.FLOOR_FIELD_VERSION + 1)
+    _, stats = cache.compute(floor_field.dijkstra_distance, passable, targets, 1/3, 50)
+    assert not stats.cached
+
+    cache.max_disk_bytes = 0
+    cache.trim()
+    assert list(tmp_path.iterdir()) == []
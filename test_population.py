@@ -0,0 +1,104 @@
+"""Checks of the population of pedestrians. Run them by
+
+    python -m pytest test_population.py
+"""
+import numpy as np
+
+from population import Pedestrian, Population
+
+
+def check_rows(P):
+    """Check that row_of_id and the ids of the rows are inverse to each other."""
+    live = ~P.removed
+    ids = P.ids[:P.n]
+    assert len(P) == np.count_nonzero(live)
+    assert np.array_equal(P.row_of_id[ids[live]], np.nonzero(live)[0])
+    removed_ids = np.setdiff1d(np.arange(P.next_id), ids[live])
+    assert np.all(P.row_of_id[removed_ids] == -1)
+
+
+def test_compaction_threshold():
+    P = Population()
+    P.add_many(np.arange(100), np.zeros(100, dtype=int))
+    for row in range(66):
+        n = P.n
+        P.remove([P.row_of_id[row]])
+        check_rows(P)
+        holes = n - P.size
+        if holes > max(P.size, 16):
+            # The holes are dropped once they outnumber the pedestrians, keeping the order of the others
+            assert P.n == P.size
+            assert P.ids[:P.n].tolist() == list(range(row + 1, 100))
+            assert P.x.tolist() == list(range(row + 1, 100))
+        else:
+            assert P.n == n
+    # Compacted once, at 51 holes
+    assert P.n == 49 and P.size == 34
+
+    # Few pedestrians are compacted only from 16 holes on
+    P = Population()
+    P.add_many(np.arange(20), np.zeros(20, dtype=int))
+    P.remove(np.arange(16))
+    assert P.n == 20
+    P.remove([P.row_of_id[16]])
+    assert P.n == P.size == 3
+    check_rows(P)
+
+
+def test_freed_rows_are_reused():
+    P = Population()
+    P.add_many(np.arange(64), np.zeros(64, dtype=int))
+    rng = np.random.default_rng(1)
+    capacities = []
+    for _ in range(20):
+        live = np.nonzero(~P.removed)[0]
+        P.remove(rng.choice(live, size=len(live)//2, replace=False))
+        rows = P.add_many(np.full(len(live)//2, -1), np.zeros(len(live)//2, dtype=int))
+        check_rows(P)
+        assert np.all(P.x[rows] == -1)
+        assert P.n - P.size <= max(P.size, 16)
+        capacities.append(len(P.ids))
+    # The rows freed by compaction take the new pedestrians, so the columns stop growing
+    assert set(capacities) == {capacities[0]}
+    assert P.next_id > 4*capacities[0]
+
+
+def test_row_of_id():
+    P = Population()
+    pds = [Pedestrian(i, 2*i, speed=1 + i/10) for i in range(5)]
+    for pd in pds:
+        P.add(pd)
+    P.add_many([10, 11], [20, 22], speeds=[2., 3.])
+    assert P.rows([0, 4, 5, 6]).tolist() == [0, 4, 5, 6]
+    P.remove(P.rows([1, 5]))
+    assert P.rows([0, 1, 2, 5, 6]).tolist() == [0, -1, 2, -1, 6]
+    assert P.get(6, "x") == 11 and P.get(6, "speed") == 3.
+    P.set(6, "x", 12)
+    assert P.x[P.row_of_id[6]] == 12
+    check_rows(P)
+
+
+def test_views_after_compaction():
+    P = Population()
+    pds = [Pedestrian(i, 0) for i in range(40)]
+    for pd in pds:
+        P.add(pd)
+    removed, kept = pds[:30], pds[30:]
+    # A view of a pedestrian that is only referenced by the population
+    row = P.add_many([99], [0])[0]
+    view_id = int(P.ids[row])
+    P.remove(P.rows([pd.id for pd in removed]))
+    assert P.n == P.size == 11
+
+    # The views of the others follow their rows
+    for i, pd in enumerate(kept):
+        assert pd.population is P and P.row_of_id[pd.id] == i
+        assert (pd.x, pd.y) == (30 + i, 0)
+    kept[3].y = 7
+    assert P.y[3] == 7
+    assert list(P)[:10] == kept
+    assert P.view(view_id).x == 99
+    # The removed pedestrians keep their last values
+    removed[5].x += 100
+    assert removed[5].population is None and removed[5].x == 105
+    check_rows(P)
@@ -0,0 +1,164 @@
+"""Checks of the scenario files. Run them by
+
+    python -m pytest test_scenarios.py
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+import scenarios
+from cellular_automaton import OBSTACLE, PEDESTRIAN, TARGET, Cellular_Automaton, Pedestrian
+
+
+# The preset tasks and RiMEA tests as they were built cell by cell before they were read from scenario files
+def old_task2(CA):
+    CA.add_pedestrian(Pedestrian(4, 24))
+    CA.add_target(24, 24)
+
+
+def old_task3(CA):
+    for x, y in ((18, 0), (40, 10), (49, 29), (19, 49), (0, 30)):
+        CA.add_pedestrian(Pedestrian(x, y))
+    CA.add_target(24, 24)
+
+
+def old_task4(CA):
+    for x in range(20, 30, 1):
+        CA.add_obstacle(x, 20)
+    for y in range(20, 30, 1):
+        CA.add_obstacle(30, y)
+    for x in range(30, 19, -1):
+        CA.add_obstacle(x, 30)
+    CA.add_pedestrian(Pedestrian(25, 25))
+    CA.add_pedestrian(Pedestrian(22, 27))
+    CA.add_pedestrian(Pedestrian(27, 27))
+    CA.add_target(40, 25)
+
+
+def old_test1_geometry(CA):
+    for x in range(20, 120):
+        CA.add_obstacle(x, 12)
+        CA.add_obstacle(x, 6)
+    for y in range(6, 13):
+        CA.add_obstacle(19, y)
+        CA.add_obstacle(120, y)
+    for y in range(7, 12):
+        CA.add_target(119, y)
+
+
+def old_test4_geometry(CA):
+    for x in range(CA.width):
+        CA.add_obstacle(x, 2)
+        CA.add_obstacle(x, CA.height-3)
+    for y in range(9, 12):
+        CA.add_target(CA.width-2, y)
+    for y in range(2, 9):
+        CA.add_obstacle(CA.width-3, y)
+    for y in range(12, CA.height-3):
+        CA.add_obstacle(CA.width-3, y)
+    CA.add_measuring_area(l=98, r=102, u=8, d=12)
+
+
+def old_test6_geometry(CA):
+    for x in range(7, 42):
+        CA.add_obstacle(x, 42)
+    for y in range(7, 43):
+        CA.add_obstacle(42, y)
+    for x in range(7, 36):
+        CA.add_obstacle(x, 35)
+    for y in range(7, 35):
+        CA.add_obstacle(35, y)
+    for y in range(35, 43):
+        CA.add_obstacle(6, y)
+    for x in range(36, 42):
+        CA.add_target(x, 7)
+
+
+def old_test7_geometry(CA):
+    for x in range(CA.width):
+        CA.add_obstacle(x, 2)
+        CA.add_obstacle(x, CA.height-3)
+    for y in range(3, CA.height-3):
+        CA.add_target(CA.width-3, y)
+
+
+OLD_BUILDERS = {
+    "task2": (old_task2, scenarios.add_task2),
+    "task3": (old_task3, scenarios.add_task3),
+    "task4": (old_task4, scenarios.add_task4),
+    "test1": (old_test1_geometry, scenarios.add_test1_geometry),
+    "test4": (old_test4_geometry, scenarios.add_test4_geometry),
+    "test6": (old_test6_geometry, scenarios.add_test6_geometry),
+    "test7": (old_test7_geometry, scenarios.add_test7_geometry)
+}
+
+
+def test_layouts_like_old_builders():
+    for name, builders in OLD_BUILDERS.items():
+        old, new = [Cellular_Automaton(*scenarios.SIZES[name]) for _ in builders]
+        for CA, builder in zip((old, new), builders):
+            CA.floor_field_cache = None
+            builder(CA)
+        assert np.array_equal(new.crt_state, old.crt_state), name
+        assert np.array_equal(new.isMA, old.isMA), name
+        assert sorted(new.coord_target) == sorted(old.coord_target), name
+        assert (new.population.x.tolist(), new.population.y.tolist()) == (old.population.x.tolist(),
+                                                                          old.population.y.tolist()), name
+        old.compute_dist_cost()
+        new.compute_dist_cost()
+        assert np.array_equal(new.dist_cost, old.dist_cost), name
+
+
+def test_load_shipped_scenarios():
+    paths = sorted(glob.glob(os.path.join(scenarios.SCENARIO_DIRECTORY, "*.json")))
+    assert {os.path.splitext(os.path.basename(path))[0] for path in paths} >= set(scenarios.SIZES)
+    for path in paths:
+        CA = Cellular_Automaton(1, 1)
+        CA.floor_field_cache = None
+        scenario = scenarios.load(CA, path, np.random.default_rng(1))
+        assert (CA.width, CA.height) == tuple(scenario["size"]), path
+        assert CA.coord_target, path
+
+        P = CA.population
+        assert np.all(CA.crt_state[P.x, P.y] == PEDESTRIAN), path
+        assert np.count_nonzero(CA.crt_state == PEDESTRIAN) == len(P) > 0, path
+        assert np.all((P.speed > 0) & np.isfinite(P.speed)), path
+
+        # Every pedestrian can reach a target
+        CA.compute_dist_cost()
+        for group, dist in enumerate(CA.dist_costs):
+            on_group = P.group == group
+            assert np.all(dist[P.x[on_group], P.y[on_group]] < CA.width*CA.height), path
+        assert np.all(CA.crt_state[tuple(np.array(CA.coord_target).T)] == TARGET), path
+        assert np.any(CA.crt_state == OBSTACLE) == bool(scenario.get("obstacles")), path
+
+
+def write_scenario(directory, age, speed=None):
+    scenario = {"size": [20, 10], "targets": [{"cells": [[19, 5]]}],
+                "pedestrians": [{"x": [0, 5], "y": [0, 10], "count": 10, "age": age,
+                                 "speed": speed or {"by_age": os.path.abspath(scenarios.SPEED_AGE_CONFIG)}}]}
+    path = os.path.join(directory, "scenario.json")
+    with open(path, "w") as file:
+        json.dump(scenario, file)
+    return path
+
+
+def test_reject_ages_outside_speed_table(tmp_path):
+    for age in (3, 81, {"uniform": [20, 90]}, {"normal": [50, 20]}, {"normal": [50, 20], "clip": [0, 80]},
+                {"uniform": [2, 9], "scale": 10}):
+        with pytest.raises(ValueError):
+            scenarios.read_scenario(write_scenario(str(tmp_path), age))
+
+    # Ages within the table, and other speeds, are fine
+    CA = Cellular_Automaton(1, 1)
+    for age in (5, 80, {"uniform": [5, 80]}, {"normal": [50, 20], "clip": [5, 80]}, {"uniform": [2, 8], "scale": 10}):
+        scenarios.load(CA, write_scenario(str(tmp_path), age), np.random.default_rng(2))
+        assert np.all((CA.population.age >= 5) & (CA.population.age <= 80))
+    scenarios.read_scenario(write_scenario(str(tmp_path), 100, speed=1.))
+
+    # Ages drawn outside the table are not looked up
+    with pytest.raises(ValueError):
+        scenarios.sample({"by_age": scenarios.SPEED_AGE_CONFIG}, 2, np.random.default_rng(3), np.array([30, 81]))
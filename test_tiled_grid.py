@@ -0,0 +1,187 @@
+"""Checks of the tiled grids against dense arrays. Run them by
+
+    python -m pytest test_tiled_grid.py
+"""
+import hashlib
+
+import numpy as np
+
+import scenarios
+from cellular_automaton import Cellular_Automaton
+from tiled_grid import Tiled_Grid
+
+SHAPE = (45, 30)  # Not a multiple of the tile size, so that the tiles at the edges are cut
+TILE_SIZE = 8
+
+
+def random_grid(rng, fill=0.):
+    """A tiled grid and its dense equivalent with some random cells, rectangles and uniform tiles."""
+    grid = Tiled_Grid(SHAPE, fill, np.float64, TILE_SIZE)
+    dense = np.full(SHAPE, fill)
+    for _ in range(5):
+        x0, y0 = rng.integers(0, SHAPE[0]), rng.integers(0, SHAPE[1])
+        x1, y1 = x0 + rng.integers(0, 20), y0 + rng.integers(0, 20)
+        value = float(rng.integers(0, 3))
+        grid[x0:x1, y0:y1] = value
+        dense[x0:x1, y0:y1] = value
+    xs, ys = rng.integers(0, SHAPE[0], 50), rng.integers(0, SHAPE[1], 50)
+    grid[xs, ys] = xs + ys
+    dense[xs, ys] = xs + ys
+    return grid, dense
+
+
+def hash_of(grid):
+    h = hashlib.sha1()
+    grid.hash_into(h)
+    return h.hexdigest()
+
+
+def test_set_and_get():
+    rng = np.random.default_rng(1)
+    grid, dense = random_grid(rng)
+    for _ in range(500):
+        x, y = int(rng.integers(0, SHAPE[0])), int(rng.integers(0, SHAPE[1]))
+        value = float(rng.integers(0, 4))
+        if rng.random() < 0.5:
+            # The fast path of single cells
+            grid[x, y] = value
+        else:
+            grid[np.int64(x), np.int64(y)] = value
+        dense[x, y] = value
+        assert grid[x, y] == dense[x, y]
+    assert np.array_equal(np.asarray(grid), dense)
+
+    xs, ys = rng.integers(0, SHAPE[0], 200), rng.integers(0, SHAPE[1], 200)
+    assert np.array_equal(grid[xs, ys], dense[xs, ys])
+    for key in ((slice(3, 40), slice(5, 9)), (7, slice(None)), (slice(None), 29), (slice(40, 60), slice(None)),
+                (slice(10, 5), slice(None)), 12):
+        assert np.array_equal(grid[key], dense[key])
+        grid[key] = -1.
+        dense[key] = -1.
+        assert np.array_equal(np.asarray(grid), dense)
+    grid[4, :] = np.arange(SHAPE[1])
+    dense[4, :] = np.arange(SHAPE[1])
+    assert np.array_equal(np.asarray(grid), dense)
+
+    xs, ys = rng.integers(0, SHAPE[0], 300), rng.integers(0, SHAPE[1], 300)
+    values = rng.random(300)
+    grid.add_at(xs, ys, values)
+    np.add.at(dense, (xs, ys), values)
+    assert np.array_equal(np.asarray(grid), dense)
+
+
+def test_compact_and_release():
+    rng = np.random.default_rng(2)
+    grid, dense = random_grid(rng)
+    tiles = grid.tiles
+    # Tiles that became uniform again take no memory after compact()
+    grid[0:TILE_SIZE, 0:TILE_SIZE] = np.arange(TILE_SIZE**2).reshape(TILE_SIZE, TILE_SIZE)
+    grid[0:TILE_SIZE, 0:TILE_SIZE] = 5.
+    grid[SHAPE[0]-3:, SHAPE[1]-4:] = 7.
+    dense[0:TILE_SIZE, 0:TILE_SIZE] = 5.
+    dense[SHAPE[0]-3:, SHAPE[1]-4:] = 7.
+    grid.compact()
+    assert np.array_equal(np.asarray(grid), dense)
+    assert grid.tiles <= tiles
+    uniform = [(tx, ty) for tx in range(grid.index.shape[0]) for ty in range(grid.index.shape[1])
+               if np.ptp(dense[tx*TILE_SIZE:(tx+1)*TILE_SIZE, ty*TILE_SIZE:(ty+1)*TILE_SIZE]) == 0]
+    assert grid.tiles == grid.index.size - len(uniform)
+    assert all(grid.index[tx, ty] < 0 for tx, ty in uniform)
+
+    # Released tiles take the given values, and their blocks are used again
+    blocks = len(grid.blocks)
+    grid.release([1, 2], [1, 3], [8., 9.])
+    dense[8:16, 8:16] = 8.
+    dense[16:24, 24:30] = 9.
+    assert np.array_equal(np.asarray(grid), dense)
+    grid[9, 9] = 1.
+    grid[17, 25] = 1.
+    dense[9, 9] = dense[17, 25] = 1.
+    assert np.array_equal(np.asarray(grid), dense)
+    assert len(grid.blocks) == blocks
+
+    for tx, ty in np.argwhere(grid.index >= 0).tolist():
+        dense[tx*TILE_SIZE:(tx+1)*TILE_SIZE, ty*TILE_SIZE:(ty+1)*TILE_SIZE] = grid.fill
+    grid.release(*np.nonzero(grid.index >= 0))
+    grid.compact()
+    assert grid.tiles == 0 and len(grid.blocks) == 0
+    assert np.array_equal(np.asarray(grid), dense)
+
+
+def test_map_and_copy():
+    rng = np.random.default_rng(3)
+    grid, dense = random_grid(rng)
+    passable = grid.map(lambda values: values != 1., bool)
+    assert passable.dtype == bool
+    assert np.array_equal(np.asarray(passable), dense != 1.)
+    copy = Tiled_Grid(SHAPE, 0, np.float32, TILE_SIZE)
+    copy[:, :] = grid
+    assert copy.dtype == np.float32
+    assert np.array_equal(np.asarray(copy), dense.astype(np.float32))
+
+
+def test_save_and_load(tmp_path):
+    rng = np.random.default_rng(4)
+    grid, dense = random_grid(rng, fill=np.inf)
+    grid.compact()
+    grid.save(tmp_path / "grid.npz")
+    loaded = Tiled_Grid.load(tmp_path / "grid.npz")
+    assert (loaded.shape, loaded.tile_size, loaded.dtype, loaded.fill) == (grid.shape, grid.tile_size, grid.dtype,
+                                                                          grid.fill)
+    assert np.array_equal(np.asarray(loaded), dense)
+    assert loaded.tiles == grid.tiles == len(loaded.blocks)
+    # The loaded grid can be changed like any other
+    loaded[3, 4] = loaded[44, 29] = 1.
+    dense[3, 4] = dense[44, 29] = 1.
+    assert np.array_equal(np.asarray(loaded), dense)
+
+
+def test_hash_into():
+    rng = np.random.default_rng(5)
+    grid, dense = random_grid(rng)
+    grid.compact()
+    # The same cells set in another way, with the unused cells of the tiles at the edges changed
+    other = Tiled_Grid(SHAPE, 0., np.float64, TILE_SIZE)
+    other[:, :] = dense
+    other.allocate([SHAPE[0] // TILE_SIZE], [SHAPE[1] // TILE_SIZE])
+    other.blocks[other.index[-1, -1], -1, -1] = 123.
+    other.compact()
+    assert hash_of(other) == hash_of(grid)
+
+    other[20, 20] += 1.
+    assert hash_of(other) != hash_of(grid)
+    other[20, 20] -= 1.
+    other.compact()
+    assert hash_of(other) == hash_of(grid)
+    assert hash_of(other.map(lambda values: values, np.float32)) != hash_of(grid)
+
+
+def build(scenario, tile_size):
+    CA = Cellular_Automaton(1, 1, tile_size)
+    CA.floor_field_cache = None
+    scenarios.build(CA, scenario, np.random.default_rng(3))
+    CA.compute_dist_cost()
+    CA.paused = False
+    return CA
+
+
+def test_tiled_run_like_dense():
+    # The costs of tiled grids are summed in another order and the floor fields are single precision, so runs
+    # are only the same as long as no pedestrian has to choose between cells whose costs differ by rounding.
+    # These runs never have to.
+    for scenario in ("task4", "test1", "test7"):
+        dense = build(scenario, None)
+        tiled = build(scenario, 5)
+        assert np.allclose(np.asarray(tiled.dist_cost), dense.dist_cost, rtol=1e-6)
+        for _ in range(300):
+            if dense.paused:
+                break
+            dense.step()
+            tiled.step()
+            assert tiled.population.x.tolist() == dense.population.x.tolist()
+            assert tiled.population.y.tolist() == dense.population.y.tolist()
+            assert np.array_equal(np.asarray(tiled.crt_state), dense.crt_state)
+            assert np.array_equal(np.asarray(tiled.occupant), dense.occupant)
+            assert np.allclose(np.asarray(tiled.avd_cost), dense.avd_cost)
+        assert tiled.paused == dense.paused and tiled.now == dense.now
+        assert tiled.grid_nbytes() < dense.grid_nbytes()
@@ -0,0 +1,85 @@
+"""Checks of recording and replaying trajectories. Run them by
+
+    python -m pytest test_trajectory.py
+"""
+import numpy as np
+
+import scenarios
+from cellular_automaton import PEDESTRIAN, Cellular_Automaton
+from trajectory import Trajectory, Trajectory_Player, Trajectory_Recorder
+
+
+def positions(CA):
+    """The ids and positions of the pedestrians, sorted by id like Trajectory.positions()."""
+    P = CA.population
+    live = ~P.removed
+    ids = P.ids[:P.n][live]
+    order = np.argsort(ids)
+    return ids[order].tolist(), P.x[live][order].tolist(), P.y[live][order].tolist()
+
+
+def record(CA, steps):
+    """Run the cellular automaton and return the positions after each step."""
+    expected = []
+    for _ in range(steps):
+        if CA.paused:
+            break
+        CA.step()
+        expected.append(positions(CA))
+    return expected
+
+
+def test_record_and_replay(tmp_path):
+    CA = Cellular_Automaton(1, 1)
+    CA.floor_field_cache = None
+    scenarios.build(CA, "test6", np.random.default_rng(5))
+    CA.compute_dist_cost()
+    CA.paused = False
+    # A small chunk size, so that the recording is written in several chunks
+    recorder = Trajectory_Recorder(CA, str(tmp_path / "run"), keyframe_interval=7, chunk_size=50)
+    recorder.start()
+    CA.add_observer(recorder)
+    expected = [positions(CA)] + record(CA, 200)
+    assert CA.paused and expected[-1][0] == []
+
+    # The next replicate starts with a keyframe of the new population
+    first_replicate = len(expected)
+    scenarios.build(CA, "test6", np.random.default_rng(6))
+    CA.compute_dist_cost()
+    CA.paused = False
+    expected += record(CA, 30)
+    recorder.close()
+
+    trajectory = Trajectory(str(tmp_path / "run"))
+    assert len(trajectory) == len(expected)
+    keyframes = trajectory.keyframes.tolist()
+    assert keyframes[:3] == [0, 7, 14] and first_replicate in keyframes
+    assert np.all(np.diff(trajectory.times[1:first_replicate]) > 0)
+    assert trajectory.times[first_replicate] < trajectory.times[first_replicate - 1]
+    for step, (ids, xs, ys) in enumerate(expected):
+        assert [values.tolist() for values in trajectory.positions(step)] == [ids, xs, ys]
+
+    # The player marks the same cells as the cellular automaton, whether it advances or seeks
+    grid = trajectory.grid
+    assert not np.any(grid == PEDESTRIAN)
+
+    def check(player, step):
+        _, xs, ys = expected[step]
+        state = grid.copy()
+        state[xs, ys] = PEDESTRIAN
+        assert player.step == step
+        assert np.array_equal(player.crt_state, state)
+
+    player = Trajectory_Player(trajectory)
+    check(player, 0)
+    while not player.at_end():
+        player.advance()
+        check(player, player.step)
+    assert player.step == len(expected) - 1
+    for step in (3, 7, 20, 13, first_replicate + 2, 0):
+        player.seek(step)
+        check(player, step)
+
+    player.seek(0)
+    player.play(trajectory.times[10] + 1e-9)
+    check(player, 10)
@@ -0,0 +1,364 @@
+"""Store a large grid in square tiles, so that only the tiles that hold more than one value take memory.
+
+A Tiled_Grid can be indexed like the 2D arrays of a cellular automaton: by one cell grid[x, y], by arrays of
+coordinates grid[xs, ys] and by rectangles grid[x0:x1, y0:y1]. A tile that is not allocated has one value for all
+its cells, e.g. a tile that is all obstacle, all unreachable or has no avoidance cost. A tile is allocated when one
+of its cells is set to another value, and compact() releases the tiles that became uniform again.
+
+Example
+-------
+    grid = Tiled_Grid((2000, 2000), 0., np.float32)
+    grid[10:20, 10:20] = 1.
+    grid.add_at(xs, ys, values)
+    dense = np.asarray(grid)
+"""
+import numpy as np
+
+DEFAULT_TILE_SIZE = 64
+
+
+class Tiled_Grid:
+    """
+    This class stores a 2D grid in tiles of tile_size*tile_size cells. The allocated tiles are kept in one
+    array of blocks, so that looking up many cells at once stays vectorized. Coordinates must not be negative.
+    """
+
+    ndim = 2
+
+    def __init__(self, shape, fill, dtype, tile_size=DEFAULT_TILE_SIZE):
+        """
+        Parameters
+        ----------
+        shape : tuple
+            width and height of the grid
+        fill : scalar
+            the initial value of all cells, and the value of released tiles
+        dtype : numpy dtype
+        tile_size : integer, optional
+            the width and height of a tile in cells, by default DEFAULT_TILE_SIZE
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.fill = fill
+        self.tile_size = tile_size
+        tiles_shape = tuple(-(-length // tile_size) for length in self.shape)
+
+        # The row of each tile in blocks, -1 for tiles that are not allocated
+        self.index = np.full(tiles_shape, -1, dtype=np.int32)
+        # The value of all cells of each tile that is not allocated
+        self.constant = np.full(tiles_shape, fill, dtype=self.dtype)
+        self.blocks = np.empty((0, tile_size, tile_size), dtype=self.dtype)
+        self.free = []  # rows of blocks that are not in use
+        # The block of each tile as nested lists, None for tiles that are not allocated. Looking up single cells
+        # in lists is much faster than in the index array.
+        self.views = [[None] * tiles_shape[1] for _ in range(tiles_shape[0])]
+
+    @property
+    def tiles(self):
+        """The number of allocated tiles."""
+        return int(np.count_nonzero(self.index >= 0))
+
+    @property
+    def nbytes(self):
+        return self.blocks.nbytes + self.index.nbytes + self.constant.nbytes
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.region(slice(None), slice(None))
+        return dense if dtype is None else dense.astype(dtype)
+
+    def locate(self, xs, ys):
+        """
+        Returns
+        -------
+        tuple
+            the tile coordinates of the cells and their coordinates within the tiles
+        """
+        txs, lxs = np.divmod(xs, self.tile_size)
+        tys, lys = np.divmod(ys, self.tile_size)
+        return txs, tys, lxs, lys
+
+    def allocate(self, txs, tys):
+        """Allocate the given tiles that are not allocated yet, with the constant value of each tile."""
+        txs, tys = np.asarray(txs).ravel(), np.asarray(tys).ravel()
+        new = self.index[txs, tys] < 0
+        if not new.any():
+            return
+        tiles = np.unique(txs[new] * self.index.shape[1] + tys[new])
+        txs, tys = np.divmod(tiles, self.index.shape[1])
+        if len(tiles) > len(self.free):
+            self.grow(len(tiles) - len(self.free))
+        rows = np.array(self.free[-len(tiles):], dtype=np.int32)
+        del self.free[-len(tiles):]
+        self.blocks[rows] = self.constant[txs, tys][:, None, None]
+        self.index[txs, tys] = rows
+        self.update_views(txs, tys)
+
+    def update_views(self, txs=None, tys=None):
+        """Update the views of the given tiles, by default of all tiles."""
+        if txs is None:
+            txs, tys = np.nonzero(np.ones(self.index.shape, dtype=bool))
+        for tx, ty, row in zip(np.asarray(txs).tolist(), np.asarray(tys).tolist(), self.index[txs, tys].tolist()):
+            self.views[tx][ty] = self.blocks[row] if row >= 0 else None
+
+    def map(self, function, dtype):
+        """Apply an elementwise function to all cells without building the dense array.
+
+        Parameters
+        ----------
+        function : callable
+            takes and returns arrays of the same shape
+        dtype : numpy dtype
+            the data type of the result
+
+        Returns
+        -------
+        Tiled_Grid
+            a grid of the same shape and tiles, whose tiles may have become uniform, see compact()
+        """
+        grid = Tiled_Grid(self.shape, np.asarray(function(np.asarray(self.fill, dtype=self.dtype))).item(), dtype,
+                          self.tile_size)
+        grid.constant[...] = function(self.constant)
+        allocated = self.index >= 0
+        rows = self.index[allocated]
+        grid.blocks = np.asarray(function(self.blocks[rows]), dtype=grid.dtype)
+        grid.index[allocated] = np.arange(len(rows), dtype=np.int32)
+        grid.update_views()
+        return grid
+
+    def copy_from(self, other):
+        """Make all cells equal to those of another grid with the same shape and tile size."""
+        allocated = other.index >= 0
+        rows = other.index[allocated]
+        self.blocks = other.blocks[rows].astype(self.dtype)
+        self.index = np.full(other.index.shape, -1, dtype=np.int32)
+        self.index[allocated] = np.arange(len(rows), dtype=np.int32)
+        self.constant = other.constant.astype(self.dtype)
+        self.free = []
+        self.update_views()
+
+    def hash_into(self, h):
+        """Feed the cells into a hashlib hash, tile by tile. Grids with the same cells get the same hash if their
+        uniform tiles are released, see compact().
+        """
+        T = self.tile_size
+        width, height = self.shape
+        h.update(repr((self.shape, T, self.dtype.str)).encode())
+        allocated = self.index >= 0
+        h.update(np.packbits(allocated).tobytes())
+        h.update(self.constant[~allocated].tobytes())
+        for tx, ty in np.argwhere(allocated).tolist():
+            h.update(self.blocks[self.index[tx, ty], :min(T, width - tx*T), :min(T, height - ty*T)].tobytes())
+
+    def save(self, file):
+        """Write the grid into an .npz file, which takes as much space as the allocated tiles."""
+        allocated = self.index >= 0
+        index = np.full(self.index.shape, -1, dtype=np.int32)
+        index[allocated] = np.arange(np.count_nonzero(allocated), dtype=np.int32)
+        np.savez(file, shape=np.array(self.shape), fill=np.array(self.fill, dtype=self.dtype),
+                 tile_size=np.array(self.tile_size), index=index, constant=self.constant,
+                 blocks=self.blocks[self.index[allocated]])
+
+    @classmethod
+    def load(cls, file):
+        """Read a grid written by save()."""
+        with np.load(file) as arrays:
+            grid = cls(tuple(arrays["shape"].tolist()), arrays["fill"].item(), arrays["blocks"].dtype,
+                       int(arrays["tile_size"]))
+            grid.index = arrays["index"]
+            grid.constant = arrays["constant"]
+            grid.blocks = arrays["blocks"]
+        grid.update_views()
+        return grid
+
+    def grow(self, n):
+        """Make room for at least n more blocks."""
+        old = len(self.blocks)
+        capacity = max(2*old, old + n, 4)
+        blocks = np.empty((capacity, self.tile_size, self.tile_size), dtype=self.dtype)
+        blocks[:old] = self.blocks
+        self.blocks = blocks
+        self.free.extend(range(capacity-1, old-1, -1))
+        self.update_views()
+
+    def release(self, txs, tys, values=None):
+        """Release the given tiles, so that all their cells have the same value.
+
+        Parameters
+        ----------
+        txs : Array
+        tys : Array
+        values : Array/scalar, optional
+            the new value of the cells of each tile, by default fill
+        """
+        txs, tys = np.asarray(txs).ravel(), np.asarray(tys).ravel()
+        values = np.broadcast_to(self.fill if values is None else values, txs.shape)
+        rows = self.index[txs, tys]
+        allocated = rows >= 0
+        self.free.extend(np.unique(rows[allocated]).tolist())
+        self.index[txs, tys] = -1
+        self.constant[txs, tys] = values
+        self.update_views(txs, tys)
+
+    def compact(self):
+        """Release the tiles whose cells all have the same value, and give back the memory of the blocks if most of
+        them are not in use.
+        """
+        T = self.tile_size
+        width, height = self.shape
+        uniform = []
+        for tx, ty in np.argwhere(self.index >= 0).tolist():
+            block = self.blocks[self.index[tx, ty], :min(T, width - tx*T), :min(T, height - ty*T)]
+            if block.min() == block.max():
+                uniform.append((tx, ty, block[0, 0]))
+        if uniform:
+            txs, tys, values = zip(*uniform)
+            self.release(list(txs), list(tys), np.array(values, dtype=self.dtype))
+
+        allocated = self.index >= 0
+        if np.count_nonzero(allocated) <= len(self.blocks) // 4:
+            rows = self.index[allocated]
+            self.blocks = self.blocks[rows]
+            self.index[allocated] = np.arange(len(rows), dtype=np.int32)
+            self.free = []
+            self.update_views()
+
+    def split_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        return key
+
+    def __getitem__(self, key):
+        if type(key) is tuple and type(key[0]) is int and type(key[1]) is int:
+            # One cell, which is what the moves of the pedestrians look up
+            x, y = key
+            T = self.tile_size
+            tx, ty = x // T, y // T
+            block = self.views[tx][ty]
+            if block is None:
+                return self.constant[tx, ty]
+            return block[x - tx*T, y - ty*T]
+
+        x, y = self.split_key(key)
+        if isinstance(x, (int, np.integer)) and isinstance(y, (int, np.integer)):
+            return self[int(x), int(y)]
+        if isinstance(x, slice) or isinstance(y, slice):
+            return self.region(x, y)
+
+        xs, ys = np.broadcast_arrays(np.asarray(x), np.asarray(y))
+        txs, tys, lxs, lys = self.locate(xs, ys)
+        rows = self.index[txs, tys]
+        values = self.constant[txs, tys]
+        allocated = rows >= 0
+        values[allocated] = self.blocks[rows[allocated], lxs[allocated], lys[allocated]]
+        return values
+
+    def __setitem__(self, key, value):
+        if type(key) is tuple and type(key[0]) is int and type(key[1]) is int:
+            x, y = key
+            T = self.tile_size
+            tx, ty = x // T, y // T
+            block = self.views[tx][ty]
+            if block is None:
+                if self.constant[tx, ty] == value:
+                    return
+                self.allocate([tx], [ty])
+                block = self.views[tx][ty]
+            block[x - tx*T, y - ty*T] = value
+            return
+
+        x, y = self.split_key(key)
+        if isinstance(x, (int, np.integer)) and isinstance(y, (int, np.integer)):
+            self[int(x), int(y)] = value
+            return
+        if isinstance(x, slice) or isinstance(y, slice):
+            self.set_region(x, y, value)
+            return
+
+        xs, ys, values = np.broadcast_arrays(np.asarray(x), np.asarray(y), np.asarray(value, dtype=self.dtype))
+        txs, tys, lxs, lys = self.locate(xs, ys)
+        changed = (self.index[txs, tys] < 0) & (values != self.constant[txs, tys])
+        self.allocate(txs[changed], tys[changed])
+        rows = self.index[txs, tys]
+        allocated = rows >= 0
+        self.blocks[rows[allocated], lxs[allocated], lys[allocated]] = values[allocated]
+
+    def add_at(self, xs, ys, values):
+        """Add the values to the cells (xs, ys) like numpy.add.at, i.e. the values of repeated cells add up."""
+        xs, ys, values = np.broadcast_arrays(np.asarray(xs), np.asarray(ys), np.asarray(values))
+        txs, tys, lxs, lys = self.locate(xs, ys)
+        self.allocate(txs, tys)
+        np.add.at(self.blocks, (self.index[txs, tys], lxs, lys), values)
+
+    def tiles_of_region(self, x, y):
+        """The tiles overlapping the rectangle of two slices, each with the slices of the rectangle and the tile
+        that overlap.
+        """
+        if isinstance(x, (int, np.integer)):
+            x = slice(x, x+1)
+        if isinstance(y, (int, np.integer)):
+            y = slice(y, y+1)
+        x0, x1, x_step = x.indices(self.shape[0])
+        y0, y1, y_step = y.indices(self.shape[1])
+        if x_step != 1 or y_step != 1:
+            raise IndexError("Tiled_Grid only supports slices with step 1")
+        T = self.tile_size
+        x1, y1 = max(x0, x1), max(y0, y1)
+        for tx in range(x0 // T, -(-x1 // T)):
+            a, b = max(x0, tx*T), min(x1, (tx+1)*T)
+            for ty in range(y0 // T, -(-y1 // T)):
+                c, d = max(y0, ty*T), min(y1, (ty+1)*T)
+                yield tx, ty, (slice(a-x0, b-x0), slice(c-y0, d-y0)), (slice(a-tx*T, b-tx*T), slice(c-ty*T, d-ty*T))
+
+    def region(self, x, y):
+        shape = self.region_shape(x, y)
+        values = np.empty(shape, dtype=self.dtype)
+        for tx, ty, part, tile in self.tiles_of_region(x, y):
+            row = self.index[tx, ty]
+            values[part] = self.constant[tx, ty] if row < 0 else self.blocks[row][tile]
+        if isinstance(x, (int, np.integer)):
+            values = values[0]
+        elif isinstance(y, (int, np.integer)):
+            values = values[:, 0]
+        return values
+
+    def region_shape(self, x, y):
+        lengths = []
+        for index, length in zip((x, y), self.shape):
+            if isinstance(index, (int, np.integer)):
+                lengths.append(1)
+            else:
+                start, stop, _ = index.indices(length)
+                lengths.append(max(stop - start, 0))
+        return tuple(lengths)
+
+    def set_region(self, x, y, value):
+        if (isinstance(value, Tiled_Grid) and value.shape == self.shape and value.tile_size == self.tile_size
+                and x == slice(None) and y == slice(None)):
+            # A whole grid of the same tiles is copied tile by tile, e.g. a floor field
+            self.copy_from(value)
+            return
+        shape = self.region_shape(x, y)
+        values = np.asarray(value, dtype=self.dtype)
+        if isinstance(x, (int, np.integer)) and values.ndim > 0:
+            values = values[None]
+        elif isinstance(y, (int, np.integer)) and values.ndim > 0:
+            values = values[:, None]
+        values = np.broadcast_to(values, shape)
+
+        T = self.tile_size
+        width, height = self.shape
+        for tx, ty, part, tile in self.tiles_of_region(x, y):
+            part_values = values[part]
+            whole = (tile[0].stop - tile[0].start == min(T, width - tx*T)
+                     and tile[1].stop - tile[1].start == min(T, height - ty*T))
+            row = self.index[tx, ty]
+            if whole and part_values.min() == part_values.max():
+                # The whole tile gets one value, so it does not need a block
+                self.release([tx], [ty], part_values.flat[0])
+                continue
+            if row < 0:
+                if (part_values == self.constant[tx, ty]).all():
+                    continue
+                self.allocate([tx], [ty])
+                row = self.index[tx, ty]
+            self.blocks[row][tile] = part_values
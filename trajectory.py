@@ -0,0 +1,325 @@
+"""Record the trajectories of all pedestrians of a cellular automaton into compact binary files.
+
+A recording is a directory with
+    meta.json   the size of the cellular automaton and the keyframe interval
+    grid.npy    the status codes of the cells (without pedestrians) and the measuring area when recording started
+    steps.bin   one STEP_DTYPE record per recorded step
+    rows.bin    ROW_DTYPE records of all steps, in the order of the steps
+
+Keyframe steps store the position of every pedestrian. The other steps only store the pedestrians that moved
+or were added since the step before, and the removed ones with x = y = -1. Both binary files are only ever
+appended to, in chunks, and can be memory-mapped by Trajectory while or after recording.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from cellular_automaton import EMPTY, PEDESTRIAN, Observer
+
+VERSION = 1
+
+STEP_DTYPE = np.dtype([
+    ("time", "<f8"),  # simulated time at the end of the step
+    ("start", "<u8"),  # index of the first row of the step in rows.bin
+    ("keyframe", "u1")
+])
+
+ROW_DTYPE = np.dtype([
+    ("id", "<u4"),
+    ("x", "<i2"),
+    ("y", "<i2")
+])
+
+REMOVED = -1
+
+
+class Trajectory_Recorder(Observer):
+    """
+    This observer records the positions of the pedestrians at the end of every step. Register it by
+    CA.add_observer() after start() and call close() when done. Rows are written to disk whenever chunk_size
+    of them are buffered, so long runs do not keep their trajectory in memory.
+    """
+
+    def __init__(self, CA, path, keyframe_interval=100, chunk_size=1 << 16):
+        self.CA = CA
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.chunk_size = chunk_size
+
+        self.steps_file = None
+        self.rows_file = None
+        # The recorder may be closed by another thread than the one of the simulation
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Create the recording and record the current positions as the first keyframe."""
+        if max(self.CA.width, self.CA.height) > np.iinfo(ROW_DTYPE["x"]).max:
+            raise ValueError("The cellular automaton is too large to be recorded")
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "meta.json"), "w") as meta:
+            json.dump({"version": VERSION, "width": self.CA.width, "height": self.CA.height,
+                       "keyframe_interval": self.keyframe_interval}, meta)
+        # The grids may be tiled, see Cellular_Automaton.set_tile_size()
+        state = np.asarray(self.CA.crt_state)
+        grid = np.where(state == PEDESTRIAN, EMPTY, state)
+        np.save(os.path.join(self.path, "grid.npy"), np.stack([grid, np.asarray(self.CA.isMA)]))
+
+        self.steps_file = open(os.path.join(self.path, "steps.bin"), "wb")
+        self.rows_file = open(os.path.join(self.path, "rows.bin"), "wb")
+        self.num_of_rows = 0
+        self.buffered_steps = []
+        self.buffered_rows = []
+        self.num_of_buffered_rows = 0
+
+        self.population = None
+        self.last_keyframe = None
+        self.num_of_steps = 0
+        self.record(self.CA.now)
+
+    def step_finished(self, now):
+        with self.lock:
+            if self.rows_file is not None:
+                self.record(now)
+
+    def record(self, now):
+        P = self.CA.population
+        rows = np.nonzero(~P.removed)[0]
+        ids = P.ids[rows]
+        xs, ys = P.x[rows], P.y[rows]
+
+        # A new population (e.g. the next replicate of a RiMEA test) starts with a keyframe
+        keyframe = (P is not self.population or
+                    self.num_of_steps - self.last_keyframe >= self.keyframe_interval)
+        if P is not self.population:
+            self.population = P
+            self.last_x = np.full(P.next_id, REMOVED, dtype=ROW_DTYPE["x"])
+            self.last_y = np.full(P.next_id, REMOVED, dtype=ROW_DTYPE["y"])
+        if P.next_id > len(self.last_x):
+            grown = max(P.next_id, 2*len(self.last_x))
+            self.last_x = np.concatenate([self.last_x, np.full(grown-len(self.last_x), REMOVED, self.last_x.dtype)])
+            self.last_y = np.concatenate([self.last_y, np.full(grown-len(self.last_y), REMOVED, self.last_y.dtype)])
+
+        if keyframe:
+            self.last_keyframe = self.num_of_steps
+            self.last_x[:] = REMOVED
+            self.last_y[:] = REMOVED
+            changed_ids, changed_xs, changed_ys = ids, xs, ys
+        else:
+            alive = np.zeros(len(self.last_x), dtype=bool)
+            alive[ids] = True
+            removed = np.nonzero(~alive & (self.last_x != REMOVED))[0]
+            moved = (self.last_x[ids] != xs) | (self.last_y[ids] != ys)
+            changed_ids = np.concatenate([ids[moved], removed])
+            changed_xs = np.concatenate([xs[moved], np.full(len(removed), REMOVED)])
+            changed_ys = np.concatenate([ys[moved], np.full(len(removed), REMOVED)])
+        self.last_x[changed_ids] = changed_xs
+        self.last_y[changed_ids] = changed_ys
+
+        chunk = np.empty(len(changed_ids), dtype=ROW_DTYPE)
+        chunk["id"], chunk["x"], chunk["y"] = changed_ids, changed_xs, changed_ys
+        self.buffered_steps.append((now, self.num_of_rows + self.num_of_buffered_rows, keyframe))
+        self.buffered_rows.append(chunk)
+        self.num_of_buffered_rows += len(chunk)
+        self.num_of_steps += 1
+        if self.num_of_buffered_rows >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows and steps to the files. The rows go first, so that every step on disk
+        only refers to rows on disk."""
+        if self.buffered_rows:
+            self.rows_file.write(np.concatenate(self.buffered_rows).tobytes())
+            self.rows_file.flush()
+        self.steps_file.write(np.array(self.buffered_steps, dtype=STEP_DTYPE).tobytes())
+        self.steps_file.flush()
+        self.num_of_rows += self.num_of_buffered_rows
+        self.buffered_steps = []
+        self.buffered_rows = []
+        self.num_of_buffered_rows = 0
+
+    def close(self):
+        with self.lock:
+            if self.rows_file is None:
+                return
+            self.flush()
+            self.steps_file.close()
+            self.rows_file.close()
+            self.steps_file = None
+            self.rows_file = None
+
+
+def memmap(path, dtype):
+    # numpy cannot memory-map empty files
+    if os.path.getsize(path) < dtype.itemsize:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(os.path.getsize(path) // dtype.itemsize,))
+
+
+class Trajectory:
+    """
+    A recording of Trajectory_Recorder, memory-mapped for reading. Only the parts that are accessed
+    are read from disk.
+
+    Attributes
+    ----------
+    times : Array
+        the simulated time of each step
+    keyframes : Array
+        the indices of the keyframe steps
+    grid : Array
+        the status codes of the cells without pedestrians
+    isMA : Array
+        whether a cell is in a speed measuring area
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as meta:
+            self.meta = json.load(meta)
+        self.width = self.meta["width"]
+        self.height = self.meta["height"]
+        grid = np.load(os.path.join(path, "grid.npy"))
+        self.grid = grid[0]
+        self.isMA = grid[1].astype(bool)
+        self.steps = memmap(os.path.join(path, "steps.bin"), STEP_DTYPE)
+        self.rows = memmap(os.path.join(path, "rows.bin"), ROW_DTYPE)
+        self.times = self.steps["time"]
+        self.keyframes = np.nonzero(self.steps["keyframe"])[0]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def rows_of(self, first, last):
+        """The rows of the steps first to last, both included."""
+        end = self.steps["start"][last+1] if last+1 < len(self.steps) else len(self.rows)
+        return self.rows[self.steps["start"][first]:end]
+
+    def step_at(self, time):
+        """The index of the last step at or before the given simulated time."""
+        return max(int(np.searchsorted(self.times, time + 1e-9, side="right")) - 1, 0)
+
+    def positions(self, step):
+        """The positions of the pedestrians after the given step. Starting from the keyframe before the step,
+        only the rows up to the step are read.
+
+        Returns
+        -------
+        tuple
+            the arrays of the ids, x and y coordinates of the pedestrians, sorted by id
+        """
+        keyframe = self.keyframes[np.searchsorted(self.keyframes, step, side="right") - 1]
+        rows = np.asarray(self.rows_of(keyframe, step))
+        # The last row of each id holds its latest position
+        ids, last = np.unique(rows["id"][::-1], return_index=True)
+        last = len(rows) - 1 - last
+        xs, ys = rows["x"][last], rows["y"][last]
+        present = xs != REMOVED
+        return ids[present], xs[present].astype(np.int64), ys[present].astype(np.int64)
+
+    def changes(self, step):
+        """The rows of a single step, i.e. the moved, added and removed (x = y = -1) pedestrians, or all
+        pedestrians if it is a keyframe."""
+        return np.asarray(self.rows_of(step, step))
+
+
+class Trajectory_Player:
+    """
+    This class replays a Trajectory step by step, reading only the rows of the steps it passes. It has the
+    same width, height, crt_state and isMA as a cellular automaton, so a Raster_Renderer can draw it.
+    Pedestrians are only marked in crt_state; neither floor field nor avoidance costs are needed.
+    """
+
+    def __init__(self, trajectory):
+        self.trajectory = trajectory
+        self.width = trajectory.width
+        self.height = trajectory.height
+        self.isMA = trajectory.isMA
+        self.seek(0)
+
+    @property
+    def time(self):
+        return float(self.trajectory.times[self.step])
+
+    def at_end(self):
+        return self.step >= len(self.trajectory) - 1
+
+    def seek(self, step):
+        """Jump to the given step, starting from the keyframe before it."""
+        self.load(step)
+        self.budget = 0.  # simulated time that was played but not reached by a step yet
+
+    def load(self, step):
+        self.step = min(max(step, 0), max(len(self.trajectory) - 1, 0))
+        self.crt_state = self.trajectory.grid.copy()
+        self.x_of_id = np.zeros(0, dtype=np.int64)
+        self.y_of_id = np.zeros(0, dtype=np.int64)
+        if len(self.trajectory) > 0:
+            ids, xs, ys = self.trajectory.positions(self.step)
+            self.place(ids, xs, ys)
+
+    def seek_time(self, time):
+        self.seek(self.trajectory.step_at(time))
+
+    def place(self, ids, xs, ys):
+        if len(ids) and ids.max() >= len(self.x_of_id):
+            grown = max(int(ids.max()) + 1, 2*len(self.x_of_id))
+            self.x_of_id = np.concatenate([self.x_of_id, np.full(grown-len(self.x_of_id), REMOVED)])
+            self.y_of_id = np.concatenate([self.y_of_id, np.full(grown-len(self.y_of_id), REMOVED)])
+        self.x_of_id[ids] = xs
+        self.y_of_id[ids] = ys
+        present = xs != REMOVED
+        self.crt_state[xs[present], ys[present]] = PEDESTRIAN
+
+    def advance(self):
+        """Go to the next step.
+
+        Returns
+        -------
+        set
+            the (x, y) coordinates of the cells that changed, None if all cells may have changed
+        """
+        if self.at_end():
+            return set()
+        if self.trajectory.steps["keyframe"][self.step + 1]:
+            self.load(self.step + 1)
+            return None
+        self.step += 1
+        rows = self.trajectory.changes(self.step)
+        ids = rows["id"].astype(np.int64)
+        xs, ys = rows["x"].astype(np.int64), rows["y"].astype(np.int64)
+
+        known = ids < len(self.x_of_id)
+        old_xs = np.full(len(ids), REMOVED)
+        old_ys = np.full(len(ids), REMOVED)
+        old_xs[known], old_ys[known] = self.x_of_id[ids[known]], self.y_of_id[ids[known]]
+        left = old_xs != REMOVED
+        # Clear all old cells before marking the new ones, since a pd may move into a cell left by another
+        self.crt_state[old_xs[left], old_ys[left]] = self.trajectory.grid[old_xs[left], old_ys[left]]
+        self.place(ids, xs, ys)
+
+        entered = xs != REMOVED
+        return set(zip(old_xs[left].tolist(), old_ys[left].tolist())) | set(zip(xs[entered].tolist(), ys[entered].tolist()))
+
+    def play(self, duration):
+        """Advance by the given simulated time. Where the time of the recording restarts (e.g. at the next
+        replicate of a RiMEA test), the steps follow without pause.
+
+        Returns
+        -------
+        set
+            the changed cells, None if all cells may have changed
+        """
+        self.budget += duration
+        cells = set()
+        while not self.at_end():
+            dt = max(float(self.trajectory.times[self.step + 1]) - self.time, 0.)
+            if dt > self.budget:
+                break
+            self.budget -= dt
+            changed = self.advance()
+            cells = None if cells is None or changed is None else cells | changed
+        if self.at_end():
+            self.budget = 0.
+        return cells